@@ -1,34 +1,42 @@
-from flask import Flask, Response, render_template, redirect, url_for
+from flask import Flask, Response, jsonify, request, render_template, redirect, url_for, send_file, abort
 from flask_socketio import SocketIO, emit, join_room, leave_room
-import cv2
-from ultralytics import YOLO
-import threading
-from flask import Flask, jsonify, request
+from flask_cors import CORS
 from pymongo import MongoClient
-import json
-import os
 from bson import ObjectId
-from utils.json_encoder import CustomJSONEncoder
-from bson.json_util import dumps, loads
-
-import uuid
-
-import logging
-from flask_socketio import SocketIO
-import pywhatkit as kit
-
+import threading
+import multiprocessing
+import importlib
+import atexit
 import datetime
-
 import json
-from flask_cors import CORS
-
+import logging
+import os
+import signal
 import socket
-
-# Add this function at the top level
-def serialize_datetime(obj):
-    if isinstance(obj, datetime.datetime):
-        return obj.isoformat()
-    raise TypeError(f"Type {type(obj)} not serializable")
+import sys
+import uuid
+from utils.serialization import MongoJSONProvider, PacketJSON
+from utils.inference_engine import BatchInferenceEngine
+from utils.inference_service import InferenceService
+from utils.detector import LocalDetector
+from utils.camera_pipeline import CameraPipeline
+from utils.inference_scheduler import InferenceScheduler
+from utils.detection_state import DetectionStore
+from utils.evidence_writer import EvidenceWriter
+from utils.evidence_store import EvidenceStore, DIGEST_RE
+from utils.indexes import ensure_indexes
+from utils.sos_registry import SosRegistry
+from utils.geofence import GeofenceEngine, fence_from_doc
+from utils import geohash
+from utils.heatmap_tiles import HeatmapTiles, report_weight, MIN_ZOOM as HEATMAP_MIN_ZOOM, MAX_ZOOM as HEATMAP_MAX_ZOOM
+from utils.geo import normalize_lat_lng, parse_bbox, point_from_location, within_bbox
+from utils.response_cache import ResponseCache
+from utils.notifications import NotificationQueue, WhatsAppSender, LogSender
+from utils.incident_verify import IncidentVerifier, MAX_DECISIONS
+from utils.metrics import (Registry, MongoCommandMetrics, instrument_flask, instrument_socketio,
+                           CONTENT_TYPE as METRICS_CONTENT_TYPE)
+from utils.face_index import FaceIndex, COLLECTION as MISSING_PERSONS_COLLECTION
+from utils.pagination import page_args, projection_for, fetch_page, conditional_json
 
 # Load data from JSON file
 with open('config.json', 'r') as file:
@@ -40,7 +48,13 @@ phone_number = config.get('phone_number')
 # Set up template directory and Flask app
 template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'templates'))
 app = Flask(__name__, template_folder=template_dir)
-app.json_encoder = CustomJSONEncoder
+# Prometheus metrics for /metrics: request latency per route here, Mongo
+# commands, Socket.IO events and camera stages below
+metrics = Registry()
+instrument_flask(app, metrics)
+
+# ObjectId/datetime aware JSON for every jsonify() and tojson
+app.json = MongoJSONProvider(app)
 CORS(app, resources={
     r"/*": {
         "origins": "*",
@@ -51,97 +65,462 @@ CORS(app, resources={
     }
 })
 
+# With a message_queue (e.g. redis://localhost:6379/0) several server processes
+# share emits and room fan-out; see utils/cluster.py. The environment variables
+# let the cluster launcher configure each worker (gevent by default); a single
+# process stays on threading because cameras and inference block.
+socketio_config = config.get('socketio', {})
+log_packets = socketio_config.get('log_packets', False)  # logs every packet when on
+socketio_message_queue = os.environ.get('SOCKETIO_MESSAGE_QUEUE') or socketio_config.get('message_queue')
 socketio = SocketIO(
     app,
     cors_allowed_origins="*",
-    async_mode='threading',
+    async_mode=os.environ.get('SOCKETIO_ASYNC_MODE') or socketio_config.get('async_mode', 'threading'),
+    message_queue=socketio_message_queue,
+    json=PacketJSON,  # emits take Mongo documents as-is
     ping_timeout=60000,
     ping_interval=25000,
     always_connect=True,
-    logger=True,
-    engineio_logger=True,
+    logger=log_packets,
+    engineio_logger=log_packets,
     manage_session=False  # Add this
 )
 
+# Wraps socketio.on/emit, so it has to come before the handlers below
+instrument_socketio(socketio, metrics)
+
 # Set the logging level to ERROR
 app.logger.setLevel(logging.ERROR)
 
-# Load models
-violence_model = YOLO("viodec_mk1.pt")
-arms_model = YOLO("arms_detect.pt")
-
-violence_classes = ["Violence ","knife","guns","NonViolence"]    
-arms_classes = ["Gun", "Knife", "Pistol", "Handgun", "Rifle"]
-
-# Global variable to store detected objects
-detected_objects = []
+# Push a camera's detections to police dashboards whenever they change
+def broadcast_detections(entry):
+    socketio.emit('detections', entry, room='police')
+
+# Per-camera detection state, shared by the pipelines and /detections
+detection_store = DetectionStore(on_change=broadcast_detections)
+
+# Frames from every camera are batched together before hitting the models.
+# With inference.workers > 0 the models live in separate worker processes
+# and this process only hands them frames through shared memory.
+inference_config = config.get('inference', {})
+inference_workers = int(inference_config.get('workers', 0))
+max_batch_size = inference_config.get('max_batch_size', 8)
+# "torch", "onnx" or "openvino"; exported models come from `python -m utils.model_export export`
+inference_backend = inference_config.get('backend', 'torch')
+inference_int8 = bool(inference_config.get('int8', False))
+
+if inference_workers > 0:
+    detector = InferenceService(
+        num_workers=inference_workers,
+        max_batch_size=max_batch_size,
+        max_frame_bytes=inference_config.get('max_frame_bytes', 1920 * 1080 * 3),
+        backend=inference_backend,
+        int8=inference_int8,
+    )
+    atexit.register(detector.close)
+else:
+    # Models are loaded on first use, so importing app.py stays fast
+    detector = LocalDetector(inference_backend, inference_int8)
+
+# Load and warm the models in the background; only in the main process, since
+# spawned inference workers re-import this module
+if inference_config.get('warmup', True) and multiprocessing.parent_process() is None:
+    detector.warm_up_async()
+
+inference_engine = BatchInferenceEngine(
+    detector.run_batch,
+    max_batch_size=max_batch_size,
+    max_wait=inference_config.get('max_wait_ms', 10) / 1000.0,
+    concurrency=max(1, inference_workers),
+)
 
 # Function to run inference on a frame
-def detect_objects(frame):
-    global detected_objects
-    violence_results = violence_model(frame)
-    arms_results = arms_model(frame)
-
-    detected_objects.clear()  # Clear previous detections
-
-    # Check for violence
-    for result in violence_results:
-        for box in result.boxes:
-            class_id = int(box.cls)
-            if violence_classes[class_id] == "Violence":
-                detected_objects.append("Violence")
-
-    # Check for arms
-    for result in arms_results:
-        for box in result.boxes:
-            class_id = int(box.cls)
-            if arms_classes[class_id] in arms_classes:
-                detected_objects.append(arms_classes[class_id])
-
-    return detected_objects
-
-# Function to generate frames from webcam
-def generate_frames():
-    global detected_objects
-    # camera_url = "https://192.168.137.220:4343/video"  # Replace with the URL shown in the app
-    cap = cv2.VideoCapture(0) 
-    while True:
-        success, frame = cap.read()
-        if not success:
-            break
-        else:
-            detected_objects = detect_objects(frame)
-            if detected_objects:
-                timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                print(f"Detected: {detected_objects} at {timestamp}")
-                # Save frame with timestamp
-                cv2.imwrite(f"detected_{timestamp}.jpg", frame)
-
-            ret, buffer = cv2.imencode('.jpg', frame)
-            frame = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+def detect_objects(frame, camera_id="0"):
+    detected = inference_engine.infer(camera_id, frame)
+    detection_store.update(camera_id, detected)
+    return detected
+
+# Called from a camera's inference stage whenever something is detected
+def handle_detection(camera_id, detected, frame, captured_at):
+    timestamp = datetime.datetime.fromtimestamp(captured_at).strftime("%Y-%m-%d %H:%M:%S")
+    print(f"Detected on camera {camera_id}: {detected} at {timestamp}")
+    # Snapshot and clip are written in the background, at most once per incident
+    evidence_writer.trigger(camera_id, detected, frame, captured_at)
+
+# One background capture/inference/encode pipeline per camera, shared by all viewers
+# camera_url = "https://192.168.137.220:4343/video"  # Replace with the URL shown in the app
+camera_sources = config.get('cameras', {"0": 0})
+pipeline_config = config.get('pipeline', {})
+scheduler_config = config.get('scheduler', {})
+camera_pipelines = {}
+camera_pipelines_lock = threading.Lock()
+
+camera_stage_seconds = metrics.histogram(
+    'camera_stage_seconds', 'Per-frame time in each camera pipeline stage', ('camera', 'stage'))
+camera_frames_served = metrics.counter('camera_frames_served', 'MJPEG frames sent to viewers', ('camera',))
+
+def record_camera_stage(camera_id, stage, seconds):
+    camera_stage_seconds.observe(seconds, camera_id, stage)
+
+# Motion/stride gating in front of detect_objects, one scheduler per camera
+def make_scheduler():
+    if not scheduler_config.get('enabled', True):
+        return None
+    return InferenceScheduler(
+        stride=scheduler_config.get('stride', 3),
+        motion_threshold=scheduler_config.get('motion_threshold', 4.0),
+        hot_seconds=scheduler_config.get('hot_seconds', 5.0),
+        max_idle=scheduler_config.get('max_idle_seconds', 2.0),
+    )
+
+def get_pipeline(camera_id):
+    if camera_id not in camera_sources:
+        return None
+    with camera_pipelines_lock:
+        pipeline = camera_pipelines.get(camera_id)
+        if pipeline is None:
+            pipeline = CameraPipeline(
+                camera_id,
+                camera_sources[camera_id],
+                detect_objects,
+                on_detection=handle_detection,
+                queue_size=pipeline_config.get('queue_size', 2),
+                jpeg_quality=pipeline_config.get('jpeg_quality', 80),
+                scheduler=make_scheduler(),
+                on_frame=evidence_writer.push_frame,
+                embed_faces=face_embedder,
+                on_faces=handle_faces,
+                stage_timer=record_camera_stage,
+                # Cameras nobody watches stop after this many seconds; null keeps them running
+                idle_seconds=pipeline_config.get('idle_seconds', 60.0),
+            )
+            camera_pipelines[camera_id] = pipeline
+        pipeline.start()
+    return pipeline
+
+# Function to generate frames for one viewer from the shared camera pipeline
+def generate_frames(camera_id="0"):
+    pipeline = get_pipeline(camera_id)
+    for frame in pipeline.frames():
+        camera_frames_served.inc(camera_id)
+        yield (b'--frame\r\n'
+               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
 
 @app.route('/video_feed')
-def video_feed():
-    return Response(generate_frames(),
+@app.route('/video_feed/<camera_id>')
+def video_feed(camera_id="0"):
+    if camera_id not in camera_sources:
+        return jsonify({"error": "Unknown camera"}), 404
+    return Response(generate_frames(camera_id),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+# Evidence files never change once stored, so they can be cached for good;
+# send_file answers Range requests with 206 so clips can be scrubbed
+@app.route('/evidence/<digest>.<ext>')
+def serve_evidence(digest, ext):
+    if not DIGEST_RE.match(digest):
+        abort(404)
+    path = evidence_store.path_for(digest, ext)
+    if not os.path.isfile(path):
+        abort(404)
+    return send_file(os.path.abspath(path), conditional=True, etag=digest, max_age=31536000)
+
+@app.route('/evidence/thumbs/<digest>.jpg')
+def serve_evidence_thumbnail(digest):
+    if not DIGEST_RE.match(digest):
+        abort(404)
+    path = evidence_store.thumbnail_path(digest)
+    if not os.path.isfile(path):
+        abort(404)
+    return send_file(os.path.abspath(path), mimetype='image/jpeg', conditional=True,
+                     etag=digest + '-thumb', max_age=31536000)
+
+def camera_gauges(key):
+    return {(camera_id,): pipeline.stats()[key] for camera_id, pipeline in list(camera_pipelines.items())}
+
+metrics.gauge('camera_viewers', 'Viewers connected to each camera', ('camera',),
+              lambda: camera_gauges('viewers'))
+metrics.gauge('camera_capture_dropped_frames', 'Frames dropped before inference (since start)', ('camera',),
+              lambda: camera_gauges('capture_dropped'))
+metrics.gauge('inference_queue_depth', 'Frames waiting for the batch inference engine', (),
+              lambda: {(): inference_engine.stats()['queued']})
+metrics.gauge('inference_avg_batch_size', 'Average frames per inference batch', (),
+              lambda: {(): inference_engine.stats()['avg_batch_size']})
+metrics.gauge('sos_active_sessions', 'Active SOS sessions held in memory', (),
+              lambda: {(): sos_registry.stats()['active_sessions']})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/notifications/stats')
+def notification_stats():
+    return jsonify(notification_queue.stats())
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+@app.route('/cameras')
+def cameras():
+    return jsonify({"cameras": [
+        camera_pipelines[camera_id].stats() if camera_id in camera_pipelines
+        else {"camera_id": camera_id, "running": False}
+        for camera_id in camera_sources
+    ]})
+
+# Readiness: 200 once the models are loaded and warm, with per-camera pipeline state
+@app.route('/ready')
+def ready():
+    models_ready = detector.ready.is_set()
+    cameras = []
+    for camera_id in camera_sources:
+        pipeline = camera_pipelines.get(camera_id)
+        cameras.append({
+            "camera_id": camera_id,
+            "running": bool(pipeline and pipeline.running),
+            "hot": bool(pipeline and pipeline.running and pipeline.stats()["last_frame_seq"] > 0),
+        })
+    return jsonify({
+        "status": "ready" if models_ready else ("error" if detector.error else "warming"),
+        "models_ready": models_ready,
+        "error": detector.error,
+        "cameras": cameras,
+    }), 200 if models_ready else 503
+
 @app.route('/detections')
 def detections():
-    global detected_objects
-    return jsonify({"detected_objects": detected_objects})
+    version, cameras = detection_store.snapshot()
+    etag = f'"{version}"'
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers={'ETag': etag})
+
+    camera_id = request.args.get('camera_id')
+    if camera_id is not None:
+        cameras = [entry for entry in cameras if entry['camera_id'] == camera_id]
+
+    detected_objects = sorted({obj for entry in cameras for obj in entry['detected_objects']})
+    response = jsonify({"version": version, "cameras": cameras, "detected_objects": detected_objects})
+    response.headers['ETag'] = etag
+    return response
 
 # Create a connection to MongoDB
 mongo_con = "mongodb://localhost:27017"
-client = MongoClient(mongo_con)
+client = MongoClient(mongo_con, connect=False,  # Connect on first query, not at import
+                     event_listeners=[MongoCommandMetrics(metrics)])
 db = client["SurakshaSetu"]
 
 alerts_collection = db["Alerts_Citizen"]  # For citizen-submitted reports jaha verify ke baad incident me jayega
 incidents_collection = db["Incidents"]  # For police-submitted reports
 Alert_Collection = db["Alerts"]
 markers_collection = db["Markers"]
-heatmap_collection = db["Heatmap"]
+cctv_evidence_collection = db["cctv_evidence"]
+
+# Police accept/reject decisions on citizen reports, applied in bulk and in a
+# transaction when the server supports one (verify.transactions)
+incident_verifier = IncidentVerifier(
+    client, alerts_collection, incidents_collection,
+    use_transactions=config.get('verify', {}).get('transactions', True),
+)
+
+# Active SOS sessions live in memory; location pings are flushed to Mongo in batches.
+# Only with several workers (a message queue) can another process deactivate a
+# session, so only then are cached sessions re-checked, every verify_interval.
+sos_config = config.get('sos', {})
+sos_registry = SosRegistry(
+    db.sos_alerts,
+    flush_interval=sos_config.get('flush_interval', 2.0),
+    max_pending=sos_config.get('max_pending', 500),
+    verify_interval=sos_config.get('verify_interval', 60.0) if socketio_message_queue else None,
+)
+atexit.register(sos_registry.stop)
+
+# Every geofence is held in an in-memory spatial index; SOS and SafeWalk location
+# updates are checked against it and produce enter/exit events
+geofence_config = config.get('geofence', {})
+geofence_engine = GeofenceEngine(
+    db.geofences,
+    cell_degrees=geofence_config.get('cell_degrees', 0.01),
+    refresh_interval=geofence_config.get('refresh_interval', 5.0),
+)
+if multiprocessing.parent_process() is None:
+    threading.Thread(target=geofence_engine.sync, name="geofence-load", daemon=True).start()
+
+# Make sure the indexes in utils/indexes.py exist; done in the background so a
+# slow or unreachable Mongo doesn't hold up startup
+if config.get('ensure_indexes', True) and multiprocessing.parent_process() is None:
+    threading.Thread(target=ensure_indexes, args=(db,), name="ensure-indexes", daemon=True).start()
+
+# Background snapshot/clip writer for camera detections
+evidence_config = config.get('evidence', {})
+evidence_writer = EvidenceWriter(
+    cctv_evidence_collection,
+    output_dir=evidence_config.get('output_dir', 'static/uploads/cctv'),
+    debounce_seconds=evidence_config.get('debounce_seconds', 10.0),
+    pre_seconds=evidence_config.get('pre_seconds', 3.0),
+    post_seconds=evidence_config.get('post_seconds', 3.0),
+    fps=evidence_config.get('fps', 10.0),
+)
+atexit.register(evidence_writer.stop)
+
+# Uploaded incident evidence, stored by content hash and served with Range support
+evidence_store = EvidenceStore(
+    db.evidence_objects,
+    root_dir=evidence_config.get('store_dir', 'static/uploads/evidence/store'),
+    chunk_size=evidence_config.get('chunk_size', 1 << 20),
+)
+atexit.register(evidence_store.stop)
+
+def save_evidence_files(files):
+    # Returns the public URLs for the report's evidence_files field
+    urls = []
+    for evidence in files:
+        if evidence.filename != "":
+            digest, ext = evidence_store.save(evidence)
+            urls.append(url_for('serve_evidence', digest=digest, ext=ext))
+    return urls
+
+@app.template_filter('evidence_thumbnail')
+def evidence_thumbnail(url):
+    # /evidence/<digest>.<ext> -> its thumbnail URL; older /static uploads have none
+    name = url.rsplit('/', 1)[-1].split('.', 1)[0]
+    if not url.startswith('/evidence/') or not DIGEST_RE.match(name):
+        return ''
+    return url_for('serve_evidence_thumbnail', digest=name)
+
+# Outbound WhatsApp (and other) notifications are queued in Mongo and sent by
+# background workers, so no request waits on a browser. Set
+# notifications.whatsapp.sender to "log" to print messages instead of sending them.
+# The per-channel rate limit and concurrency are kept in notification_channels,
+# so they hold across every worker process of a cluster.
+notification_config = config.get('notifications', {})
+whatsapp_config = notification_config.get('whatsapp', {})
+if whatsapp_config.get('sender', 'pywhatkit') == 'log':
+    whatsapp_sender = LogSender('whatsapp')
+else:
+    whatsapp_sender = WhatsAppSender(wait_time=whatsapp_config.get('wait_time', 15))
+notification_queue = NotificationQueue(
+    db.notifications,
+    [whatsapp_sender],
+    workers=notification_config.get('workers', 2),
+    max_attempts=notification_config.get('max_attempts', 5),
+    backoff_seconds=notification_config.get('backoff_seconds', 30.0),
+    limits={'whatsapp': whatsapp_config},
+)
+atexit.register(notification_queue.stop)
+if multiprocessing.parent_process() is None:
+    # Pick up anything left undelivered by the last run
+    notification_queue.start()
+
+# Missing person face search. Embeddings sit in one memory-mapped, normalized
+# matrix (build it with `python -m utils.face_index build`). Cameras only take
+# part when faces.embedder names a "module:function" that turns a BGR frame
+# into an (n, dim) array of face embeddings; faces from all cameras are then
+# matched together in small batches.
+face_config = config.get('faces', {})
+face_index = FaceIndex(
+    root_dir=face_config.get('index_dir', 'data/faces'),
+    dim=face_config.get('dim', 128),
+    nprobe=face_config.get('nprobe', 8),
+    reload_interval=face_config.get('reload_interval', 1.0),
+)
+try:
+    face_index.load()
+except Exception as e:
+    print("Could not load the face index:", str(e))
+face_min_score = face_config.get('min_score', 0.6)
+face_debounce_seconds = face_config.get('debounce_seconds', 60.0)
+face_match_engine = BatchInferenceEngine(
+    lambda groups: face_index.match_batch(groups, 1, face_min_score),
+    max_batch_size=face_config.get('max_batch_size', 32),
+    max_wait=face_config.get('max_wait_ms', 5) / 1000.0,
+)
+face_sightings = {}  # (camera_id, person_id) -> time of the last sighting sent
+face_sightings_lock = threading.Lock()  # every camera's inference thread reports here
+
+def claim_face_sighting(key, captured_at):
+    # One sighting per person and camera per debounce window
+    with face_sightings_lock:
+        if captured_at - face_sightings.get(key, 0) < face_debounce_seconds:
+            return False
+        # Forget pairs whose window has passed, so the map only holds recent sightings
+        for stale in [k for k, seen in face_sightings.items() if captured_at - seen >= face_debounce_seconds]:
+            del face_sightings[stale]
+        face_sightings[key] = captured_at
+        return True
+
+def load_face_embedder(spec):
+    if not spec:
+        return None
+    module_name, _, function_name = spec.partition(':')
+    try:
+        return getattr(importlib.import_module(module_name), function_name)
+    except (ImportError, AttributeError) as e:
+        print(f"Face embedder {spec} unavailable:", str(e))
+        return None
+
+face_embedder = load_face_embedder(face_config.get('embedder'))
+
+def missing_person_summary(person_id):
+    if not ObjectId.is_valid(person_id):
+        return {'_id': person_id}
+    return db[MISSING_PERSONS_COLLECTION].find_one(
+        {'_id': ObjectId(person_id)}, {'embedding': 0}) or {'_id': person_id}
+
+# Called from a camera's inference stage with the faces found in a frame
+def handle_faces(camera_id, embeddings, frame, captured_at):
+    matches = face_match_engine.infer(camera_id, embeddings)
+    for face_matches in matches:
+        if not face_matches:
+            continue
+        person_id, score = face_matches[0]
+        if not claim_face_sighting((camera_id, person_id), captured_at):
+            continue
+        socketio.emit('missing_person_sighting', {
+            'camera_id': camera_id,
+            'person': missing_person_summary(person_id),
+            'score': round(score, 4),
+            'timestamp': datetime.datetime.fromtimestamp(captured_at).strftime("%Y-%m-%d %H:%M:%S"),
+        }, room='police')
+
+# Citizens sit in a room per coarse geohash cell of their last location, and an
+# alert with coordinates only goes to the cells around it (plus police)
+alert_config = config.get('alerts', {})
+location_room_precision = alert_config.get('geohash_precision', 5)
+alert_margin_m = alert_config.get('radius_margin_m', 2000)
+alert_max_cells = alert_config.get('max_cells', 256)
+
+def alert_rooms(alert_data):
+    # None means no usable area, so the alert goes to everyone
+    point = point_from_location(alert_data.get('coordinates'))
+    if point is None:
+        return None
+    lng, lat = point['coordinates']
+    cells = geohash.cells_covering(lat, lng, alert_data.get('radius_m', 0) + alert_margin_m,
+                                   location_room_precision, alert_max_cells)
+    if cells is None:
+        return None
+    return ['geo:' + cell for cell in cells] + ['police']
+
+# Hot read endpoints are answered from memory between writes; each write route
+# invalidates the namespace it affects
+cache_config = config.get('cache', {})
+response_cache = ResponseCache(
+    ttl=cache_config.get('ttl', 30.0),
+    max_entries=cache_config.get('max_entries', 512),
+    enabled=cache_config.get('enabled', True),
+)
+
+# List endpoints are cursor-paginated; these are the fields each list returns
+pagination_config = config.get('pagination', {})
+page_size = pagination_config.get('page_size', 50)
+max_page_size = pagination_config.get('max_page_size', 200)
+
+ALERT_FIELDS = ['alertType', 'alertTitle', 'alertMessage', 'location', 'alertLocation',
+                'alertDuration', 'targetAudience', 'created_at']
+INCIDENT_FIELDS = ['incident_type', 'date_time', 'location', 'reporting_officer', 'reporting_citizen',
+                   'status_type', 'priority_type', 'notice', 'description', 'evidence_files', 'created_at',
+                   'alertType', 'alertTitle', 'alertMessage', 'alertDuration', 'targetAudience']
 
 # Citizen API Routes (React Native)
 @app.route('/api/citizen/rewards', methods=['GET'])
@@ -149,11 +528,20 @@ def citizen_community_engagement():
     return jsonify({"message": "Rewards data"})
 
 @app.route('/api/citizen/geofencing', methods=['GET', 'POST'])
+@response_cache.cached('geofences')
 def citizen_geofencing():
     if request.method == 'POST':
         try:
             geofence_data = request.json
+            if not isinstance(geofence_data, dict) or fence_from_doc(geofence_data) is None:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'coordinate (latitude/longitude) and a positive radius are required'
+                }), 400
             result = db.geofences.insert_one(geofence_data)
+            # Checked from the next location update on, no reload needed
+            geofence_engine.add(geofence_data)
+            response_cache.invalidate('geofences')
             return jsonify({
                 'status': 'success',
                 'message': 'Geofence added successfully',
@@ -166,11 +554,19 @@ def citizen_geofencing():
             }), 500
     else:  # GET request
         try:
-            geofences = list(db.geofences.find({}, {'_id': 0}))
+            limit, cursor, since = page_args(page_size, max_page_size)
+            page = fetch_page(db.geofences, {}, None, limit, cursor, since)
             return jsonify({
                 'status': 'success',
-                'geofences': geofences
+                'geofences': page['items'],
+                'has_more': page['has_more'],
+                'next_cursor': page['next_cursor']
             })
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
         except Exception as e:
             return jsonify({
                 'status': 'error',
@@ -178,21 +574,41 @@ def citizen_geofencing():
             }), 500
 
 @app.route('/api/citizen/alerts', methods=['GET'])
+@response_cache.cached('alerts')
 def citizen_alerts():
     try:
-        alerts = list(Alert_Collection.find().sort('_id', -1))
-        for alert in alerts:
-            alert['_id'] = str(alert['_id'])  # Convert ObjectId to string
-        return jsonify({'status': 'success', 'alerts': alerts})
+        limit, cursor, since = page_args(page_size, max_page_size)
+        page = fetch_page(Alert_Collection, projection=projection_for(ALERT_FIELDS),
+                          limit=limit, cursor=cursor, since=since)
+        return conditional_json({
+            'status': 'success',
+            'alerts': page['items'],
+            'next_cursor': page['next_cursor'],
+            'since_cursor': page['since_cursor'],
+            'has_more': page['has_more'],
+        })
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/api/citizen/incident-alerts', methods=['GET'])
+@response_cache.cached('incidents')
 def citizen_incident_alerts():
-    incidents = list(incidents_collection.find().sort("created_at", -1))
-    for incident in incidents:
-        incident["_id"] = str(incident["_id"])
-    return jsonify({"status": "success", "incidents": incidents})
+    try:
+        limit, cursor, since = page_args(page_size, max_page_size)
+        projection = projection_for(INCIDENT_FIELDS)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    page = fetch_page(incidents_collection, projection=projection,
+                      limit=limit, cursor=cursor, since=since)
+    return conditional_json({
+        "status": "success",
+        "incidents": page['items'],
+        "next_cursor": page['next_cursor'],
+        "since_cursor": page['since_cursor'],
+        "has_more": page['has_more'],
+    })
 
 @app.route('/api/citizen/incident-report', methods=['POST'])
 def citizen_incident_report():
@@ -208,17 +624,7 @@ def citizen_incident_report():
         description = request.form.get("description")
 
         # Handle file uploads
-        evidence_files = request.files.getlist("evidence")
-        evidence_file_paths = []
-        evidence_dir = "static/uploads/evidence"  # Save in the static directory
-        os.makedirs(evidence_dir, exist_ok=True)
-
-        for evidence in evidence_files:
-            if evidence.filename != "":
-                file_path = os.path.join(evidence_dir, evidence.filename)
-                evidence.save(file_path)
-                # Save public URL for the file
-                evidence_file_paths.append(f"/static/uploads/evidence/{evidence.filename}")
+        evidence_file_paths = save_evidence_files(request.files.getlist("evidence"))
 
         # Create a document to insert into the Alerts collection
         alert_data = {
@@ -233,6 +639,7 @@ def citizen_incident_report():
             "description": description,
             "evidence_files": evidence_file_paths,
             "report_status": "pending",  # New field to indicate the status of the report
+            "created_at": datetime.datetime.utcnow(),
         }
 
         # Insert into the Alerts collection
@@ -270,18 +677,20 @@ def citizen_sos():
                 'timestamp': timestamp,
                 'status': 'active'
             }
+            point = point_from_location(db_data['location'])
+            if point is not None:
+                db_data['geo'] = point
             
-            # Save to database
-            result = db.sos_alerts.insert_one(db_data)
+            # Save to database and track it as an active session
+            inserted_id = sos_registry.activate(db_data)
             
-            # Create response with string ID
+            db_data.pop('geo', None)
             response_data = {
                 **db_data,
-                '_id': str(result.inserted_id)
+                '_id': inserted_id
             }
             
-            # Emit socket event with serialized data
-            socketio.emit('sos_alert', json.loads(dumps(response_data)), room='police')
+            socketio.emit('sos_alert', response_data, room='police')
             
             return jsonify({
                 'status': 'success',
@@ -296,13 +705,14 @@ def citizen_sos():
                 'message': str(e)
             }), 500
             
-    # GET request
+    # GET request, optionally limited to the map viewport
     try:
-        alerts = list(db.sos_alerts.find())
-        return Response(
-            dumps(alerts),
-            mimetype='application/json'
-        )
+        bbox, _ = viewport_args()
+        query = within_bbox(bbox) if bbox is not None else {}
+        alerts = list(db.sos_alerts.find(query, {'geo': 0}))
+        return jsonify(alerts)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print('Error fetching SOS alerts:', str(e))
         return jsonify([])
@@ -326,7 +736,7 @@ def get_sos_alerts():
                     },
                     'timestamp': alert.get('timestamp'),
                     'status': alert.get('status'),
-                    '_id': str(alert['_id'])
+                    '_id': alert['_id']
                 })
         
         return jsonify(formatted_alerts)
@@ -338,34 +748,96 @@ def get_sos_alerts():
 def citizen_crime_heatmap():
     return jsonify({"message": "Crime heatmap data"})
 
+# Density grid for the heatmap layer (see utils/heatmap_tiles.py)
+heatmap_tiles = HeatmapTiles(db)
+
+# Map endpoints take ?bbox=minLng,minLat,maxLng,maxLat&zoom= and only return what is in view
+geo_config = config.get('geo', {})
+max_map_points = geo_config.get('max_points', 2000)
+detail_zoom = geo_config.get('detail_zoom', 14)
+
+# Below detail_zoom the maps only draw points, so the text fields are left out
+CRIME_POINT_FIELDS = {"_id": 0, "lat": 1, "lng": 1, "intensity": 1, "severity": 1, "type": 1}
+
+def viewport_args():
+    bbox = parse_bbox(request.args.get('bbox'))
+    zoom = request.args.get('zoom', type=int)
+    return bbox, zoom
+
+def viewport_response(collection, query, projection, bbox):
+    if bbox is not None:
+        query = {**query, **within_bbox(bbox)}
+    docs = list(collection.find(query, projection).limit(max_map_points + 1))
+    response = jsonify(docs[:max_map_points])
+    if len(docs) > max_map_points:
+        response.headers['X-Truncated'] = 'true'
+    return response
+
 @app.route('/api/crime-data', methods=['GET'])
+@response_cache.cached('crime-data')
 def get_crime_data():
     try:
         # Add some default data if collection is empty
-        if db.heatmap.count_documents({}) == 0:
-            default_data = [
-                {
-                    "lat": "19.0760",
-                    "lng": "72.8777",
-                    "type": "Theft",
-                    "severity": "medium",
-                    "description": "Sample incident",
-                    "intensity": 0.5
-                }
-            ]
-            db.heatmap.insert_many(default_data)
-        
-        data = list(db.heatmap.find({}, {"_id": 0}))
-        return jsonify(data)
+        if db.heatmap.find_one({}, {"_id": 1}) is None:
+            default_data = {
+                "lat": "19.0760",
+                "lng": "72.8777",
+                "type": "Theft",
+                "severity": "medium",
+                "description": "Sample incident",
+                "intensity": 0.5
+            }
+            normalize_lat_lng(default_data)
+            db.heatmap.insert_one(default_data)
+            heatmap_tiles.add_report(default_data['lat'], default_data['lng'], report_weight(default_data))
+
+        bbox, zoom = viewport_args()
+        if zoom is not None and zoom < detail_zoom:
+            projection = CRIME_POINT_FIELDS
+        else:
+            projection = {"_id": 0, "geo": 0}
+        return viewport_response(db.heatmap, {}, projection, bbox)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print("Error fetching crime data:", e)
-        return jsonify([])  # Return empty array instead of error
+        response = jsonify([])  # Return empty array instead of error
+        response.headers['Cache-Control'] = 'no-store'  # ...but don't cache it
+        return response
 
 @app.route('/api/report-crime', methods=['POST'])
 def report_crime():
-    db.heatmap.insert_one(request.json)
+    crime = request.get_json(silent=True)
+    if not isinstance(crime, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    if not normalize_lat_lng(crime):
+        return jsonify({"error": "Valid lat and lng are required"}), 400
+    db.heatmap.insert_one(crime)
+    # Bump the density cells this report falls in, instead of recomputing the grid
+    heatmap_tiles.add_report(crime['lat'], crime['lng'], report_weight(crime))
+    response_cache.invalidate('crime-data')
     return jsonify({"message": "Crime location saved!"})
 
+# Precomputed density cells for the heatmap layer, one slippy-map tile at a time
+@app.route('/api/crime-heatmap/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+@response_cache.cached('crime-data')
+def get_heatmap_tile(z, x, y):
+    if z < HEATMAP_MIN_ZOOM or z > HEATMAP_MAX_ZOOM:
+        return jsonify({"error": f"zoom must be between {HEATMAP_MIN_ZOOM} and {HEATMAP_MAX_ZOOM}"}), 400
+    return jsonify(heatmap_tiles.tile(z, x, y))
+
+# ...or every cell in the current viewport (?bbox=...&zoom=...)
+@app.route('/api/crime-heatmap/cells', methods=['GET'])
+@response_cache.cached('crime-data')
+def get_heatmap_cells():
+    try:
+        bbox, zoom = viewport_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if bbox is None or zoom is None:
+        return jsonify({"error": "bbox and zoom are required"}), 400
+    return jsonify(heatmap_tiles.viewport(bbox, zoom))
+
 @app.route('/api/citizen/index', methods=['GET'])
 def citizen_Index():
     return jsonify({"message": "Citizen index data"})
@@ -391,49 +863,66 @@ def police_crime_heatmap():
 def police_incident_verify():
     if request.method == "GET":
         try:
-            # Fetch all incidents with status "pending" from the Alerts collection
-            pending_alerts = list(alerts_collection.find({"report_status": "pending"}).sort("created_at", -1))
-            for alert in pending_alerts:
-                alert["_id"] = str(alert["_id"])  
-            return render_template("Police/incident-verify.html", incidents=pending_alerts)
+            # Fetch one page of incidents with status "pending" from the Alerts collection
+            limit, cursor, _ = page_args(page_size, max_page_size)
+            page = fetch_page(alerts_collection, {"report_status": "pending"}, limit=limit, cursor=cursor)
+            pending_alerts = page['items']
+            return render_template("Police/incident-verify.html", incidents=pending_alerts,
+                                   next_cursor=page['next_cursor'])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
             return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
     if request.method == "POST":
         try:
-            # Process Accept or Reject actions
+            # Process Accept or Reject actions; a batch of one
             data = request.get_json()
-            alert_id = data.get("alert_id")
-            action = data.get("action")
-
-            # Ensure the alert exists
-            alert = alerts_collection.find_one({"alert_id": alert_id})
-            if not alert:
+            result = incident_verifier.verify([{"alert_id": data.get("alert_id"), "action": data.get("action")}])[0]
+            if result["status"] == "not_found":
                 return jsonify({"error": "Alert not found"}), 404
+            if result["status"] == "invalid":
+                return jsonify({"error": result["error"]}), 400
 
-            if action == "accept":
-                incidents_collection.insert_one(alert)
-                alerts_collection.delete_one({"alert_id": alert_id})
+            if result["status"] == "accepted":
+                response_cache.invalidate('incidents')
                 message = "Incident accepted and moved to Incidents collection."
-            elif action == "reject":
-                alerts_collection.update_one(
-                    {"alert_id": alert_id},
-                    {"$set": {"report_status": "rejected", "updated_at": datetime.datetime.utcnow()}}
-                )
-                message = "Incident rejected."
             else:
-                return jsonify({"error": "Invalid action"}), 400
-
+                message = "Incident rejected."
             return jsonify({"message": message}), 200
         except Exception as e:
             return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
+# Many decisions at once: {"decisions": [{"alert_id": ..., "action": "accept"|"reject"}, ...]}
+@app.route('/police/incident-verify/batch', methods=['POST'])
+def police_incident_verify_batch():
+    try:
+        data = request.get_json(silent=True) or {}
+        decisions = data.get("decisions")
+        if not isinstance(decisions, list) or not decisions:
+            return jsonify({"error": "decisions must be a non-empty list"}), 400
+        if len(decisions) > MAX_DECISIONS:
+            return jsonify({"error": f"At most {MAX_DECISIONS} decisions per batch"}), 400
+
+        results = incident_verifier.verify(decisions)
+        counts = {}
+        for result in results:
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        if counts.get("accepted"):
+            response_cache.invalidate('incidents')
+        return jsonify({"results": results, "counts": counts}), 200
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
 @app.route('/police/incident-alerts', methods=['GET'])
 def police_incident_alerts():
-    incidents = list(incidents_collection.find().sort("created_at", -1))
-    for incident in incidents:
-        incident["_id"] = str(incident["_id"])
-    return render_template("Police/incident-alerts.html", incidents=incidents)
+    try:
+        limit, cursor, _ = page_args(page_size, max_page_size)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    page = fetch_page(incidents_collection, limit=limit, cursor=cursor)
+    return render_template("Police/incident-alerts.html", incidents=page['items'],
+                           next_cursor=page['next_cursor'])
 
 @app.route('/police/update-incident-status/<incident_id>', methods=['POST'])
 def update_incident_status(incident_id):
@@ -443,6 +932,7 @@ def update_incident_status(incident_id):
             {"_id": ObjectId(incident_id)}, {"$set": {"status_type": new_status}}
         )
         if result.modified_count > 0:
+            response_cache.invalidate('incidents')
             return jsonify({"message": "Status updated successfully!"}), 200
         else:
             return jsonify({"error": "Incident not found or no changes made"}), 404
@@ -453,9 +943,8 @@ def update_incident_status(incident_id):
 def police_incident_report():
     if request.method == "POST":
         try:
-            # Log form and file data
-            print("Form data received:", request.form)
-            print("Files received:", request.files)
+            # Form fields carry personal details, so they are only logged at DEBUG
+            app.logger.debug("Incident report form: %s, files: %s", request.form, request.files)
 
             # Extract data
             incident_type = request.form.get("incidentType")
@@ -468,17 +957,7 @@ def police_incident_report():
             description = request.form.get("description")
 
             # Handle file uploads
-            evidence_files = request.files.getlist("evidence")
-            evidence_file_paths = []
-            evidence_dir = "static/uploads/evidence"  # Save in static directory
-            os.makedirs(evidence_dir, exist_ok=True)
-
-            for evidence in evidence_files:
-                if evidence.filename != "":
-                    file_path = os.path.join(evidence_dir, evidence.filename)
-                    evidence.save(file_path)
-                    # Save public URL for the file
-                    evidence_file_paths.append(f"/static/uploads/evidence/{evidence.filename}")
+            evidence_file_paths = save_evidence_files(request.files.getlist("evidence"))
 
             # Create the document to insert into MongoDB
             incident_data = {
@@ -497,6 +976,7 @@ def police_incident_report():
 
             # Insert into MongoDB
             result = incidents_collection.insert_one(incident_data)
+            response_cache.invalidate('incidents')
          
             return jsonify({
                 "message": "Incident report submitted successfully!",
@@ -533,6 +1013,88 @@ def police_sos_notifications():
 def Police_Missing_Person_Database():
     return render_template("Police/Mpdb.html")
 
+def parse_embeddings(data):
+    # A single "embedding" or a list of "embeddings", each face_index.dim numbers
+    embeddings = data.get('embeddings')
+    if embeddings is None and data.get('embedding') is not None:
+        embeddings = [data['embedding']]
+    if not isinstance(embeddings, list) or not embeddings:
+        raise ValueError('embedding or embeddings is required')
+    for embedding in embeddings:
+        if not isinstance(embedding, list) or len(embedding) != face_index.dim:
+            raise ValueError(f'each embedding must be a list of {face_index.dim} numbers')
+    return embeddings
+
+@app.route('/api/missing-persons', methods=['POST'])
+def create_missing_person():
+    try:
+        data = request.json
+        if not isinstance(data, dict) or not data.get('name'):
+            return jsonify({'status': 'error', 'message': 'name is required'}), 400
+        embedding = parse_embeddings(data)[0] if 'embedding' in data else None
+        person = {key: data[key] for key in ('name', 'case_id', 'age', 'last_seen', 'photo_url') if key in data}
+        person['status'] = data.get('status', 'missing')
+        person['created_at'] = datetime.datetime.utcnow()
+        if embedding is not None:
+            person['embedding'] = embedding
+        result = db[MISSING_PERSONS_COLLECTION].insert_one(person)
+        if embedding is not None:
+            face_index.add(result.inserted_id, embedding)
+        return jsonify({'status': 'success', 'id': str(result.inserted_id)}), 201
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/missing-persons/<person_id>/embedding', methods=['PUT'])
+def set_missing_person_embedding(person_id):
+    try:
+        embedding = parse_embeddings(request.json or {})[0]
+        if not ObjectId.is_valid(person_id):
+            return jsonify({'status': 'error', 'message': 'Missing person not found'}), 404
+        result = db[MISSING_PERSONS_COLLECTION].update_one(
+            {'_id': ObjectId(person_id)}, {'$set': {'embedding': embedding}})
+        if result.matched_count == 0:
+            return jsonify({'status': 'error', 'message': 'Missing person not found'}), 404
+        face_index.add(person_id, embedding)
+        return jsonify({'status': 'success'})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/missing-persons/search', methods=['POST'])
+def search_missing_persons():
+    try:
+        data = request.json or {}
+        embeddings = parse_embeddings(data)
+        k = max(1, min(int(data.get('k', 5)), 50))
+        min_score = data.get('min_score')
+        results = face_index.search(embeddings, k, None if min_score is None else float(min_score))
+        # One round trip for the records of every matched person
+        person_ids = {person_id for matches in results for person_id, _ in matches}
+        people = {
+            str(doc['_id']): doc
+            for doc in db[MISSING_PERSONS_COLLECTION].find(
+                {'_id': {'$in': [ObjectId(person_id) for person_id in person_ids if ObjectId.is_valid(person_id)]}}, {'embedding': 0})
+        } if person_ids else {}
+        return jsonify({
+            'status': 'success',
+            'results': [
+                [{'person_id': person_id, 'score': round(score, 4), 'person': people.get(person_id)}
+                 for person_id, score in matches]
+                for matches in results
+            ]
+        })
+    except (TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/missing-persons/index')
+def missing_person_index_stats():
+    return jsonify({**face_index.stats(), 'matcher': face_match_engine.stats()})
+
 @app.route('/Police/Broadcast_Alert')    
 def Police_Broadcast_Alert():
     return render_template("Police/Broadcast_Alert.html")  
@@ -554,13 +1116,28 @@ def submit_alert():
             "created_at": datetime.datetime.utcnow(),
             "updated_at": datetime.datetime.utcnow(),
         }
+        # Optional alert area: centre and radius in metres
+        coordinates = {'latitude': request.form.get('latitude'), 'longitude': request.form.get('longitude')}
+        point = point_from_location(coordinates)
+        if point is not None:
+            alert_data['coordinates'] = {'latitude': point['coordinates'][1], 'longitude': point['coordinates'][0]}
+            alert_data['geo'] = point
+            try:
+                alert_data['radius_m'] = max(0.0, float(request.form.get('radius') or 0))
+            except ValueError:
+                return jsonify({'status': 'error', 'message': 'radius must be a number of metres'}), 400
 
         # Insert into MongoDB
         result = incidents_collection.insert_one(alert_data)
-        alert_data['_id'] = str(result.inserted_id)
+        response_cache.invalidate('incidents', 'alerts')
 
-        # Broadcast the new alert to all connected clients
-        socketio.emit('new_alert', alert_data)
+        # Only wake the devices near the alert; alerts without an area go to everyone
+        rooms = alert_rooms(alert_data)
+        alert_data.pop('geo', None)
+        if rooms is None:
+            socketio.emit('new_alert', alert_data)
+        else:
+            socketio.emit('new_alert', alert_data, to=rooms)
 
         # Send WhatsApp message
         whatsapp_message = (
@@ -573,14 +1150,13 @@ def submit_alert():
             f"Target Audience: {', '.join(alert_data['targetAudience'])}"
         )
 
-        # Schedule the message to be sent in 1 minute
-        now =  datetime.datetime.now()
-        send_time = now + datetime.timedelta(minutes=2)
-        kit.sendwhatmsg(phone_number, whatsapp_message, send_time.hour, send_time.minute)
+        # Queued; a notification worker sends it
+        if phone_number:
+            notification_queue.enqueue('whatsapp', phone_number, whatsapp_message, alert_id=result.inserted_id)
 
         return jsonify({
             'status': 'success',
-            'message': 'Alert submitted and WhatsApp message scheduled successfully',
+            'message': 'Alert submitted and WhatsApp message queued successfully',
             'inserted_id': str(result.inserted_id)
         })
     except Exception as e:
@@ -597,17 +1173,28 @@ def save_marker():
     if not lat or not lng or not title or not priority:
         return jsonify({'error': 'Latitude, longitude, title, and priority are required'}), 400
 
-    # Insert marker into MongoDB
     marker = {'lat': lat, 'lng': lng, 'title': title, 'priority': priority}
+    if not normalize_lat_lng(marker):
+        return jsonify({'error': 'Latitude and longitude must be valid coordinates'}), 400
+
+    # Insert marker into MongoDB
     markers_collection.insert_one(marker)
+    response_cache.invalidate('markers')
+    marker.pop('_id', None)
+    marker.pop('geo', None)
 
     return jsonify(marker), 201
 
-# API to fetch all markers
+# API to fetch the markers in the current map view
 @app.route('/api/markers', methods=['GET'])
+@response_cache.cached('markers')
 def get_markers():
-    markers = list(markers_collection.find({}, {'_id': 0}))  # Exclude MongoDB _id field
-    return jsonify(markers), 200
+    try:
+        bbox, _ = viewport_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # Exclude MongoDB _id field
+    return viewport_response(markers_collection, {}, {'_id': 0, 'geo': 0}, bbox), 200
 
 # Socket.IO event handlers
 @socketio.on('connect')
@@ -622,62 +1209,116 @@ def handle_error(error):
 @socketio.on('disconnect')
 def handle_disconnect():
     print('Client disconnected:', request.sid)
+    location_rooms.pop(request.sid, None)
+
+# Socket id -> the geohash room it is in; Socket.IO drops the membership itself on disconnect
+location_rooms = {}
+
+def update_location_room(location):
+    # Move the calling socket to the room for its current cell; only moves when the cell changes
+    point = point_from_location(location)
+    if point is None:
+        return None
+    lng, lat = point['coordinates']
+    room = 'geo:' + geohash.encode(lat, lng, location_room_precision)
+    previous = location_rooms.get(request.sid)
+    if previous != room:
+        if previous is not None:
+            leave_room(previous)
+        join_room(room)
+        location_rooms[request.sid] = room
+    return room
+
+@socketio.on('update_location')
+def handle_update_location(data):
+    room = update_location_room((data or {}).get('location'))
+    if room is None:
+        return {'status': 'error', 'message': 'location with latitude and longitude is required'}
+    return {'status': 'success', 'room': room}
+
+def check_geofences(citizen_id, location):
+    # Tell the police room and the citizen's own socket about fence crossings
+    point = point_from_location(location)
+    if citizen_id is None or point is None:
+        return
+    lng, lat = point['coordinates']
+    for event in geofence_engine.check(citizen_id, lat, lng):
+        emit('geofence_' + event['event'], event, room='police')
+        emit('geofence_' + event['event'], event)
 
 @socketio.on('sos_triggered')
 def handle_sos(data):
     try:
+        citizen_id = data.get('citizenId')
+
         # Check if this is a deactivation request
         if data.get('status') == 'deactivated':
             # Update all active alerts for this citizen to deactivated
-            db.sos_alerts.update_many(
-                {'citizen_id': data.get('citizenId'), 'status': 'active'},
-                {'$set': {'status': 'deactivated'}}
-            )
+            sos_registry.deactivate(citizen_id)
+            geofence_engine.forget(citizen_id)
             
             # Notify police to remove marker and update UI
             emit('sos_deactivated', {
-                'citizen_id': data.get('citizenId')
+                'citizen_id': citizen_id
             }, broadcast=True, room='police')  # Add broadcast=True
             
             return {'status': 'success', 'message': 'SOS deactivated'}
 
-        # Get existing alert
-        existing_alert = db.sos_alerts.find_one({
-            'citizen_id': data.get('citizenId'),
-            'status': 'active'
-        })
+        update_location_room(data.get('location'))
 
-        # If this is a location update for an existing alert
+        # Get existing alert (answered from memory for active sessions)
+        existing_alert = sos_registry.get(citizen_id) if citizen_id else None
+
+        # If this is a location update for an existing alert, it is written back in the next batch
         if existing_alert:
-            db.sos_alerts.update_one(
-                {'_id': existing_alert['_id']},
-                {'$set': {
-                    'location': data.get('location'),
-                    'timestamp': data.get('timestamp') or datetime.datetime.utcnow().isoformat()
-                }}
+            sos_registry.update_location(
+                citizen_id,
+                data.get('location'),
+                data.get('timestamp') or datetime.datetime.utcnow().isoformat()
             )
+            check_geofences(citizen_id, data.get('location'))
             return {'status': 'success', 'message': 'Location updated'}
 
         # If this is a new alert
         sos_data = {
             'location': data.get('location'),
-            'citizen_id': data.get('citizenId', str(uuid.uuid4())),
+            'citizen_id': citizen_id or str(uuid.uuid4()),
             'timestamp': data.get('timestamp') or datetime.datetime.utcnow().isoformat(),
             'status': 'active'
         }
+        point = point_from_location(sos_data['location'])
+        if point is not None:
+            sos_data['geo'] = point
         
         # Save to database
-        result = db.sos_alerts.insert_one(sos_data)
-        sos_data['_id'] = str(result.inserted_id)
+        inserted_id = sos_registry.activate(sos_data)
+        sos_data.pop('geo', None)
+        sos_data['_id'] = inserted_id
         
         # Broadcast only new alerts
-        emit('sos_alert', json.loads(dumps(sos_data)), room='police', include_self=False)
+        emit('sos_alert', sos_data, room='police', include_self=False)
+        check_geofences(sos_data['citizen_id'], sos_data['location'])
         
         return {'status': 'success', 'message': 'SOS alert sent'}
     except Exception as e:
         print('Error in handle_sos:', str(e))
         return {'status': 'error', 'message': str(e)}
 
+# SafeWalk streams the walker's position while sharing is on
+@socketio.on('safewalk_location')
+def handle_safewalk_location(data):
+    try:
+        update_location_room(data.get('location'))
+        check_geofences(data.get('citizenId'), data.get('location'))
+        return {'status': 'success'}
+    except Exception as e:
+        print('Error in handle_safewalk_location:', str(e))
+        return {'status': 'error', 'message': str(e)}
+
+@socketio.on('safewalk_stopped')
+def handle_safewalk_stopped(data):
+    geofence_engine.forget(data.get('citizenId'))
+
 @socketio.on('join_police_room')
 def handle_police_join():
     join_room('police')
@@ -702,16 +1343,19 @@ def get_local_ip():
         return "127.0.0.1"
 
 if __name__ == "__main__":
-    local_ip = get_local_ip()
-    print(f"Server IP: {local_ip}")
+    # Turn SIGTERM into a normal exit so atexit handlers flush pending SOS/evidence writes
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    local_ip = os.environ.get('HOST') or get_local_ip()
+    port = int(os.environ.get('PORT') or socketio_config.get('port', 5000))
+    print(f"Server IP: {local_ip}:{port}")
     print("Template folder path:", app.template_folder)  # Debug print
-    print("Starting Socket.IO server...")
+    print(f"Starting Socket.IO server ({socketio.async_mode})...")
     socketio.run(
         app,
         host=local_ip,  # Use the actual IP instead of 0.0.0.0
-        port=5000,
-        debug=True,
+        port=port,
+        debug=socketio_config.get('debug', True),
         allow_unsafe_werkzeug=True,  # Add this for development
-        log_output=True,
+        log_output=log_packets,
         use_reloader=False  # Add this to prevent duplicate connections
     )
\ No newline at end of file
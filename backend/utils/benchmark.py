@@ -0,0 +1,452 @@
+"""Benchmark of the backend: REST routes, SOS socket events and detection.
+
+    python -m utils.benchmark run [--scale 1k] [--requests 200] [--out results.json] [--cache]
+                                  [--detector synthetic|real] [--pipeline-seconds 5]
+    python -m utils.benchmark run --scale 100k|1m --mongo-uri mongodb://localhost:27018 [...]
+    python -m utils.benchmark compare before.json after.json
+
+`run` imports app.py in a scratch directory with its own config.json (no
+cameras, no model warm-up, WhatsApp messages only logged), seeds synthetic
+alerts, incidents, citizen reports, SOS history, geofences, markers and
+crime reports at the chosen scale, and then measures, in process:
+
+  * every hot citizen/police REST route through Flask's test client,
+  * `sos_triggered` socket events (new alerts and location updates),
+  * detect_objects frames/sec and a camera pipeline fed by a synthetic video
+    source instead of cv2.VideoCapture(0).
+
+Each result has count, errors, mean/p50/p90/p99 latency in ms and ops/sec.
+The JSON written by --out (default bench-results/<revision>-<scale>.json)
+also records the git revision, so two runs can be diffed with `compare`.
+
+Without --mongo-uri the database is mongomock: no server or network needed,
+but query times are mongomock's (Python scans, no indexes), so compare runs
+against each other rather than against production. Only --scale 1k runs
+offline; it seeds in about a second. Under mongomock every route scans the
+collections in Python, so 100k and 1m would take hours: those scales need
+--mongo-uri, a throwaway mongod whose SurakshaSetu database is dropped first.
+The synthetic detector only letterboxes each frame to 640x640, so its
+frames/sec measures the batching and pipeline overhead; --detector real
+runs the YOLO models (needs ultralytics and the weights).
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+import cv2
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_NAME = "SurakshaSetu"
+SCALES = {"1k": 1000, "100k": 100000, "1m": 1000000}
+CENTER = (19.0760, 72.8777)  # Mumbai; all synthetic points fall within ~0.3 degrees
+VIEWPORT = "72.75,18.95,73.00,19.20"
+INCIDENT_TYPES = ["Theft", "Assault", "Harassment", "Vandalism", "Accident", "Fire"]
+SEVERITIES = ["low", "medium", "high"]
+
+
+class SyntheticCapture:
+    """Stand-in for cv2.VideoCapture: a square moving over a noisy background.
+
+    Frames are generated once and cycled; `fps` > 0 paces read() like a camera.
+    """
+
+    def __init__(self, source=None, width=1280, height=720, fps=0.0, length=60, seed=0):
+        rng = np.random.default_rng(seed)
+        background = rng.integers(0, 60, (height, width, 3), dtype=np.uint8)
+        self.frames = []
+        for i in range(length):
+            frame = background.copy()
+            x = int((width - 120) * i / max(1, length - 1))
+            frame[height // 2 - 60:height // 2 + 60, x:x + 120] = (40, 200, 240)
+            self.frames.append(frame)
+        self.interval = 1.0 / fps if fps else 0.0
+        self.index = 0
+        self.next_at = time.monotonic()
+
+    def read(self):
+        if self.interval:
+            delay = self.next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.next_at = max(self.next_at + self.interval, time.monotonic())
+        frame = self.frames[self.index % len(self.frames)]
+        self.index += 1
+        return True, frame
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+
+def synthetic_run_batch(frames):
+    # Same preprocessing shape as the detector, no model
+    results = []
+    for frame in frames:
+        height, width = frame.shape[:2]
+        scale = 640.0 / max(height, width)
+        resized = cv2.resize(frame, (int(width * scale), int(height * scale)))
+        canvas = np.zeros((640, 640, 3), dtype=np.uint8)
+        canvas[:resized.shape[0], :resized.shape[1]] = resized
+        results.append([])
+    return results
+
+
+def summarize(samples, errors, wall_seconds):
+    samples_ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    if not len(samples_ms):
+        return {"count": 0, "errors": errors}
+    return {
+        "count": len(samples_ms),
+        "errors": errors,
+        "mean_ms": round(float(samples_ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(samples_ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(samples_ms, 90)), 3),
+        "p99_ms": round(float(np.percentile(samples_ms, 99)), 3),
+        "ops_per_second": round(len(samples_ms) / wall_seconds, 1) if wall_seconds else None,
+    }
+
+
+def measure(fn, count, warmup=5):
+    """Time `count` calls of fn(i); fn returns False for a failed call."""
+    for i in range(warmup):
+        fn(i)
+    samples, errors = [], 0
+    started = time.perf_counter()
+    for i in range(count):
+        t0 = time.perf_counter()
+        ok = fn(i)
+        samples.append(time.perf_counter() - t0)
+        if ok is False:
+            errors += 1
+    return summarize(samples, errors, time.perf_counter() - started)
+
+
+def _points(rng, count):
+    lats = CENTER[0] + rng.uniform(-0.15, 0.15, count)
+    lngs = CENTER[1] + rng.uniform(-0.15, 0.15, count)
+    return lats, lngs
+
+
+def seed(db, count, chunk=10000, seed_value=0):
+    """Insert synthetic documents; returns the number seeded per collection."""
+    rng = np.random.default_rng(seed_value)
+    base = datetime.datetime(2024, 1, 1)
+    seeded = {}
+
+    def insert(name, make, total):
+        for start in range(0, total, chunk):
+            db[name].insert_many([make(i) for i in range(start, min(total, start + chunk))], ordered=False)
+        seeded[name] = total
+
+    lats, lngs = _points(rng, count)
+    types = rng.integers(0, len(INCIDENT_TYPES), count)
+    levels = rng.integers(0, len(SEVERITIES), count)
+
+    insert("Alerts", lambda i: {
+        "alertType": INCIDENT_TYPES[types[i]], "alertTitle": f"Alert {i}", "alertMessage": "Synthetic alert",
+        "alertLocation": "Mumbai", "alertDuration": 24, "targetAudience": ["all"],
+        "created_at": base + datetime.timedelta(seconds=i),
+    }, count)
+    insert("Incidents", lambda i: {
+        "incident_type": INCIDENT_TYPES[types[i]], "date_time": "2024-01-01T10:00", "location": "Mumbai",
+        "reporting_officer": f"Officer {i % 50}", "status_type": "open", "priority_type": SEVERITIES[levels[i]],
+        "notice": "", "description": "Synthetic incident", "evidence_files": [],
+        "created_at": base + datetime.timedelta(seconds=i),
+    }, count)
+    insert("Alerts_Citizen", lambda i: {
+        "alert_id": f"bench-{i}", "incident_type": INCIDENT_TYPES[types[i]], "date_time": "2024-01-01T10:00",
+        "location": "Mumbai", "reporting_citizen": f"citizen-{i}", "report_status": "pending",
+        "priority_type": SEVERITIES[levels[i]], "notice": "", "description": "Synthetic report",
+        "evidence_files": [], "created_at": base + datetime.timedelta(seconds=i),
+    }, count)
+    # Crime reports behind /api/crime-data and the heatmap cells
+    insert("heatmap", lambda i: {
+        "lat": float(lats[i]), "lng": float(lngs[i]), "type": INCIDENT_TYPES[types[i]],
+        "severity": SEVERITIES[levels[i]], "description": "Synthetic report", "intensity": 0.5,
+        "geo": {"type": "Point", "coordinates": [float(lngs[i]), float(lats[i])]},
+    }, count)
+    small = max(10, count // 100)
+    insert("Markers", lambda i: {
+        "lat": float(lats[i]), "lng": float(lngs[i]), "title": f"Marker {i}",
+        "geo": {"type": "Point", "coordinates": [float(lngs[i]), float(lats[i])]},
+    }, max(10, count // 10))
+    insert("sos_alerts", lambda i: {
+        "citizen_id": f"history-{i}", "status": "deactivated", "timestamp": "2024-01-01T10:00:00",
+        "location": {"latitude": float(lats[i]), "longitude": float(lngs[i])},
+        "geo": {"type": "Point", "coordinates": [float(lngs[i]), float(lats[i])]},
+    }, small)
+    insert("geofences", lambda i: {
+        "name": f"Zone {i}", "coordinate": {"latitude": float(lats[i]), "longitude": float(lngs[i])},
+        "radius": 300 + (i % 10) * 100, "alertEnter": True, "alertExit": True,
+    }, small)
+    return seeded
+
+
+def _prepare_workdir(workdir, use_cache):
+    config = {
+        "phone_number": "+910000000000",
+        "cameras": {},
+        "ensure_indexes": False,
+        "inference": {"warmup": False, "workers": 0},
+        "notifications": {"whatsapp": {"sender": "log"}},
+        "cache": {"enabled": use_cache},
+        "faces": {"index_dir": os.path.join(workdir, "faces")},
+        "evidence": {"output_dir": os.path.join(workdir, "cctv"), "store_dir": os.path.join(workdir, "store")},
+    }
+    with open(os.path.join(workdir, "config.json"), "w") as f:
+        json.dump(config, f)
+
+
+def _import_app(mongo_uri):
+    """Import app.py against mongomock, or against the throwaway server at mongo_uri."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    if mongo_uri:
+        import pymongo
+
+        real_client = pymongo.MongoClient
+        with mock.patch("pymongo.MongoClient", lambda *args, **kwargs: real_client(mongo_uri, **kwargs)):
+            import app
+        app.client.drop_database(DB_NAME)
+        return app, None
+    import mongomock
+
+    patcher = mongomock.patch(servers=(("localhost", 27017),))
+    patcher.start()
+    import app
+    return app, patcher
+
+
+def bench_routes(app, requests):
+    client = app.app.test_client()
+    routes = [
+        ("GET /api/citizen/alerts", "get", "/api/citizen/alerts", None),
+        ("GET /api/citizen/incident-alerts", "get", "/api/citizen/incident-alerts", None),
+        ("GET /api/citizen/geofencing", "get", "/api/citizen/geofencing", None),
+        ("GET /api/citizen/sos", "get", "/api/citizen/sos", None),
+        ("GET /api/crime-data", "get", "/api/crime-data", None),
+        ("GET /api/crime-heatmap/cells", "get", f"/api/crime-heatmap/cells?bbox={VIEWPORT}&zoom=12", None),
+        ("GET /api/markers", "get", "/api/markers", None),
+        ("GET /police/incident-verify", "get", "/police/incident-verify", None),
+        ("GET /police/incident-alerts", "get", "/police/incident-alerts", None),
+    ]
+    results = {}
+    for name, method, path, _ in routes:
+        def call(i, method=method, path=path):
+            return getattr(client, method)(path).status_code < 400
+        results[name] = measure(call, requests)
+        print(f"  {name}: {results[name].get('p50_ms')} ms p50")
+
+    rng = np.random.default_rng(1)
+    lats, lngs = _points(rng, requests + 5)
+
+    def report(i):
+        return client.post("/api/report-crime", json={
+            "lat": float(lats[i]), "lng": float(lngs[i]), "type": "Theft",
+            "severity": "medium", "description": "Benchmark report", "intensity": 0.5,
+        }).status_code < 400
+    results["POST /api/report-crime"] = measure(report, requests)
+    print(f"  POST /api/report-crime: {results['POST /api/report-crime'].get('p50_ms')} ms p50")
+    return results
+
+
+def bench_sos(app, requests):
+    police = app.socketio.test_client(app.app)
+    police.emit("join_police_room")
+    citizen = app.socketio.test_client(app.app)
+    rng = np.random.default_rng(2)
+    lats, lngs = _points(rng, requests + 5)
+
+    def location(i):
+        return {"latitude": float(lats[i]), "longitude": float(lngs[i])}
+
+    def new_alert(i):
+        ack = citizen.emit("sos_triggered", {"citizenId": f"bench-citizen-{i}", "location": location(i)},
+                           callback=True)
+        return isinstance(ack, dict) and ack.get("status") == "success"
+
+    def update(i):
+        ack = citizen.emit("sos_triggered", {"citizenId": f"bench-citizen-{i % 20}", "location": location(i)},
+                           callback=True)
+        police.get_received()  # keep the test client's inbox from growing
+        return isinstance(ack, dict) and ack.get("status") == "success"
+
+    results = {
+        "socket sos_triggered (new)": measure(new_alert, requests),
+        "socket sos_triggered (update)": measure(update, requests),
+    }
+    for name, row in results.items():
+        print(f"  {name}: {row.get('p50_ms')} ms p50")
+    citizen.disconnect()
+    police.disconnect()
+    return results
+
+
+def bench_detection(app, frames, pipeline_seconds, width, height):
+    from utils.camera_pipeline import CameraPipeline
+
+    capture = SyntheticCapture(width=width, height=height)
+    results = {"detect_objects": measure(lambda i: app.detect_objects(capture.read()[1], "bench") is not None,
+                                         frames, warmup=3)}
+    print(f"  detect_objects: {results['detect_objects'].get('ops_per_second')} frames/s")
+
+    if pipeline_seconds > 0:
+        pipeline = CameraPipeline(
+            "bench", "synthetic", app.detect_objects,
+            capture_factory=lambda source: SyntheticCapture(width=width, height=height, fps=30.0),
+            scheduler=app.make_scheduler(),
+        )
+        pipeline.start()
+        time.sleep(1.0)  # let the stages fill up
+        start_seq = pipeline.stats()["last_frame_seq"]
+        start_frames = app.inference_engine.frames_run
+        time.sleep(pipeline_seconds)
+        stats = pipeline.stats()
+        pipeline.stop(timeout=5.0)
+        results["camera pipeline (30 fps source)"] = {
+            "seconds": pipeline_seconds,
+            "encoded_fps": round((stats["last_frame_seq"] - start_seq) / pipeline_seconds, 1),
+            "inferred_fps": round((app.inference_engine.frames_run - start_frames) / pipeline_seconds, 1),
+            "capture_dropped": stats["capture_dropped"],
+            "encode_dropped": stats["encode_dropped"],
+        }
+        print(f"  camera pipeline: {results['camera pipeline (30 fps source)']}")
+    return results
+
+
+def _revision():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return revision + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args):
+    count = SCALES[args.scale]
+    revision = _revision()
+    out = os.path.abspath(args.out or os.path.join("bench-results", f"{revision}-{args.scale}.json"))
+    workdir = tempfile.mkdtemp(prefix="suraksha-bench-")
+    _prepare_workdir(workdir, args.cache)
+    os.chdir(workdir)
+
+    app, patcher = _import_app(args.mongo_uri)
+    try:
+        if args.detector == "synthetic":
+            app.inference_engine.run_batch = synthetic_run_batch
+
+        started = time.perf_counter()
+        seeded = seed(app.db, count)
+        # Map cells come from the crime reports
+        app.heatmap_tiles.rebuild()
+        app.geofence_engine.sync()
+        seed_seconds = time.perf_counter() - started
+        print(f"Seeded {seeded} in {seed_seconds:.1f}s")
+
+        results = {}
+        print("REST routes")
+        results.update(bench_routes(app, args.requests))
+        print("Socket events")
+        results.update(bench_sos(app, args.requests))
+        print("Detection")
+        results.update(bench_detection(app, args.frames, args.pipeline_seconds, args.width, args.height))
+    finally:
+        app.sos_registry.stop()
+        app.notification_queue.stop()
+        if patcher is not None:
+            patcher.stop()
+
+    report = {
+        "meta": {
+            "revision": revision,
+            "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+            "scale": args.scale,
+            "documents": count,
+            "seeded": seeded,
+            "seed_seconds": round(seed_seconds, 1),
+            "database": "mongod" if args.mongo_uri else "mongomock",
+            "detector": args.detector,
+            "cache": args.cache,
+            "requests": args.requests,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Wrote {out}")
+
+
+def _change(old, new):
+    if old is None or new is None:
+        return "      n/a"
+    if not old:
+        return "         "
+    return f"{(new - old) / old * 100.0:+8.1f}%"
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{before['meta']['revision']} ({before['meta']['scale']}) -> "
+          f"{after['meta']['revision']} ({after['meta']['scale']})")
+    print(f"{'benchmark':40} {'p50 ms':>18} {'p99 ms':>18} {'ops/s':>18}")
+    for name in sorted(set(before["results"]) | set(after["results"])):
+        old, new = before["results"].get(name, {}), after["results"].get(name, {})
+        if "encoded_fps" in old or "encoded_fps" in new:
+            print(f"{name:40} encoded fps {old.get('encoded_fps')} -> {new.get('encoded_fps')} "
+                  f"{_change(old.get('encoded_fps'), new.get('encoded_fps'))}")
+            continue
+        columns = []
+        for key in ("p50_ms", "p99_ms", "ops_per_second"):
+            columns.append(f"{new.get(key, 'n/a'):>8} {_change(old.get(key), new.get(key))}")
+        print(f"{name:40} " + " ".join(columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["run", "compare"])
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--scale", default="1k", choices=sorted(SCALES),
+                        help="1k runs offline on mongomock; 100k and 1m need --mongo-uri (a live mongod)")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--pipeline-seconds", type=float, default=5.0)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--detector", default="synthetic", choices=["synthetic", "real"])
+    parser.add_argument("--cache", action="store_true", help="keep the response cache on (off by default)")
+    parser.add_argument("--mongo-uri", help="throwaway mongod to run against instead of mongomock")
+    parser.add_argument("--out", help="result file (default bench-results/<revision>-<scale>.json)")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        if len(args.files) != 2:
+            parser.error("compare needs two result files")
+        compare(*args.files)
+    else:
+        if SCALES[args.scale] > SCALES["1k"] and not args.mongo_uri:
+            parser.error(f"--scale {args.scale} needs --mongo-uri; offline (mongomock) runs are limited to 1k")
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
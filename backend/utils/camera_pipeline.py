@@ -0,0 +1,251 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+
+
+class DropOldestQueue:
+    """Bounded queue where a put on a full queue evicts the oldest item instead of blocking."""
+
+    def __init__(self, maxsize=2):
+        self._items = deque(maxlen=max(1, int(maxsize)))
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Return the oldest item, or None if the queue was closed or the timeout expired."""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reopen(self):
+        with self._cond:
+            self._closed = False
+            self._items.clear()
+
+    def qsize(self):
+        return len(self._items)
+
+
+def parse_source(source):
+    # Local webcams are given as device indexes, everything else as URLs/paths
+    if isinstance(source, str) and source.isdigit():
+        return int(source)
+    return source
+
+
+class CameraPipeline:
+    """One capture thread, one inference stage and one JPEG encode stage per camera.
+
+    Stages are joined by drop-oldest queues so a slow stage sheds frames instead of
+    stalling capture. Viewers never touch the camera: they wait for the latest
+    encoded JPEG, so the per-camera cost does not depend on the number of viewers.
+
+    With `idle_seconds` set, the pipeline stops itself (releasing the camera and
+    the detector) once it has had no viewers for that long; start() brings it
+    back.
+    """
+
+    def __init__(self, camera_id, source, detect, on_detection=None, queue_size=2,
+                 jpeg_quality=80, reconnect_delay=2.0, capture_factory=cv2.VideoCapture,
+                 scheduler=None, on_frame=None, embed_faces=None, on_faces=None, stage_timer=None,
+                 idle_seconds=None):
+        self.camera_id = camera_id
+        self.source = parse_source(source)
+        self.detect = detect
+        self.scheduler = scheduler
+        self.on_detection = on_detection
+        self.on_frame = on_frame
+        self.embed_faces = embed_faces
+        self.on_faces = on_faces
+        # stage_timer(camera_id, stage, seconds) for capture/inference/encode/frame_age
+        self.stage_timer = stage_timer
+        self.jpeg_quality = int(jpeg_quality)
+        self.reconnect_delay = reconnect_delay
+        self.capture_factory = capture_factory
+        self.idle_seconds = idle_seconds
+
+        self._capture_queue = DropOldestQueue(queue_size)
+        self._encode_queue = DropOldestQueue(queue_size)
+        self._latest_cond = threading.Condition()
+        self._latest_jpeg = None
+        self._latest_seq = 0
+        self._running = False
+        self._generation = 0  # threads of an earlier start() exit even if a new one began
+        self._threads = []
+        self._idle_since = time.monotonic()
+        self.viewers = 0
+        self.last_detections = []
+
+    def start(self):
+        # A viewer is about to attach: the idle grace period starts over
+        self._idle_since = time.monotonic()
+        if self._running:
+            return
+        self._running = True
+        self._generation += 1
+        self._capture_queue.reopen()
+        self._encode_queue.reopen()
+        self._threads = [
+            threading.Thread(target=loop, args=(self._generation,), name=f"camera-{self.camera_id}-{name}",
+                             daemon=True)
+            for name, loop in (("capture", self._capture_loop),
+                               ("inference", self._inference_loop),
+                               ("encode", self._encode_loop))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _halt(self):
+        self._running = False
+        self._capture_queue.close()
+        self._encode_queue.close()
+        with self._latest_cond:
+            self._latest_cond.notify_all()
+
+    def stop(self, timeout=None):
+        self._halt()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    @property
+    def running(self):
+        return self._running
+
+    def _active(self, generation):
+        return self._running and self._generation == generation
+
+    def _idle_expired(self):
+        if not self.idle_seconds or self.viewers:
+            return False
+        if time.monotonic() - self._idle_since < self.idle_seconds:
+            return False
+        print(f"Camera {self.camera_id} has had no viewers for {self.idle_seconds}s, stopping it")
+        # Called from the capture thread, so the threads are left to exit rather than joined
+        self._halt()
+        return True
+
+    def _capture_loop(self, generation):
+        seq = 0
+        while self._active(generation):
+            cap = self.capture_factory(self.source)
+            while self._active(generation):
+                if self._idle_expired():
+                    break
+                started = time.perf_counter()
+                success, frame = cap.read()
+                if not success:
+                    break
+                if self.stage_timer is not None:
+                    self.stage_timer(self.camera_id, "capture", time.perf_counter() - started)
+                seq += 1
+                self._capture_queue.put((seq, time.time(), frame))
+            cap.release()
+            if self._active(generation) and not self._idle_expired():
+                print(f"Camera {self.camera_id} lost, reconnecting in {self.reconnect_delay}s")
+                time.sleep(self.reconnect_delay)
+
+    def _inference_loop(self, generation):
+        while self._active(generation):
+            item = self._capture_queue.get(timeout=1.0)
+            if item is None:
+                continue
+            seq, captured_at, frame = item
+            if self.on_frame is not None:
+                self.on_frame(self.camera_id, frame, captured_at)
+            # Frames the scheduler skips go straight to the encoder
+            if self.scheduler is None or self.scheduler.should_infer(frame):
+                started = time.perf_counter()
+                try:
+                    detected = self.detect(frame, self.camera_id)
+                except Exception as e:
+                    print(f"Inference error on camera {self.camera_id}:", str(e))
+                    detected = []
+                if self.stage_timer is not None:
+                    self.stage_timer(self.camera_id, "inference", time.perf_counter() - started)
+                if self.scheduler is not None:
+                    self.scheduler.record(detected)
+                self.last_detections = detected
+                if detected and self.on_detection is not None:
+                    self.on_detection(self.camera_id, detected, frame, captured_at)
+                if self.embed_faces is not None and self.on_faces is not None:
+                    self._match_faces(frame, captured_at)
+            self._encode_queue.put((seq, captured_at, frame))
+
+    def _match_faces(self, frame, captured_at):
+        # Face search rides on the frames the scheduler already picked for inference
+        try:
+            embeddings = self.embed_faces(frame)
+            if embeddings is not None and len(embeddings):
+                self.on_faces(self.camera_id, embeddings, frame, captured_at)
+        except Exception as e:
+            print(f"Face matching error on camera {self.camera_id}:", str(e))
+
+    def _encode_loop(self, generation):
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality]
+        while self._active(generation):
+            item = self._encode_queue.get(timeout=1.0)
+            if item is None:
+                continue
+            seq, captured_at, frame = item
+            started = time.perf_counter()
+            ret, buffer = cv2.imencode('.jpg', frame, params)
+            if not ret:
+                continue
+            if self.stage_timer is not None:
+                self.stage_timer(self.camera_id, "encode", time.perf_counter() - started)
+                # Capture to ready-for-viewers, queueing included
+                self.stage_timer(self.camera_id, "frame_age", time.time() - captured_at)
+            with self._latest_cond:
+                self._latest_jpeg = buffer.tobytes()
+                self._latest_seq = seq
+                self._latest_cond.notify_all()
+
+    def frames(self, timeout=5.0):
+        """Yield each newly encoded JPEG; frames a slow viewer misses are simply skipped."""
+        last_seq = 0
+        with self._latest_cond:
+            self.viewers += 1
+        try:
+            while self._running:
+                with self._latest_cond:
+                    if self._latest_seq == last_seq:
+                        self._latest_cond.wait(timeout)
+                    if self._latest_seq == last_seq:
+                        continue
+                    jpeg, last_seq = self._latest_jpeg, self._latest_seq
+                yield jpeg
+        finally:
+            with self._latest_cond:
+                self.viewers -= 1
+                if not self.viewers:
+                    self._idle_since = time.monotonic()
+
+    def stats(self):
+        return {
+            "camera_id": self.camera_id,
+            "running": self._running,
+            "viewers": self.viewers,
+            "last_frame_seq": self._latest_seq,
+            "capture_dropped": self._capture_queue.dropped,
+            "encode_dropped": self._encode_queue.dropped,
+            "scheduler": self.scheduler.stats() if self.scheduler is not None else None,
+        }
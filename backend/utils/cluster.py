@@ -0,0 +1,114 @@
+"""Run several Socket.IO server processes that share rooms through a message queue.
+
+    python -m utils.cluster run --workers 4 [--base-port 5001] [--host 0.0.0.0]
+                                [--message-queue redis://localhost:6379/0]
+                                [--async-mode gevent|threading|eventlet]
+
+Every worker is `app.py` on its own port. Emits from any worker (an SOS POST,
+a detection broadcast, ...) go through the message queue and reach sockets in
+the `police` room on all of them. Browsers and apps use long-polling before
+upgrading, so the load balancer in front must be sticky per client; the run
+command prints an nginx upstream for the workers it started.
+
+Workers run gevent by default (monkey-patched before app.py is imported), so a
+worker holds thousands of idle sockets as greenlets instead of one thread
+each. Camera capture, inference and the other blocking background threads
+don't belong in a gevent worker: leave `cameras` empty and `inference.warmup`
+off in the cluster's config and run those in a plain `python app.py`
+(threading) process, or pass --async-mode threading. That is also why a
+single `python app.py` still defaults to threading.
+"""
+import argparse
+import os
+import runpy
+import signal
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def worker_env(port, host, message_queue, async_mode):
+    env = dict(os.environ)
+    env.update({"PORT": str(port), "HOST": host, "SOCKETIO_ASYNC_MODE": async_mode})
+    if message_queue:
+        env["SOCKETIO_MESSAGE_QUEUE"] = message_queue
+    return env
+
+
+def start_workers(count, base_port=5001, host="127.0.0.1", message_queue=None, async_mode="gevent",
+                  quiet=False):
+    """Spawn `count` app.py workers on consecutive ports; returns the Popen objects."""
+    output = subprocess.DEVNULL if quiet else None
+    return [
+        subprocess.Popen(
+            [sys.executable, "-m", "utils.cluster", "worker"],
+            cwd=BACKEND_DIR,
+            env=worker_env(base_port + i, host, message_queue, async_mode),
+            stdout=output,
+            stderr=output,
+        )
+        for i in range(count)
+    ]
+
+
+def stop_workers(processes, timeout=10.0):
+    for process in processes:
+        if process.poll() is None:
+            process.send_signal(signal.SIGTERM)
+    deadline = time.monotonic() + timeout
+    for process in processes:
+        try:
+            process.wait(max(0.1, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def nginx_upstream(count, base_port, host):
+    servers = "\n".join(f"    server {host}:{base_port + i};" for i in range(count))
+    return f"upstream suraksha_socketio {{\n    ip_hash;  # polling needs sticky sessions\n{servers}\n}}"
+
+
+def run_worker():
+    async_mode = os.environ.get("SOCKETIO_ASYNC_MODE", "gevent")
+    if async_mode == "gevent":
+        from gevent import monkey
+        monkey.patch_all()
+    elif async_mode == "eventlet":
+        import eventlet
+        eventlet.monkey_patch()
+    sys.path.insert(0, BACKEND_DIR)
+    runpy.run_path(os.path.join(BACKEND_DIR, "app.py"), run_name="__main__")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["run", "worker"])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--base-port", type=int, default=5001)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--message-queue", default="redis://localhost:6379/0")
+    parser.add_argument("--async-mode", default="gevent", choices=["gevent", "threading", "eventlet"])
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        run_worker()
+        return
+
+    processes = start_workers(args.workers, args.base_port, args.host, args.message_queue, args.async_mode)
+    print(nginx_upstream(args.workers, args.base_port, args.host))
+    # Turn SIGTERM into a normal exit so the workers get stopped below
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        while all(process.poll() is None for process in processes):
+            time.sleep(1.0)
+        print("A worker exited, stopping the cluster")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_workers(processes)
+
+
+if __name__ == "__main__":
+    main()
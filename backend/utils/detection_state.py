@@ -0,0 +1,46 @@
+import threading
+import time
+
+
+class DetectionStore:
+    """Thread-safe, versioned record of what each camera currently sees.
+
+    `update` only bumps the version (and calls `on_change`) when a camera's set of
+    detected labels actually changes, so listeners are not flooded with repeats.
+    """
+
+    def __init__(self, on_change=None):
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._cameras = {}
+        self.version = 0
+
+    def update(self, camera_id, detected):
+        labels = sorted(set(detected))
+        with self._lock:
+            current = self._cameras.get(camera_id)
+            if current is not None and current["detected_objects"] == labels:
+                return None
+            self.version += 1
+            # Entries are replaced, never mutated, so readers can use them without the lock
+            entry = {
+                "camera_id": camera_id,
+                "detected_objects": labels,
+                "version": self.version,
+                "updated_at": time.time(),
+            }
+            self._cameras[camera_id] = entry
+
+        if self.on_change is not None:
+            try:
+                self.on_change(entry)
+            except Exception as e:
+                print("Detection listener error:", str(e))
+        return entry
+
+    def get(self, camera_id):
+        return self._cameras.get(camera_id)
+
+    def snapshot(self):
+        with self._lock:
+            return self.version, list(self._cameras.values())
@@ -0,0 +1,106 @@
+import os
+import threading
+
+VIOLENCE_MODEL_PATH = "viodec_mk1.pt"
+ARMS_MODEL_PATH = "arms_detect.pt"
+
+# "torch" runs the .pt weights directly; the others run files made by utils/model_export.py
+BACKENDS = ("torch", "onnx", "openvino")
+
+violence_classes = ["Violence ","knife","guns","NonViolence"]
+arms_classes = ["Gun", "Knife", "Pistol", "Handgun", "Rifle"]
+
+
+def exported_path(weights, backend="torch", int8=False):
+    """Where the exported copy of `weights` lives for a backend."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}, expected one of {BACKENDS}")
+    if backend == "torch":
+        return weights
+    stem = os.path.splitext(weights)[0] + ("_int8" if int8 else "")
+    if backend == "onnx":
+        return stem + ".onnx"
+    return stem + "_openvino_model"
+
+
+def load_models(backend="torch", int8=False):
+    # Imported here so processes that never run inference don't pay for torch
+    from ultralytics import YOLO
+    paths = [exported_path(weights, backend, int8) for weights in (VIOLENCE_MODEL_PATH, ARMS_MODEL_PATH)]
+    if backend == "torch":
+        return tuple(YOLO(path) for path in paths)
+    for path in paths:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found, run: python -m utils.model_export export --backend {backend}"
+                                    + (" --int8" if int8 else ""))
+    return tuple(YOLO(path, task="detect") for path in paths)
+
+
+def labels_from_results(violence_result, arms_result):
+    detected = []
+
+    # Check for violence
+    for box in violence_result.boxes:
+        class_id = int(box.cls)
+        if violence_classes[class_id] == "Violence":
+            detected.append("Violence")
+
+    # Check for arms
+    for box in arms_result.boxes:
+        class_id = int(box.cls)
+        if arms_classes[class_id] in arms_classes:
+            detected.append(arms_classes[class_id])
+
+    return detected
+
+
+def detect_batch(models, frames):
+    """Run both models once over a whole batch of frames (one label list per frame)."""
+    violence_model, arms_model = models
+    violence_results = violence_model(frames)
+    arms_results = arms_model(frames)
+    return [labels_from_results(v, a) for v, a in zip(violence_results, arms_results)]
+
+
+def warm_up(models, size=(640, 640)):
+    # One dummy pass so the first real frame doesn't pay for lazy graph/kernel setup
+    import numpy as np
+    detect_batch(models, [np.zeros((size[1], size[0], 3), dtype=np.uint8)])
+
+
+class LocalDetector:
+    """Runs the models in this process, loading them on first use.
+
+    `warm_up_async` loads and warms the models on a background thread so the web
+    server can start serving immediately; `ready` is set once that has finished.
+    """
+
+    def __init__(self, backend="torch", int8=False):
+        self.backend = backend
+        self.int8 = int8
+        self.models = None
+        self.error = None
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self.models is None:
+                models = load_models(self.backend, self.int8)
+                warm_up(models)
+                self.models = models
+                self.ready.set()
+        return self.models
+
+    def _warm(self):
+        try:
+            self.load()
+        except Exception as e:
+            self.error = str(e)
+            print("Model warm-up failed:", self.error)
+
+    def warm_up_async(self):
+        threading.Thread(target=self._warm, name="model-warmup", daemon=True).start()
+
+    def run_batch(self, frames):
+        return detect_batch(self.load(), frames)
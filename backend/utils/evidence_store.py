@@ -0,0 +1,189 @@
+import datetime
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+from queue import Queue, Full, Empty
+
+import cv2
+from pymongo import ReturnDocument
+
+# Marker put on the queue to stop the thumbnail worker
+_STOP = object()
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "bmp", "webp"}
+VIDEO_EXTENSIONS = {"mp4", "webm", "ogg", "mov", "avi", "mkv", "3gp"}
+
+
+def clean_extension(filename):
+    """Lower-case extension of an uploaded filename, or "bin" if it has none usable."""
+    _, ext = os.path.splitext(filename or "")
+    ext = ext.lstrip(".").lower()
+    return ext if ext.isalnum() and len(ext) <= 8 else "bin"
+
+
+class EvidenceStore:
+    """Content-addressed storage for uploaded evidence.
+
+    Werkzeug has already received the whole upload (spooled to a temporary
+    file once it is large) before the view runs; save() then hashes it and
+    copies it into the store in `chunk_size` pieces, so it is never held in
+    memory at once. Files are stored as <root>/<first two hex digits>/<sha256>.<ext>,
+    so the same file uploaded twice is kept once and a new upload can never
+    overwrite another. Metadata (size, type, original names) lives in Mongo
+    keyed by the digest. Thumbnails (images) and poster frames (videos) are
+    made by a background worker.
+    """
+
+    def __init__(self, collection, root_dir="static/uploads/evidence/store", chunk_size=1 << 20,
+                 queue_size=64, thumbnail_width=320):
+        self.collection = collection
+        self.root_dir = root_dir
+        self.chunk_size = int(chunk_size)
+        self.thumbnail_width = int(thumbnail_width)
+        self._queue = Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stored = 0
+        self.deduplicated = 0
+        self.dropped_jobs = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="evidence-thumbnails", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=10.0):
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def path_for(self, digest, ext):
+        return os.path.join(self.root_dir, digest[:2], f"{digest}.{ext}")
+
+    def thumbnail_path(self, digest):
+        return os.path.join(self.root_dir, digest[:2], f"{digest}_thumb.jpg")
+
+    def save(self, upload):
+        """Store a werkzeug FileStorage; returns (digest, ext)."""
+        ext = clean_extension(upload.filename)
+        os.makedirs(self.root_dir, exist_ok=True)
+        sha256 = hashlib.sha256()
+        size = 0
+        # Write under a temporary name in the store itself, so the final rename stays on one filesystem
+        fd, temp_path = tempfile.mkstemp(dir=self.root_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = upload.stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    sha256.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            digest = sha256.hexdigest()
+            now = datetime.datetime.utcnow()
+            # The first upload of these bytes fixes the extension, so a later upload under
+            # another name maps to the same file instead of writing a copy nothing refers to
+            meta = self.collection.find_one_and_update(
+                {"_id": digest},
+                {
+                    "$setOnInsert": {
+                        "ext": ext,
+                        "size": size,
+                        "content_type": mimetypes.guess_type(f"{digest}.{ext}")[0] or "application/octet-stream",
+                        "thumbnail": False,
+                        "created_at": now,
+                    },
+                    "$addToSet": {"original_names": upload.filename},
+                    "$set": {"last_uploaded_at": now},
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            ext = meta["ext"]
+            path = self.path_for(digest, ext)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                os.remove(temp_path)
+                duplicate = True
+            else:
+                os.replace(temp_path, path)
+                duplicate = False
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        if duplicate:
+            self.deduplicated += 1
+        else:
+            self.stored += 1
+            if ext in IMAGE_EXTENSIONS or ext in VIDEO_EXTENSIONS:
+                self._submit((digest, ext))
+        return digest, ext
+
+    def _submit(self, job):
+        self.start()
+        try:
+            self._queue.put_nowait(job)
+        except Full:
+            # The evidence itself is stored; only its thumbnail is skipped
+            self.dropped_jobs += 1
+            print(f"Evidence thumbnail queue full, skipped {job[0]}")
+
+    def _first_frame(self, path, ext):
+        if ext in IMAGE_EXTENSIONS:
+            return cv2.imread(path)
+        capture = cv2.VideoCapture(path)
+        try:
+            # Poster frame about a second in, which skips black lead-in frames
+            fps = capture.get(cv2.CAP_PROP_FPS) or 0
+            frames = capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0
+            if fps > 0 and frames > fps:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, int(fps))
+            ok, frame = capture.read()
+            return frame if ok else None
+        finally:
+            capture.release()
+
+    def _make_thumbnail(self, digest, ext):
+        frame = self._first_frame(self.path_for(digest, ext), ext)
+        if frame is None:
+            return False
+        height, width = frame.shape[:2]
+        if width > self.thumbnail_width:
+            frame = cv2.resize(frame, (self.thumbnail_width, int(height * self.thumbnail_width / width)),
+                               interpolation=cv2.INTER_AREA)
+        if not cv2.imwrite(self.thumbnail_path(digest), frame, [cv2.IMWRITE_JPEG_QUALITY, 80]):
+            return False
+        self.collection.update_one({"_id": digest}, {"$set": {"thumbnail": True}})
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                job = self._queue.get(timeout=1.0)
+            except Empty:
+                continue
+            if job is _STOP:
+                return
+            try:
+                self._make_thumbnail(*job)
+            except Exception as e:
+                print("Evidence thumbnail failed:", str(e))
+
+    def stats(self):
+        return {
+            "stored": self.stored,
+            "deduplicated": self.deduplicated,
+            "queued_thumbnails": self._queue.qsize(),
+            "dropped_jobs": self.dropped_jobs,
+        }
@@ -0,0 +1,223 @@
+import datetime
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from queue import Queue, Full, Empty
+
+import cv2
+
+# Marker put on the queue to stop the worker thread
+_STOP = object()
+
+
+class EvidenceWriter:
+    """Saves CCTV evidence (a snapshot plus a pre/post-event clip) off the capture path.
+
+    Every camera keeps a small ring buffer of recent, downscaled frames. The first
+    detection opens an incident that copies the buffer as the pre-event part and
+    keeps collecting frames until `post_seconds` after the last detection.
+    Detections within `debounce_seconds` of an incident ending are ignored. Disk
+    writes and clip encoding run on a worker thread fed by a bounded queue, and
+    incident metadata is inserted into Mongo in batches.
+    """
+
+    def __init__(self, collection, output_dir="static/uploads/cctv", queue_size=32,
+                 debounce_seconds=10.0, pre_seconds=3.0, post_seconds=3.0, max_clip_seconds=30.0,
+                 fps=10.0, max_width=640, flush_interval=2.0, flush_size=50):
+        self.collection = collection
+        self.output_dir = output_dir
+        self.debounce_seconds = float(debounce_seconds)
+        self.pre_seconds = float(pre_seconds)
+        self.post_seconds = float(post_seconds)
+        self.max_clip_seconds = float(max_clip_seconds)
+        self.fps = float(fps)
+        self.max_width = int(max_width)
+        self.flush_interval = float(flush_interval)
+        self.flush_size = int(flush_size)
+
+        self._queue = Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._cameras = {}
+        self._pending = []
+        self._thread = None
+        self.dropped_jobs = 0
+        self.incidents = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                os.makedirs(self.output_dir, exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name="evidence-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """Finish open incidents and queued jobs, then flush metadata."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+            open_incidents = [state["incident"] for state in self._cameras.values() if state["incident"]]
+            for state in self._cameras.values():
+                state["incident"] = None
+        if thread is not None:
+            for incident in open_incidents:
+                self._queue.put(("clip", incident))
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def _camera(self, camera_id):
+        state = self._cameras.get(camera_id)
+        if state is None:
+            state = {
+                "ring": deque(maxlen=max(1, int(self.pre_seconds * self.fps))),
+                "last_sample": 0.0,
+                "last_incident_end": float("-inf"),
+                "incident": None,
+            }
+            self._cameras[camera_id] = state
+        return state
+
+    def _shrink(self, frame):
+        height, width = frame.shape[:2]
+        if width <= self.max_width:
+            return frame
+        scale = self.max_width / width
+        return cv2.resize(frame, (self.max_width, int(height * scale)), interpolation=cv2.INTER_AREA)
+
+    def push_frame(self, camera_id, frame, captured_at):
+        """Called for every captured frame; keeps only `fps` frames per second."""
+        with self._lock:
+            state = self._camera(camera_id)
+            if captured_at - state["last_sample"] < 1.0 / self.fps:
+                return
+            state["last_sample"] = captured_at
+
+        small = self._shrink(frame)
+        finished = None
+        with self._lock:
+            state["ring"].append((captured_at, small))
+            incident = state["incident"]
+            if incident is not None:
+                incident["frames"].append((captured_at, small))
+                if captured_at >= incident["post_until"]:
+                    finished = incident
+                    state["incident"] = None
+                    state["last_incident_end"] = captured_at
+
+        if finished is not None:
+            self._submit(("clip", finished))
+
+    def trigger(self, camera_id, detected, frame, captured_at):
+        """Open an incident for a detection, or extend the one already recording."""
+        with self._lock:
+            state = self._camera(camera_id)
+            incident = state["incident"]
+            if incident is not None:
+                incident["labels"].update(detected)
+                incident["post_until"] = min(captured_at + self.post_seconds,
+                                             incident["started_at"] + self.max_clip_seconds)
+                return None
+            if captured_at - state["last_incident_end"] < self.debounce_seconds:
+                return None
+
+            incident_id = str(uuid.uuid4())
+            incident = {
+                "incident_id": incident_id,
+                "camera_id": camera_id,
+                "labels": set(detected),
+                "started_at": captured_at,
+                "post_until": captured_at + self.post_seconds,
+                "frames": list(state["ring"]),
+                "snapshot": os.path.join(self.output_dir, f"{camera_id}_{incident_id}.jpg"),
+            }
+            state["incident"] = incident
+            self.incidents += 1
+
+        self._submit(("snapshot", (incident["snapshot"], frame)))
+        return incident_id
+
+    def _submit(self, job):
+        self.start()
+        try:
+            self._queue.put_nowait(job)
+        except Full:
+            # Never block the camera on disk I/O; losing evidence is logged instead
+            self.dropped_jobs += 1
+            print(f"Evidence queue full, dropped {job[0]} job")
+
+    def _write_clip(self, incident):
+        frames = incident["frames"]
+        if not frames:
+            return None
+        path = os.path.join(self.output_dir, f"{incident['camera_id']}_{incident['incident_id']}.mp4")
+        height, width = frames[0][1].shape[:2]
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), self.fps, (width, height))
+        try:
+            for _, frame in frames:
+                if frame.shape[:2] != (height, width):
+                    frame = cv2.resize(frame, (width, height))
+                writer.write(frame)
+        finally:
+            writer.release()
+        return path
+
+    def _handle(self, job):
+        kind, payload = job
+        if kind == "snapshot":
+            path, frame = payload
+            cv2.imwrite(path, frame)
+        elif kind == "clip":
+            clip_path = self._write_clip(payload)
+            frames = payload["frames"]
+            self._pending.append({
+                "incident_id": payload["incident_id"],
+                "camera_id": payload["camera_id"],
+                "detected_objects": sorted(payload["labels"]),
+                "snapshot": "/" + payload["snapshot"].replace(os.sep, "/"),
+                "clip": "/" + clip_path.replace(os.sep, "/") if clip_path else None,
+                "frame_count": len(frames),
+                "started_at": datetime.datetime.utcfromtimestamp(frames[0][0] if frames else payload["started_at"]),
+                "ended_at": datetime.datetime.utcfromtimestamp(frames[-1][0] if frames else payload["started_at"]),
+                "detected_at": datetime.datetime.utcfromtimestamp(payload["started_at"]),
+                "created_at": datetime.datetime.utcnow(),
+            })
+
+    def _flush(self):
+        if not self._pending:
+            return
+        docs, self._pending = self._pending, []
+        try:
+            self.collection.insert_many(docs, ordered=False)
+        except Exception as e:
+            print("Evidence metadata flush failed:", str(e))
+            # Keep them for the next flush rather than losing the records
+            self._pending = docs + self._pending
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                job = self._queue.get(timeout=self.flush_interval)
+            except Empty:
+                job = None
+            if job is _STOP:
+                break
+            if job is not None:
+                try:
+                    self._handle(job)
+                except Exception as e:
+                    print("Evidence writer error:", str(e))
+            now = time.monotonic()
+            if len(self._pending) >= self.flush_size or now - last_flush >= self.flush_interval:
+                self._flush()
+                last_flush = now
+        self._flush()
+
+    def stats(self):
+        return {
+            "incidents": self.incidents,
+            "queued_jobs": self._queue.qsize(),
+            "dropped_jobs": self.dropped_jobs,
+            "pending_metadata": len(self._pending),
+        }
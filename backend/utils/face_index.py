@@ -0,0 +1,463 @@
+"""Face-embedding match index for the missing person database.
+
+Every enrolled embedding is one row of a single float32 matrix, L2-normalized
+so a dot product is the cosine similarity, stored as a raw file and memory
+mapped (pages are shared between processes and loaded on demand):
+
+    <root>/embeddings.f32   rows of `dim` float32
+    <root>/ids.json         person id of each row; null marks a replaced row
+    <root>/ivf.npz          optional coarse index (see train())
+    <root>/.lock            taken by every writer, across processes
+
+Several processes (the app workers, the CLI) can share one directory. Writes
+happen under an exclusive lock on <root>/.lock and always start from the
+files on disk, never from a process's own view. A process notices another
+one's writes when ids.json or ivf.npz change, checked at most every
+`reload_interval` seconds before a search.
+
+    python -m utils.face_index build [--uri mongodb://localhost:27017] [--nlist 0]
+    python -m utils.face_index import ranu.npy person1_embedding.npy [--uri ...]
+    python -m utils.face_index bench [--rows 100000] [--queries 32] [--nlist 256]
+
+`build` rewrites the files from the `embedding` field of every document in the
+missing_persons collection; `import` adds loose .npy embeddings to that
+collection (the file name becomes the person's name) and to the index.
+
+Queries are answered in batches with one matrix product per block of rows.
+With a coarse index (spherical k-means over the rows) a query is only scored
+against the rows of its `nprobe` nearest clusters, plus any row added since
+training.
+"""
+import argparse
+import contextlib
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+from pymongo import MongoClient, ReturnDocument
+
+DB_NAME = "SurakshaSetu"
+COLLECTION = "missing_persons"
+DEFAULT_DIM = 128
+BLOCK_ROWS = 65536
+
+
+def normalize(vectors):
+    """Float32 copy of `vectors` (one per row) scaled to unit length."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores, rows, k):
+    # Best k (score, row) pairs of one query, highest first
+    if len(scores) > k:
+        keep = np.argpartition(scores, -k)[-k:]
+        scores, rows = scores[keep], rows[keep]
+    order = np.argsort(-scores, kind="stable")
+    return scores[order], rows[order]
+
+
+def kmeans(data, nlist, iterations=10, sample=50000, seed=0):
+    """Spherical k-means; returns unit-length centroids, shape (nlist, dim)."""
+    rng = np.random.default_rng(seed)
+    train = data
+    if len(data) > sample:
+        train = data[np.sort(rng.choice(len(data), sample, replace=False))]
+    train = np.ascontiguousarray(train, dtype=np.float32)
+    centroids = train[rng.choice(len(train), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(train @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, train)
+        empty = np.bincount(assign, minlength=nlist) == 0
+        # Re-seed clusters that lost every point
+        sums[empty] = train[rng.choice(len(train), int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+class _Snapshot:
+    """Immutable view of the index; searches read one without taking the lock."""
+
+    def __init__(self, matrix, ids, ivf):
+        self.matrix = matrix
+        self.ids = ids
+        self.dead = np.array([person_id is None for person_id in ids], dtype=bool)
+        self.has_dead = bool(self.dead.any())
+        self.ivf = ivf
+
+
+class FaceIndex:
+    """Top-k cosine search over every enrolled face embedding."""
+
+    def __init__(self, root_dir="data/faces", dim=DEFAULT_DIM, nprobe=8, reload_interval=1.0):
+        self.root_dir = root_dir
+        self.dim = int(dim)
+        self.nprobe = int(nprobe)
+        self.reload_interval = float(reload_interval)
+        self.matrix_path = os.path.join(root_dir, "embeddings.f32")
+        self.ids_path = os.path.join(root_dir, "ids.json")
+        self.ivf_path = os.path.join(root_dir, "ivf.npz")
+        self.lock_path = os.path.join(root_dir, ".lock")
+        self._lock = threading.Lock()
+        self._rows_by_id = {}
+        self._snapshot = _Snapshot(np.empty((0, self.dim), dtype=np.float32), [], None)
+        self._version = None  # stat of ids.json and ivf.npz when last read
+        self._checked_at = 0.0
+        self.queries = 0
+        self.search_seconds = 0.0
+
+    def __len__(self):
+        return len(self._rows_by_id)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        # The thread lock orders this process's writers, the file lock everyone else's
+        with self._lock:
+            os.makedirs(self.root_dir, exist_ok=True)
+            with open(self.lock_path, "a+b") as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+                    else:
+                        f.seek(0)
+                        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _stat_version(self):
+        version = []
+        for path in (self.ids_path, self.ivf_path):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                version.append(None)
+            else:
+                version.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        return tuple(version)
+
+    def _read_ids(self):
+        if not os.path.exists(self.ids_path):
+            return []
+        with open(self.ids_path) as f:
+            return json.load(f)
+
+    def _read_ivf(self):
+        if not os.path.exists(self.ivf_path):
+            return None
+        with np.load(self.ivf_path) as data:
+            return {key: data[key] for key in data.files}
+
+    def load(self):
+        """Map the files on disk; an index that was never built is simply empty."""
+        with self._locked():
+            self._version = self._stat_version()
+            self._publish(self._read_ids(), self._read_ivf())
+        return len(self)
+
+    def refresh(self):
+        """Reload if another process changed the files; checked at most every reload_interval."""
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return False
+        self._checked_at = now
+        if self._stat_version() == self._version:
+            return False
+        try:
+            self.load()
+        except Exception as e:
+            # Keep serving the last good snapshot
+            print("Could not reload the face index:", str(e))
+            return False
+        return True
+
+    def _map(self, rows):
+        if rows == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        expected = rows * self.dim * 4
+        if os.path.getsize(self.matrix_path) < expected:
+            raise ValueError(f"{self.matrix_path} holds fewer than the {rows} rows listed in {self.ids_path}")
+        return np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def _publish(self, ids, ivf):
+        self._rows_by_id = {person_id: row for row, person_id in enumerate(ids) if person_id is not None}
+        self._snapshot = _Snapshot(self._map(len(ids)), ids, ivf)
+
+    def _write_ids(self, ids):
+        temp_path = self.ids_path + ".part"
+        with open(temp_path, "w") as f:
+            json.dump(ids, f)
+        os.replace(temp_path, self.ids_path)
+
+    def add(self, person_id, embedding):
+        """Enroll (or replace) one person's embedding."""
+        vector = normalize(embedding)
+        if vector.shape != (1, self.dim):
+            raise ValueError(f"Expected a {self.dim}-d embedding, got shape {np.shape(embedding)}")
+        person_id = str(person_id)
+        with self._locked():
+            # Start from the files, not self._snapshot: other processes may have added rows
+            ids = self._read_ids()
+            # Rows are append-only so open maps stay valid; a replaced row is only marked dead
+            ids = [None if row_id == person_id else row_id for row_id in ids]
+            with open(self.matrix_path, "ab") as f:
+                # Drops a partial row left by a writer that died before updating ids.json
+                f.seek(len(ids) * self.dim * 4)
+                f.truncate()
+                f.write(vector.tobytes())
+            ids.append(person_id)
+            self._write_ids(ids)
+            self._version = self._stat_version()
+            self._publish(ids, self._read_ivf())
+
+    def build(self, items, nlist=0):
+        """Rewrite the index from (person_id, embedding) pairs; returns the row count."""
+        ids = []
+        with self._locked():
+            temp_path = self.matrix_path + ".part"
+            with open(temp_path, "wb") as f:
+                for person_id, embedding in items:
+                    vector = normalize(embedding)
+                    if vector.shape != (1, self.dim):
+                        print(f"Skipping {person_id}: not a {self.dim}-d embedding")
+                        continue
+                    f.write(vector.tobytes())
+                    ids.append(str(person_id))
+            os.replace(temp_path, self.matrix_path)
+            self._write_ids(ids)
+            if os.path.exists(self.ivf_path):
+                os.remove(self.ivf_path)
+            self._version = self._stat_version()
+            self._publish(ids, None)
+        if nlist:
+            self.train(nlist)
+        return len(ids)
+
+    def train(self, nlist, iterations=10):
+        """Cluster the current rows into `nlist` lists for approximate search."""
+        self.load()
+        snapshot = self._snapshot
+        live = np.flatnonzero(~snapshot.dead)
+        nlist = min(int(nlist), len(live))
+        if nlist < 2:
+            return None
+        centroids = kmeans(snapshot.matrix[live], nlist, iterations)
+        assign = np.empty(len(live), dtype=np.int64)
+        for start in range(0, len(live), BLOCK_ROWS):
+            block = snapshot.matrix[live[start:start + BLOCK_ROWS]]
+            assign[start:start + BLOCK_ROWS] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        ivf = {
+            "centroids": centroids,
+            "rows": live[order],
+            "offsets": np.searchsorted(assign[order], np.arange(nlist + 1)),
+            "trained_rows": np.int64(len(snapshot.ids)),
+        }
+        with self._locked():
+            ids = self._read_ids()
+            trained = snapshot.ids
+            # Appends and replacements since the snapshot keep the lists valid, a rebuild doesn't
+            if len(ids) < len(trained) or any(now != then and now is not None
+                                              for now, then in zip(ids, trained)):
+                print("Face index was rebuilt during training; discarding the lists")
+                return None
+            temp_path = self.ivf_path + ".part.npz"
+            np.savez(temp_path, **ivf)
+            os.replace(temp_path, self.ivf_path)
+            self._version = self._stat_version()
+            self._publish(ids, ivf)
+        return nlist
+
+    def _search_exact(self, snapshot, queries, k):
+        count = len(snapshot.ids)
+        best_scores = [np.empty(0, dtype=np.float32) for _ in range(len(queries))]
+        best_rows = [np.empty(0, dtype=np.int64) for _ in range(len(queries))]
+        for start in range(0, count, BLOCK_ROWS):
+            block = snapshot.matrix[start:start + BLOCK_ROWS]
+            scores = queries @ np.asarray(block).T
+            if snapshot.has_dead:
+                scores[:, snapshot.dead[start:start + BLOCK_ROWS]] = -np.inf
+            rows = np.arange(start, start + len(block))
+            for i in range(len(queries)):
+                top_scores, top_rows = _top_k(scores[i], rows, k)
+                best_scores[i], best_rows[i] = _top_k(np.concatenate([best_scores[i], top_scores]),
+                                                      np.concatenate([best_rows[i], top_rows]), k)
+        return list(zip(best_scores, best_rows))
+
+    def _search_ivf(self, snapshot, queries, k, nprobe):
+        ivf = snapshot.ivf
+        centroids, offsets = ivf["centroids"], ivf["offsets"]
+        nprobe = min(nprobe, len(centroids))
+        # Rows added after training are not in any list yet and are always scored
+        tail = np.arange(int(ivf["trained_rows"]), len(snapshot.ids))
+        nearest = np.argpartition(queries @ centroids.T, -nprobe, axis=1)[:, -nprobe:]
+        results = []
+        for query, lists in zip(queries, nearest):
+            candidates = np.concatenate([ivf["rows"][offsets[c]:offsets[c + 1]] for c in lists] + [tail])
+            candidates.sort()  # sequential reads from the map
+            scores = snapshot.matrix[candidates] @ query
+            if snapshot.has_dead:
+                scores[snapshot.dead[candidates]] = -np.inf
+            results.append(_top_k(scores, candidates, k))
+        return results
+
+    def search(self, queries, k=5, min_score=None, nprobe=None, exact=False):
+        """Best matches for each query embedding.
+
+        Returns one list per query of (person_id, score) pairs, best first.
+        Uses the coarse index when one is trained unless `exact` is set.
+        """
+        queries = normalize(queries)
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-d embeddings, got {queries.shape[1]}-d")
+        self.refresh()
+        snapshot = self._snapshot
+        started = time.perf_counter()
+        if not snapshot.ids:
+            raw = [(np.empty(0), np.empty(0, dtype=np.int64)) for _ in queries]
+        elif snapshot.ivf is not None and not exact:
+            raw = self._search_ivf(snapshot, queries, k, nprobe or self.nprobe)
+        else:
+            raw = self._search_exact(snapshot, queries, k)
+        self.queries += len(queries)
+        self.search_seconds += time.perf_counter() - started
+
+        results = []
+        for scores, rows in raw:
+            matches = []
+            for score, row in zip(scores.tolist(), rows.tolist()):
+                if score == -np.inf or (min_score is not None and score < min_score):
+                    continue
+                matches.append((snapshot.ids[row], score))
+            results.append(matches)
+        return results
+
+    def match_batch(self, groups, k=1, min_score=None):
+        """Search several (n_i, dim) groups (e.g. one per camera frame) with one call.
+
+        Returns one list of per-face results for each group, for use as a
+        BatchInferenceEngine run_batch.
+        """
+        sizes = [len(np.atleast_2d(group)) for group in groups]
+        if not sum(sizes):
+            return [[] for _ in groups]
+        matches = self.search(np.concatenate([np.atleast_2d(group) for group in groups]), k, min_score)
+        results, start = [], 0
+        for size in sizes:
+            results.append(matches[start:start + size])
+            start += size
+        return results
+
+    def stats(self):
+        self.refresh()
+        snapshot = self._snapshot
+        return {
+            "people": len(self._rows_by_id),
+            "rows": len(snapshot.ids),
+            "dim": self.dim,
+            "nlist": len(snapshot.ivf["centroids"]) if snapshot.ivf is not None else 0,
+            "queries": self.queries,
+            "avg_query_ms": (self.search_seconds / self.queries * 1000.0) if self.queries else 0.0,
+        }
+
+
+def _build(index, db, nlist):
+    items = ((doc["_id"], doc["embedding"])
+             for doc in db[COLLECTION].find({"embedding": {"$exists": True}}, {"embedding": 1}))
+    count = index.build(items, nlist)
+    print(f"Indexed {count} embeddings into {index.root_dir}" + (f" with {nlist} lists" if nlist else ""))
+
+
+def _import(index, db, paths):
+    index.load()
+    for path in paths:
+        embedding = np.load(path).astype(np.float32).reshape(-1)
+        name = os.path.splitext(os.path.basename(path))[0]
+        doc = db[COLLECTION].find_one_and_update(
+            {"embedding_source": os.path.basename(path)},
+            {"$set": {"embedding": embedding.tolist()},
+             "$setOnInsert": {"name": name, "status": "missing"}},
+            upsert=True, return_document=ReturnDocument.AFTER,
+        )
+        index.add(doc["_id"], embedding)
+        print(f"Imported {path} as {doc['_id']}")
+
+
+def _bench(rows, queries, nlist, nprobe, dim, k):
+    import tempfile
+
+    rng = np.random.default_rng(0)
+    # Clustered synthetic embeddings, closer to real faces than uniform noise
+    centers = normalize(rng.standard_normal((max(1, rows // 50), dim)))
+    data = normalize(centers[rng.integers(0, len(centers), rows)] + 0.35 * rng.standard_normal((rows, dim)) / np.sqrt(dim))
+    probes = normalize(data[rng.integers(0, rows, queries)] + 0.1 * rng.standard_normal((queries, dim)) / np.sqrt(dim))
+
+    with tempfile.TemporaryDirectory() as root_dir:
+        index = FaceIndex(root_dir, dim=dim, nprobe=nprobe)
+        started = time.perf_counter()
+        index.build(enumerate(data))
+        print(f"Built {rows} rows in {time.perf_counter() - started:.2f}s")
+
+        def timed(**kwargs):
+            index.search(probes, k, **kwargs)  # warm the page cache
+            samples = []
+            for _ in range(5):
+                started = time.perf_counter()
+                found = index.search(probes, k, **kwargs)
+                samples.append(time.perf_counter() - started)
+            return sorted(samples)[len(samples) // 2] * 1000.0, found
+
+        exact_ms, exact = timed(exact=True)
+        print(f"Exact:  {exact_ms:7.2f} ms per batch of {queries} ({exact_ms / queries:.3f} ms per face)")
+        if nlist:
+            started = time.perf_counter()
+            index.train(nlist)
+            print(f"Trained {nlist} lists in {time.perf_counter() - started:.2f}s")
+            ivf_ms, approx = timed()
+            recall = np.mean([exact[i][0][0] == approx[i][0][0] for i in range(queries) if approx[i]])
+            print(f"IVF:    {ivf_ms:7.2f} ms per batch of {queries} ({ivf_ms / queries:.3f} ms per face), "
+                  f"nprobe={nprobe}, top-1 recall {recall:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["build", "import", "bench"])
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--root-dir", default="data/faces")
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=32)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        _bench(args.rows, args.queries, args.nlist or 256, args.nprobe, args.dim, args.k)
+        return
+    index = FaceIndex(args.root_dir, dim=args.dim, nprobe=args.nprobe)
+    db = MongoClient(args.uri)[DB_NAME]
+    if args.command == "build":
+        _build(index, db, args.nlist)
+    else:
+        _import(index, db, args.files)
+
+
+if __name__ == "__main__":
+    main()
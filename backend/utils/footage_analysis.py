@@ -0,0 +1,300 @@
+"""Scan recorded CCTV footage with the detection models, in parallel.
+
+    python -m utils.footage_analysis scan recordings/ cam3.mp4 [--workers 4]
+        [--segment-seconds 300] [--sample-fps 2] [--batch-size 8]
+        [--backend torch|onnx|openvino] [--int8] [--camera-id cam3]
+        [--start-time 2024-03-15T08:00:00] [--reset] [--uri mongodb://localhost:27017]
+    python -m utils.footage_analysis status recordings/ [--uri ...]
+
+Every video file (directories are searched recursively) is split into
+segments of --segment-seconds. The segments are spread over a pool of
+worker processes, by default one per core. Each worker loads the models once,
+decodes its segment and grabs, without converting, the frames between
+samples. It runs the sampled frames (--sample-fps per second of video) through
+the models in batches of --batch-size.
+
+Detections are bulk-inserted into footage_detections with the source file,
+the offset into it and a wall-clock timestamp in UTC, like the rest of the
+app: --start-time (UTC; only with a single file), or else the file's
+modification time minus its duration, taken as the end of the recording.
+A finished segment is recorded in footage_segments. A rerun skips
+finished segments, so an interrupted scan picks up where it stopped. Pass
+--reset to scan the files again from the start.
+"""
+import argparse
+import datetime
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+
+from utils.evidence_store import VIDEO_EXTENSIONS
+
+DB_NAME = "SurakshaSetu"
+DETECTIONS_COLLECTION = "footage_detections"
+SEGMENTS_COLLECTION = "footage_segments"
+
+# Per-process state set up by _init_worker
+_worker = {}
+
+
+def find_videos(paths):
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                videos.extend(os.path.join(root, name) for name in files
+                              if os.path.splitext(name)[1].lstrip(".").lower() in VIDEO_EXTENSIONS)
+        elif os.path.isfile(path):
+            videos.append(path)
+        else:
+            print(f"Skipping {path}: not found")
+    return sorted(set(os.path.abspath(video) for video in videos))
+
+
+def file_id(path):
+    """Identity of a recording; changes if the file is replaced or grows."""
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}|{stat.st_size}|{int(stat.st_mtime)}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def plan_segments(path, segment_seconds, sample_fps, start_time=None):
+    """Split one file into segment jobs (dicts), or [] if it can't be opened."""
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            print(f"Skipping {path}: cannot open")
+            return []
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    finally:
+        capture.release()
+    if fps <= 0 or frame_count <= 0:
+        print(f"Skipping {path}: unknown frame rate or length")
+        return []
+
+    duration = frame_count / fps
+    if start_time is None:
+        start_time = datetime.datetime.utcfromtimestamp(os.path.getmtime(path)) - datetime.timedelta(seconds=duration)
+    source_id = file_id(path)
+    frames_per_segment = max(1, int(round(segment_seconds * fps)))
+    stride = max(1, int(round(fps / sample_fps))) if sample_fps > 0 else 1
+    jobs = []
+    for index, start_frame in enumerate(range(0, frame_count, frames_per_segment)):
+        end_frame = start_frame + frames_per_segment
+        jobs.append({
+            "_id": f"{source_id}:{index}",
+            "file_id": source_id,
+            "path": path,
+            "segment": index,
+            "fps": fps,
+            "start_frame": start_frame,
+            # The container's frame count can be short, so the last segment reads to the end
+            "end_frame": end_frame if end_frame < frame_count else None,
+            "stride": stride,
+            "recorded_at": start_time,
+        })
+    return jobs
+
+
+def _init_worker(uri, backend, int8, threads_per_worker, decode_only):
+    # Keep the pool from oversubscribing the cores; must happen before torch is imported
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads_per_worker))
+    cv2.setNumThreads(1)
+    if decode_only:
+        _worker["run_batch"] = lambda frames: [[] for _ in frames]
+    else:
+        from utils.detector import load_models, detect_batch
+        models = load_models(backend, int8)
+        _worker["run_batch"] = lambda frames: detect_batch(models, frames)
+    _worker["db"] = MongoClient(uri)[DB_NAME]
+
+
+def _insert_detections(collection, docs):
+    # _ids are derived from the frame, so rows left by an interrupted run are just skipped
+    try:
+        collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+
+
+def analyse_segment(job, batch_size=8, camera_id=None):
+    """Runs in a worker: decode, detect and store one segment; returns its summary."""
+    started = time.perf_counter()
+    run_batch, db = _worker["run_batch"], _worker["db"]
+    capture = cv2.VideoCapture(job["path"])
+    if job["start_frame"]:
+        capture.set(cv2.CAP_PROP_POS_FRAMES, job["start_frame"])
+
+    frame_index = job["start_frame"]
+    decoded = analysed = 0
+    batch, docs = [], []
+
+    def flush():
+        nonlocal analysed
+        results = run_batch([frame for _, frame in batch])
+        analysed += len(batch)
+        for (index, _), labels in zip(batch, results):
+            if not labels:
+                continue
+            offset = index / job["fps"]
+            docs.append({
+                "_id": f"{job['file_id']}:{index}",
+                "file_id": job["file_id"],
+                "source": job["path"],
+                "camera_id": camera_id,
+                "segment": job["segment"],
+                "frame_index": index,
+                "offset_seconds": round(offset, 3),
+                "timestamp": job["recorded_at"] + datetime.timedelta(seconds=offset),
+                "detected": labels,
+            })
+        batch.clear()
+
+    try:
+        while job["end_frame"] is None or frame_index < job["end_frame"]:
+            # Frames between samples are only grabbed, which skips the colour conversion
+            if (frame_index - job["start_frame"]) % job["stride"]:
+                if not capture.grab():
+                    break
+            else:
+                success, frame = capture.read()
+                if not success:
+                    break
+                batch.append((frame_index, frame))
+                if len(batch) >= batch_size:
+                    flush()
+            decoded += 1
+            frame_index += 1
+        if batch:
+            flush()
+    finally:
+        capture.release()
+
+    if docs:
+        _insert_detections(db[DETECTIONS_COLLECTION], docs)
+    seconds = time.perf_counter() - started
+    db[SEGMENTS_COLLECTION].replace_one({"_id": job["_id"]}, {
+        **{key: job[key] for key in ("file_id", "path", "segment", "start_frame", "end_frame")},
+        "status": "done",
+        "frames_decoded": decoded,
+        "frames_analysed": analysed,
+        "detections": len(docs),
+        "seconds": round(seconds, 2),
+        "finished_at": datetime.datetime.utcnow(),
+    }, upsert=True)
+    return {"_id": job["_id"], "path": job["path"], "segment": job["segment"], "decoded": decoded,
+            "analysed": analysed, "detections": len(docs), "video_seconds": decoded / job["fps"],
+            "seconds": seconds}
+
+
+def _format_duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def scan(args):
+    db = MongoClient(args.uri)[DB_NAME]
+    videos = find_videos(args.paths)
+    start_time = None
+    if args.start_time:
+        if len(videos) > 1:
+            # One start time would give every recording the same timestamps
+            raise SystemExit(f"--start-time applies to a single file, but {len(videos)} videos were found")
+        start_time = datetime.datetime.fromisoformat(args.start_time)
+        if start_time.tzinfo is not None:
+            start_time = start_time.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    jobs = []
+    for path in videos:
+        jobs.extend(plan_segments(path, args.segment_seconds, args.sample_fps, start_time))
+    if not jobs:
+        print("No footage to analyse")
+        return
+
+    file_ids = sorted({job["file_id"] for job in jobs})
+    if args.reset:
+        db[SEGMENTS_COLLECTION].delete_many({"file_id": {"$in": file_ids}})
+        db[DETECTIONS_COLLECTION].delete_many({"file_id": {"$in": file_ids}})
+    done = {doc["_id"] for doc in db[SEGMENTS_COLLECTION].find(
+        {"file_id": {"$in": file_ids}, "status": "done"}, {"_id": 1})}
+    pending = [job for job in jobs if job["_id"] not in done]
+    print(f"{len(jobs)} segments in {len(file_ids)} files, {len(done & {job['_id'] for job in jobs})} "
+          f"already done, {len(pending)} to go on {args.workers} workers")
+    if not pending:
+        return
+
+    threads_per_worker = max(1, (os.cpu_count() or 1) // args.workers)
+    started = time.perf_counter()
+    finished = detections = 0
+    video_seconds = 0.0
+    # spawn, like the inference workers, so no worker inherits a forked Mongo client
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(args.uri, args.backend, args.int8, threads_per_worker, args.decode_only),
+    ) as pool:
+        futures = {pool.submit(analyse_segment, job, args.batch_size, args.camera_id): job for job in pending}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # Left unfinished, so the next run retries it
+                print(f"Segment {job['segment']} of {job['path']} failed:", str(e))
+                continue
+            finished += 1
+            detections += result["detections"]
+            video_seconds += result["video_seconds"]
+            elapsed = time.perf_counter() - started
+            remaining = elapsed / finished * (len(pending) - finished)
+            print(f"[{finished}/{len(pending)}] {os.path.basename(result['path'])} #{result['segment']}: "
+                  f"{result['analysed']} frames analysed, {result['detections']} detections, "
+                  f"{video_seconds / elapsed:.1f}x real time, ETA {_format_duration(remaining)}")
+
+    print(f"Done: {finished}/{len(pending)} segments, {_format_duration(video_seconds)} of video in "
+          f"{_format_duration(time.perf_counter() - started)}, {detections} detections")
+
+
+def status(args):
+    db = MongoClient(args.uri)[DB_NAME]
+    for path in find_videos(args.paths):
+        source_id = file_id(path)
+        done = db[SEGMENTS_COLLECTION].count_documents({"file_id": source_id, "status": "done"})
+        found = db[DETECTIONS_COLLECTION].count_documents({"file_id": source_id})
+        print(f"{path}: {done} segments done, {found} detections")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["scan", "status"])
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--segment-seconds", type=float, default=300.0)
+    parser.add_argument("--sample-fps", type=float, default=2.0)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx", "openvino"])
+    parser.add_argument("--int8", action="store_true")
+    parser.add_argument("--camera-id")
+    parser.add_argument("--start-time", help="UTC time of the first frame (ISO 8601); single file only")
+    parser.add_argument("--reset", action="store_true", help="forget earlier progress for these files")
+    parser.add_argument("--decode-only", action="store_true", help="skip the models; measures decoding")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        status(args)
+    else:
+        args.workers = max(1, args.workers)
+        scan(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""GeoJSON helpers for map data, plus a one-off migration for old documents.
+
+    python -m utils.geo migrate [--uri mongodb://localhost:27017]
+
+Documents keep their lat/lng fields (as numbers) for the map clients and get
+a GeoJSON point in `geo`, which the 2dsphere indexes and viewport queries use.
+"""
+import argparse
+
+from pymongo import MongoClient, UpdateOne
+
+DB_NAME = "SurakshaSetu"
+
+
+def to_point(lat, lng):
+    """GeoJSON point for a lat/lng pair (strings allowed), or None if it isn't valid."""
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+        return None
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+
+def point_from_location(location):
+    # SOS locations arrive as {"latitude": .., "longitude": ..}
+    if not isinstance(location, dict):
+        return None
+    return to_point(location.get("latitude"), location.get("longitude"))
+
+
+def normalize_lat_lng(doc):
+    """Store lat/lng as numbers and add the `geo` point; returns False if the coordinates are invalid."""
+    point = to_point(doc.get("lat"), doc.get("lng"))
+    if point is None:
+        return False
+    doc["lng"], doc["lat"] = point["coordinates"]
+    doc["geo"] = point
+    return True
+
+
+def parse_bbox(value):
+    """Parse "minLng,minLat,maxLng,maxLat" (Leaflet's toBBoxString order)."""
+    if not value:
+        return None
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(part) for part in value.split(","))
+    except ValueError:
+        raise ValueError("bbox must be minLng,minLat,maxLng,maxLat")
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    min_lng, max_lng = max(min_lng, -180.0), min(max_lng, 180.0)
+    if min_lng >= max_lng or min_lat >= max_lat:
+        raise ValueError("bbox must be minLng,minLat,maxLng,maxLat with min < max")
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def within_bbox(bbox, field="geo"):
+    """$geoWithin filter for a bounding box; served by a 2dsphere index on `field`."""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    ring = [[min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat], [min_lng, max_lat], [min_lng, min_lat]]
+    return {field: {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}}}
+
+
+def _lat_lng_update(doc):
+    point = to_point(doc.get("lat"), doc.get("lng"))
+    if point is None:
+        return None
+    lng, lat = point["coordinates"]
+    return {"geo": point, "lat": lat, "lng": lng}
+
+
+def _sos_update(doc):
+    point = point_from_location(doc.get("location"))
+    return {"geo": point} if point is not None else None
+
+
+def _migrate_collection(collection, fields, make_update, batch_size):
+    requests, updated, skipped = [], 0, 0
+    for doc in collection.find({"geo": {"$exists": False}}, fields):
+        update = make_update(doc)
+        if update is None:
+            skipped += 1
+            continue
+        requests.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+        if len(requests) >= batch_size:
+            updated += collection.bulk_write(requests, ordered=False).modified_count
+            requests = []
+    if requests:
+        updated += collection.bulk_write(requests, ordered=False).modified_count
+    return {"updated": updated, "skipped": skipped}
+
+
+def migrate(db, batch_size=1000):
+    """Add `geo` to heatmap/Markers/sos_alerts documents written before it existed."""
+    return {
+        "heatmap": _migrate_collection(db["heatmap"], {"lat": 1, "lng": 1}, _lat_lng_update, batch_size),
+        "Markers": _migrate_collection(db["Markers"], {"lat": 1, "lng": 1}, _lat_lng_update, batch_size),
+        "sos_alerts": _migrate_collection(db["sos_alerts"], {"location": 1}, _sos_update, batch_size),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    args = parser.parse_args()
+
+    for name, count in migrate(MongoClient(args.uri)[DB_NAME]).items():
+        print(f"{name}: {count['updated']} updated, {count['skipped']} skipped (invalid lat/lng)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""Geofence evaluation: a bucket-grid spatial index plus enter/exit tracking.
+
+Each fence (centre + radius in metres) is registered in every grid bucket its
+bounding box overlaps. A location check looks up a single bucket and runs a
+vectorized haversine over just those candidates. Fences too large for the
+grid go on a short list that is checked on every lookup. Check the timings:
+
+    python -m utils.geofence bench [--fences 100000] [--queries 20000]
+"""
+import argparse
+import math
+import threading
+import time
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = 111320.0
+
+
+def haversine_m(lat, lng, lats, lngs):
+    """Distance in metres from one point to arrays of points."""
+    lat1 = math.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlng = np.radians(lngs) - math.radians(lng)
+    a = np.sin(dlat / 2.0) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def fence_from_doc(doc):
+    """(lat, lng, radius_m) from a geofence document, or None if it isn't usable."""
+    coordinate = doc.get("coordinate") or {}
+    try:
+        lat = float(coordinate.get("latitude"))
+        lng = float(coordinate.get("longitude"))
+        radius = float(doc.get("radius"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0) or radius <= 0:
+        return None
+    return lat, lng, radius
+
+
+class GeofenceIndex:
+    """Circular fences bucketed on a lat/lng grid of `cell_degrees` squares.
+
+    Fences are added incrementally; adding an id that already exists replaces
+    it. Lookups do not wrap across the antimeridian.
+    """
+
+    def __init__(self, cell_degrees=0.01, max_buckets_per_fence=64, capacity=1024):
+        self.cell = float(cell_degrees)
+        self.max_buckets = int(max_buckets_per_fence)
+        self._lock = threading.Lock()
+        self._lat = np.empty(capacity, dtype=np.float64)
+        self._lng = np.empty(capacity, dtype=np.float64)
+        self._radius = np.empty(capacity, dtype=np.float64)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._ids = []
+        self._slots = {}
+        self._buckets = {}
+        self._bucket_arrays = {}
+        self._large = []
+        self._large_array = np.empty(0, dtype=np.intp)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _key(self, lat, lng):
+        return math.floor(lat / self.cell), math.floor(lng / self.cell)
+
+    def _grow(self):
+        capacity = len(self._lat) * 2
+        for name in ("_lat", "_lng", "_radius", "_alive"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def add(self, fence_id, lat, lng, radius):
+        with self._lock:
+            previous = self._slots.get(fence_id)
+            if previous is not None:
+                self._alive[previous] = False
+
+            slot = len(self._ids)
+            if slot == len(self._lat):
+                self._grow()
+            self._lat[slot], self._lng[slot], self._radius[slot] = lat, lng, radius
+            self._alive[slot] = True
+            self._ids.append(fence_id)
+            self._slots[fence_id] = slot
+
+            # Buckets covered by the fence's bounding box
+            dlat = radius / METERS_PER_DEGREE
+            dlng = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+            row0, col0 = self._key(lat - dlat, lng - dlng)
+            row1, col1 = self._key(lat + dlat, lng + dlng)
+            if (row1 - row0 + 1) * (col1 - col0 + 1) > self.max_buckets:
+                self._large.append(slot)
+                self._large_array = np.asarray(self._large, dtype=np.intp)
+                return slot
+            for row in range(row0, row1 + 1):
+                for col in range(col0, col1 + 1):
+                    self._buckets.setdefault((row, col), []).append(slot)
+                    self._bucket_arrays.pop((row, col), None)
+            return slot
+
+    def _candidates(self, key):
+        # Bucket slot lists are turned into arrays once, then reused until the bucket changes
+        with self._lock:
+            array = self._bucket_arrays.get(key)
+            if array is None:
+                array = np.asarray(self._buckets.get(key, ()), dtype=np.intp)
+                self._bucket_arrays[key] = array
+            large = self._large_array
+            lat, lng, radius, alive, ids = self._lat, self._lng, self._radius, self._alive, self._ids
+        if len(large):
+            array = np.concatenate((array, large))
+        return array, lat, lng, radius, alive, ids
+
+    def query(self, lat, lng):
+        """Ids of every fence containing the point."""
+        slots, lats, lngs, radii, alive, ids = self._candidates(self._key(lat, lng))
+        if not len(slots):
+            return []
+        slots = slots[alive[slots]]
+        inside = slots[haversine_m(lat, lng, lats[slots], lngs[slots]) <= radii[slots]]
+        return [ids[slot] for slot in inside]
+
+
+class GeofenceEngine:
+    """Keeps a GeofenceIndex in step with a Mongo collection and turns
+    location updates into enter/exit events per subject (citizen).
+
+    Fences inserted by any server process are picked up by polling for newer
+    _ids every `refresh_interval` seconds.
+    """
+
+    def __init__(self, collection, cell_degrees=0.01, refresh_interval=5.0):
+        self.collection = collection
+        self.refresh_interval = float(refresh_interval)
+        self.index = GeofenceIndex(cell_degrees)
+        self._meta = {}
+        self._inside = {}
+        self._last_id = None
+        self._last_sync = 0.0
+        self._sync_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.events = 0
+
+    def add(self, doc):
+        """Index one fence document (must carry its _id); returns False if it is invalid."""
+        fence = fence_from_doc(doc)
+        if fence is None:
+            return False
+        fence_id = str(doc["_id"])
+        self._meta[fence_id] = {
+            "name": doc.get("name"),
+            "enter": doc.get("alertEnter", True),
+            "exit": doc.get("alertExit", True),
+        }
+        self.index.add(fence_id, *fence)
+        return True
+
+    def sync(self):
+        """Index fences newer than the last one seen. Skipped if another thread is already syncing."""
+        if not self._sync_lock.acquire(blocking=False):
+            return 0
+        try:
+            query = {"_id": {"$gt": self._last_id}} if self._last_id is not None else {}
+            added = 0
+            for doc in self.collection.find(query, {"coordinate": 1, "radius": 1, "name": 1,
+                                                    "alertEnter": 1, "alertExit": 1}).sort("_id", 1):
+                added += self.add(doc)
+                self._last_id = doc["_id"]
+            self._last_sync = time.monotonic()
+            return added
+        finally:
+            self._sync_lock.release()
+
+    def check(self, subject_id, lat, lng):
+        """Evaluate a location update; returns the enter/exit events it causes."""
+        if time.monotonic() - self._last_sync >= self.refresh_interval:
+            self.sync()
+        inside = set(self.index.query(lat, lng))
+        with self._lock:
+            previous = self._inside.get(subject_id, set())
+            if inside:
+                self._inside[subject_id] = inside
+            else:
+                self._inside.pop(subject_id, None)
+            self.checks += 1
+
+        events = []
+        for event, fence_ids in (("enter", inside - previous), ("exit", previous - inside)):
+            for fence_id in fence_ids:
+                meta = self._meta.get(fence_id, {})
+                if not meta.get(event, True):
+                    continue
+                events.append({
+                    "event": event,
+                    "geofence_id": fence_id,
+                    "name": meta.get("name"),
+                    "citizen_id": subject_id,
+                    "location": {"latitude": lat, "longitude": lng},
+                })
+        self.events += len(events)
+        return events
+
+    def forget(self, subject_id):
+        with self._lock:
+            self._inside.pop(subject_id, None)
+
+    def stats(self):
+        return {
+            "fences": len(self.index),
+            "tracked_subjects": len(self._inside),
+            "checks": self.checks,
+            "events": self.events,
+        }
+
+
+def bench(fences, queries, cell_degrees, seed=0):
+    # Fences of 50 m - 2 km scattered over a ~50 km city, then random point lookups
+    rng = np.random.default_rng(seed)
+    lats = 19.0 + rng.random(fences) * 0.45
+    lngs = 72.75 + rng.random(fences) * 0.45
+    radii = rng.uniform(50.0, 2000.0, fences)
+
+    index = GeofenceIndex(cell_degrees)
+    started = time.perf_counter()
+    for i in range(fences):
+        index.add(i, lats[i], lngs[i], radii[i])
+    build = time.perf_counter() - started
+
+    points = np.column_stack((19.0 + rng.random(queries) * 0.45, 72.75 + rng.random(queries) * 0.45))
+    timings = np.empty(queries)
+    hits = 0
+    for i, (lat, lng) in enumerate(points):
+        started = time.perf_counter()
+        hits += len(index.query(lat, lng))
+        timings[i] = time.perf_counter() - started
+    return {
+        "fences": fences,
+        "build_seconds": build,
+        "mean_us": timings.mean() * 1e6,
+        "p50_us": np.percentile(timings, 50) * 1e6,
+        "p99_us": np.percentile(timings, 99) * 1e6,
+        "avg_hits": hits / queries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--fences", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--cell-degrees", type=float, default=0.01)
+    args = parser.parse_args()
+
+    result = bench(args.fences, args.queries, args.cell_degrees)
+    print(f"Indexed {result['fences']} fences in {result['build_seconds']:.2f}s")
+    print(f"Lookup: mean {result['mean_us']:.1f} us, p50 {result['p50_us']:.1f} us, p99 {result['p99_us']:.1f} us, "
+          f"{result['avg_hits']:.1f} fences per point")
+
+
+if __name__ == "__main__":
+    main()
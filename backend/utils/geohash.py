@@ -0,0 +1,64 @@
+"""Geohash cells for location rooms.
+
+A geohash of precision p names a lat/lng box; every extra character splits
+it 32 ways. Precision 5 cells are about 4.9 x 4.9 km, precision 6 about
+1.2 x 0.6 km.
+"""
+import math
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+METERS_PER_DEGREE = 111320.0
+
+
+def encode(lat, lng, precision=5):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, value, even = 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2.0
+        if coord >= mid:
+            value = (value << 1) | 1
+            rng[0] = mid
+        else:
+            value <<= 1
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """(lat_degrees, lng_degrees) spanned by one cell."""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def cells_covering(lat, lng, radius_m, precision=5, max_cells=256):
+    """Geohashes of every cell touching the circle's bounding box.
+
+    Returns None if that would take more than `max_cells` cells, so callers
+    can fall back to a wider broadcast.
+    """
+    dlat = radius_m / METERS_PER_DEGREE
+    dlng = radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    min_lat, max_lat = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    min_lng, max_lng = max(lng - dlng, -180.0), min(lng + dlng, 180.0)
+    step_lat, step_lng = cell_size(precision)
+
+    # Snap to the cell grid so each cell is visited once
+    row0, row1 = math.floor((min_lat + 90.0) / step_lat), math.floor((max_lat + 90.0) / step_lat)
+    col0, col1 = math.floor((min_lng + 180.0) / step_lng), math.floor((max_lng + 180.0) / step_lng)
+    if (row1 - row0 + 1) * (col1 - col0 + 1) > max_cells:
+        return None
+    cells = set()
+    for row in range(row0, row1 + 1):
+        cell_lat = min(-90.0 + (row + 0.5) * step_lat, 90.0)
+        for col in range(col0, col1 + 1):
+            cell_lng = min(-180.0 + (col + 0.5) * step_lng, 180.0)
+            cells.add(encode(cell_lat, cell_lng, precision))
+    return sorted(cells)
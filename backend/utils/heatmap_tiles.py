@@ -0,0 +1,163 @@
+"""Multi-resolution crime density grid on slippy-map tiles.
+
+Every map tile (z, x, y) is split into CELLS_PER_TILE x CELLS_PER_TILE cells,
+so a cell at zoom z is the tile at zoom z + CELL_BITS. Each cell stores the
+summed report weight and the report count. New reports update their cell at
+every zoom with one bulk upsert. A full rebuild bins the whole heatmap
+collection with NumPy and swaps the result in (reports that arrive while it
+runs are only counted again by the next rebuild):
+
+    python -m utils.heatmap_tiles rebuild [--uri mongodb://localhost:27017]
+"""
+import argparse
+import math
+
+import numpy as np
+from pymongo import MongoClient, UpdateOne
+
+DB_NAME = "SurakshaSetu"
+CELLS_COLLECTION = "heatmap_cells"
+
+MIN_ZOOM = 3
+MAX_ZOOM = 16
+CELL_BITS = 4
+CELLS_PER_TILE = 1 << CELL_BITS
+MAX_LAT = 85.05112878
+
+SEVERITY_WEIGHTS = {"low": 1.0, "medium": 2.0, "high": 3.0}
+
+
+def report_weight(doc):
+    """Heat a report contributes: its intensity scaled by severity."""
+    try:
+        intensity = float(doc.get("intensity", 1.0))
+    except (TypeError, ValueError):
+        intensity = 1.0
+    return intensity * SEVERITY_WEIGHTS.get(str(doc.get("severity", "")).lower(), 1.0)
+
+
+def _project(lat, lng, zoom):
+    # Web Mercator; works on scalars and NumPy arrays alike
+    n = float(1 << zoom)
+    lat_rad = np.radians(np.clip(lat, -MAX_LAT, MAX_LAT))
+    x = (np.asarray(lng, dtype=np.float64) + 180.0) / 360.0 * n
+    y = (1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / math.pi) / 2.0 * n
+    limit = (1 << zoom) - 1
+    return np.clip(np.floor(x), 0, limit).astype(np.int64), np.clip(np.floor(y), 0, limit).astype(np.int64)
+
+
+def cell_center(zoom, x, y):
+    """Lat/lng of the centre of cell (x, y) at display zoom `zoom`."""
+    n = float(1 << (zoom + CELL_BITS))
+    lng = (x + 0.5) / n * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 0.5) / n))))
+    return lat, lng
+
+
+def clamp_zoom(zoom):
+    return max(MIN_ZOOM, min(MAX_ZOOM, int(zoom)))
+
+
+class HeatmapTiles:
+    """Serves and maintains precomputed density cells in `heatmap_cells`."""
+
+    def __init__(self, db):
+        self.db = db
+        self.cells = db[CELLS_COLLECTION]
+
+    def add_report(self, lat, lng, weight):
+        """Incrementally add one report to its cell at every zoom level."""
+        requests = []
+        for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+            x, y = _project(lat, lng, zoom + CELL_BITS)
+            x, y = int(x), int(y)
+            requests.append(UpdateOne(
+                {"z": zoom, "x": x, "y": y},
+                {"$inc": {"weight": float(weight), "count": 1},
+                 "$setOnInsert": {"tx": x >> CELL_BITS, "ty": y >> CELL_BITS}},
+                upsert=True,
+            ))
+        self.cells.bulk_write(requests, ordered=False)
+
+    def tile(self, zoom, x, y):
+        """Cells inside one slippy-map tile."""
+        return self._to_points(zoom, self.cells.find({"z": zoom, "tx": x, "ty": y}, {"_id": 0}))
+
+    def viewport(self, bbox, zoom, limit=20000):
+        """Cells in every tile touching the bounding box."""
+        zoom = clamp_zoom(zoom)
+        min_lng, min_lat, max_lng, max_lat = bbox
+        min_tx, max_ty = _project(min_lat, min_lng, zoom)
+        max_tx, min_ty = _project(max_lat, max_lng, zoom)
+        query = {
+            "z": zoom,
+            "tx": {"$gte": int(min_tx), "$lte": int(max_tx)},
+            "ty": {"$gte": int(min_ty), "$lte": int(max_ty)},
+        }
+        return self._to_points(zoom, self.cells.find(query, {"_id": 0}).limit(limit))
+
+    def _to_points(self, zoom, docs):
+        points = []
+        for doc in docs:
+            lat, lng = cell_center(zoom, doc["x"], doc["y"])
+            points.append({"lat": lat, "lng": lng, "weight": doc["weight"], "count": doc["count"]})
+        return points
+
+    def rebuild(self, batch_size=5000):
+        """Recompute every cell from the heatmap collection and swap the result in."""
+        from utils.indexes import INDEXES
+
+        lats, lngs, weights = [], [], []
+        for doc in self.db.heatmap.find({}, {"lat": 1, "lng": 1, "intensity": 1, "severity": 1, "_id": 0}):
+            try:
+                lat, lng = float(doc["lat"]), float(doc["lng"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            lats.append(lat)
+            lngs.append(lng)
+            weights.append(report_weight(doc))
+
+        build = self.db[CELLS_COLLECTION + "_build"]
+        build.drop()
+
+        total = 0
+        if lats:
+            lats = np.asarray(lats, dtype=np.float64)
+            lngs = np.asarray(lngs, dtype=np.float64)
+            weights = np.asarray(weights, dtype=np.float64)
+            for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+                cell_zoom = zoom + CELL_BITS
+                xs, ys = _project(lats, lngs, cell_zoom)
+                # One int64 key per cell, then sum weights/counts per unique key
+                keys, inverse = np.unique((xs << cell_zoom) | ys, return_inverse=True)
+                cell_weights = np.bincount(inverse, weights=weights)
+                cell_counts = np.bincount(inverse)
+                mask = (1 << cell_zoom) - 1
+                docs = [
+                    {"z": zoom, "x": int(key >> cell_zoom), "y": int(key & mask),
+                     "tx": int(key >> cell_zoom) >> CELL_BITS, "ty": int(key & mask) >> CELL_BITS,
+                     "weight": float(weight), "count": int(count)}
+                    for key, weight, count in zip(keys, cell_weights, cell_counts)
+                ]
+                for i in range(0, len(docs), batch_size):
+                    build.insert_many(docs[i:i + batch_size], ordered=False)
+                total += len(docs)
+
+        # Indexing the finished collection once beats maintaining the indexes per insert
+        build.create_indexes(INDEXES[CELLS_COLLECTION])
+        build.rename(CELLS_COLLECTION, dropTarget=True)
+        return {"reports": len(lats), "cells": total}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    args = parser.parse_args()
+
+    result = HeatmapTiles(MongoClient(args.uri)[DB_NAME]).rebuild()
+    print(f"Binned {result['reports']} reports into {result['cells']} cells across zooms {MIN_ZOOM}-{MAX_ZOOM}")
+
+
+if __name__ == "__main__":
+    main()
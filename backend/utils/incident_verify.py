@@ -0,0 +1,97 @@
+import datetime
+
+from pymongo.errors import BulkWriteError, OperationFailure
+
+ACTIONS = ("accept", "reject")
+MAX_DECISIONS = 500
+
+# Server error codes meaning "no transactions here" (standalone mongod)
+_NO_TRANSACTION_CODES = {20, 263}
+
+
+class IncidentVerifier:
+    """Applies police accept/reject decisions on citizen reports in bulk.
+
+    One batch is one read of the affected reports plus one insert_many into
+    Incidents, one delete_many and one update_many on Alerts_Citizen, all in
+    a single transaction, so a report is never both an incident and still
+    pending, or neither.
+
+    Transactions need a replica set. On a standalone server the same bulk
+    operations run without one, ordered so that a crash can only leave an
+    accepted report in both collections; accepted incidents keep the
+    report's _id, so running the batch again skips the duplicate insert and
+    finishes the delete.
+    """
+
+    def __init__(self, client, alerts, incidents, use_transactions=True):
+        self.client = client
+        self.alerts = alerts
+        self.incidents = incidents
+        self.use_transactions = use_transactions
+
+    def verify(self, decisions):
+        """Apply [{"alert_id": ..., "action": "accept"|"reject"}, ...].
+
+        Returns one result per decision, in order, each with a status of
+        accepted, rejected, not_found, invalid or duplicate.
+        """
+        results = []
+        wanted = {}
+        for decision in decisions:
+            if not isinstance(decision, dict):
+                results.append({"alert_id": None, "status": "invalid", "error": "Decision must be an object"})
+                continue
+            alert_id, action = decision.get("alert_id"), decision.get("action")
+            if not isinstance(alert_id, str) or not alert_id:
+                results.append({"alert_id": alert_id, "status": "invalid", "error": "alert_id is required"})
+            elif action not in ACTIONS:
+                results.append({"alert_id": alert_id, "status": "invalid", "error": "Invalid action"})
+            elif alert_id in wanted:
+                results.append({"alert_id": alert_id, "status": "duplicate", "error": "Already decided in this batch"})
+            else:
+                wanted[alert_id] = action
+                results.append({"alert_id": alert_id, "status": None})
+
+        if wanted:
+            applied = self._run(wanted)
+            for result in results:
+                if result["status"] is None:
+                    result["status"] = applied.get(result["alert_id"], "not_found")
+        return results
+
+    def _run(self, wanted):
+        if self.use_transactions:
+            try:
+                with self.client.start_session() as session:
+                    return session.with_transaction(lambda s: self._apply(wanted, s))
+            except OperationFailure as e:
+                if e.code not in _NO_TRANSACTION_CODES:
+                    raise
+                print("MongoDB has no transaction support, verifying reports without one:", str(e))
+                self.use_transactions = False
+        return self._apply(wanted, None)
+
+    def _apply(self, wanted, session):
+        reports = list(self.alerts.find({"alert_id": {"$in": list(wanted)}}, session=session))
+        accepted = [report for report in reports if wanted[report["alert_id"]] == "accept"]
+        rejected = [report["alert_id"] for report in reports if wanted[report["alert_id"]] == "reject"]
+
+        if accepted:
+            try:
+                self.incidents.insert_many(accepted, ordered=session is not None, session=session)
+            except BulkWriteError as e:
+                # Only reachable without a transaction: incidents left by an interrupted earlier run
+                if session is not None or any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                    raise
+            self.alerts.delete_many({"_id": {"$in": [report["_id"] for report in accepted]}}, session=session)
+        if rejected:
+            self.alerts.update_many(
+                {"alert_id": {"$in": rejected}},
+                {"$set": {"report_status": "rejected", "updated_at": datetime.datetime.utcnow()}},
+                session=session,
+            )
+
+        applied = {report["alert_id"]: "accepted" for report in accepted}
+        applied.update((alert_id, "rejected") for alert_id in rejected)
+        return applied
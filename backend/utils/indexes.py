@@ -0,0 +1,149 @@
+"""Index registry for the SurakshaSetu database and a query plan check.
+
+    python -m utils.indexes ensure [--uri mongodb://localhost:27017]
+    python -m utils.indexes explain [--uri ...]
+
+`explain` ensures the registry, then runs every hot query from app.py through
+explain() and exits with status 1 if any of them would do a collection scan.
+"""
+import argparse
+import datetime
+import sys
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel, MongoClient
+from pymongo.errors import PyMongoError
+
+DB_NAME = "SurakshaSetu"
+
+# Every index the app relies on, per collection. Keep in sync with HOT_QUERIES.
+INDEXES = {
+    "sos_alerts": [
+        # handle_sos looks up a citizen's active alert on every location update
+        IndexModel([("citizen_id", ASCENDING), ("status", ASCENDING)], name="citizen_id_status"),
+        # Police dashboard lists active alerts
+        IndexModel([("status", ASCENDING)], name="status"),
+        # Active alerts in the police map viewport
+        IndexModel([("geo", GEOSPHERE)], name="geo_2dsphere"),
+    ],
+    "heatmap": [
+        IndexModel([("geo", GEOSPHERE)], name="geo_2dsphere"),
+    ],
+    "heatmap_cells": [
+        # Incremental upserts from report_crime
+        IndexModel([("z", ASCENDING), ("x", ASCENDING), ("y", ASCENDING)], name="z_x_y_unique", unique=True),
+        # Tile and viewport reads
+        IndexModel([("z", ASCENDING), ("tx", ASCENDING), ("ty", ASCENDING)], name="z_tx_ty"),
+    ],
+    "Markers": [
+        IndexModel([("geo", GEOSPHERE)], name="geo_2dsphere"),
+    ],
+    "notifications": [
+        # Workers claiming due messages, and re-claiming expired leases
+        IndexModel([("channel", ASCENDING), ("status", ASCENDING), ("next_attempt_at", ASCENDING)],
+                   name="channel_status_next_attempt"),
+        IndexModel([("channel", ASCENDING), ("status", ASCENDING), ("lease_until", ASCENDING)],
+                   name="channel_status_lease"),
+    ],
+    "footage_detections": [
+        # Reviewing a recording, and finding everything seen in a time window
+        IndexModel([("file_id", ASCENDING), ("frame_index", ASCENDING)], name="file_id_frame_index"),
+        IndexModel([("timestamp", ASCENDING)], name="timestamp"),
+    ],
+    "footage_segments": [
+        # Resume check at the start of every scan
+        IndexModel([("file_id", ASCENDING), ("status", ASCENDING)], name="file_id_status"),
+    ],
+    "Alerts_Citizen": [
+        IndexModel([("alert_id", ASCENDING)], name="alert_id_unique", unique=True, sparse=True),
+        # Pending reports, newest first (paginated on _id)
+        IndexModel([("report_status", ASCENDING), ("_id", DESCENDING)], name="report_status_id"),
+    ],
+}
+
+# The queries app.py runs on hot paths, as (name, collection, filter, sort)
+_EXPLAIN_VIEWPORT = {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [
+    [[72.7, 18.9], [73.0, 18.9], [73.0, 19.2], [72.7, 19.2], [72.7, 18.9]]]}}}
+
+HOT_QUERIES = [
+    ("handle_sos existing alert", "sos_alerts", {"citizen_id": "explain-citizen", "status": "active"}, None),
+    ("get active SOS alerts", "sos_alerts", {"status": "active"}, None),
+    ("incident-verify pending list", "Alerts_Citizen", {"report_status": "pending"}, [("_id", DESCENDING)]),
+    ("incident-verify lookup", "Alerts_Citizen", {"alert_id": "explain-alert"}, None),
+    ("crime-data viewport", "heatmap", {"geo": _EXPLAIN_VIEWPORT}, None),
+    ("heatmap tile cells", "heatmap_cells", {"z": 12, "tx": 2882, "ty": 1808}, None),
+    ("markers viewport", "Markers", {"geo": _EXPLAIN_VIEWPORT}, None),
+    ("SOS viewport", "sos_alerts", {"geo": _EXPLAIN_VIEWPORT}, None),
+    ("notification claim", "notifications", {"channel": "whatsapp", "$or": [
+        {"status": "pending", "next_attempt_at": {"$lte": datetime.datetime(2030, 1, 1)}},
+        {"status": "sending", "lease_until": {"$lte": datetime.datetime(2030, 1, 1)}},
+    ]}, [("next_attempt_at", ASCENDING)]),
+    ("citizen alerts page", "Alerts", {}, [("_id", DESCENDING)]),
+    ("incident alerts page", "Incidents", {}, [("_id", DESCENDING)]),
+]
+
+
+def ensure_indexes(db):
+    """Create any missing index; existing identical indexes are left alone."""
+    created = {}
+    for collection, models in INDEXES.items():
+        try:
+            created[collection] = db[collection].create_indexes(models)
+        except PyMongoError as e:
+            # e.g. an index with the same name but different options already exists
+            print(f"Could not ensure indexes on {collection}:", str(e))
+    return created
+
+
+def _plan_stages(plan):
+    # Walk a winning plan tree (classic or SBE layout) and yield every stage name
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan", "outerStage", "innerStage"):
+        yield from _plan_stages(plan.get(key))
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+def explain_hot_queries(db):
+    """Return one report row per hot query, flagging collection scans."""
+    report = []
+    for name, collection, query, sort in HOT_QUERIES:
+        cursor = db[collection].find(query).limit(50)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        stages = list(_plan_stages(plan))
+        report.append({
+            "query": name,
+            "collection": collection,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["ensure", "explain"])
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    args = parser.parse_args()
+
+    db = MongoClient(args.uri)[DB_NAME]
+    if args.command == "ensure":
+        for collection, names in ensure_indexes(db).items():
+            print(f"{collection}: {', '.join(names)}")
+        return 0
+
+    ensure_indexes(db)
+    failed = False
+    for row in explain_hot_queries(db):
+        status = "COLLSCAN" if row["collscan"] else "ok"
+        print(f"[{status:>8}] {row['query']} ({row['collection']}): {' <- '.join(row['stages'])}")
+        failed = failed or row["collscan"]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+# Marker put on the queue to stop the worker thread
+_STOP = object()
+
+
+class BatchInferenceEngine:
+    """Groups frames coming from many cameras so each model runs once per batch.
+
+    `run_batch` receives a list of frames and must return one result per frame,
+    in the same order. Every submitted frame gets its own Future, so results are
+    handed back to the camera that submitted them. `concurrency` batches can be
+    in flight at once, which is how an out-of-process worker pool is kept busy.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait=0.01, concurrency=1):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait))
+        self.concurrency = max(1, int(concurrency))
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._collect_lock = threading.Lock()
+        self._threads = []
+        self.batches_run = 0
+        self.frames_run = 0
+
+    def start(self):
+        with self._lock:
+            if not self._threads:
+                self._threads = [
+                    threading.Thread(target=self._run, name=f"inference-engine-{i}", daemon=True)
+                    for i in range(self.concurrency)
+                ]
+                for thread in self._threads:
+                    thread.start()
+
+    def stop(self, timeout=None):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        if threads:
+            self._queue.put(_STOP)
+            for thread in threads:
+                thread.join(timeout)
+            # Leave the queue clean for a later start()
+            while not self._queue.empty():
+                self._queue.get_nowait()
+
+    def submit(self, camera_id, frame):
+        """Queue a frame for the next batch and return a Future for its result."""
+        self.start()
+        future = Future()
+        self._queue.put((camera_id, frame, future))
+        return future
+
+    def infer(self, camera_id, frame, timeout=None):
+        """Blocking helper used by per-camera loops."""
+        return self.submit(camera_id, frame).result(timeout)
+
+    def stats(self):
+        return {
+            "batches_run": self.batches_run,
+            "frames_run": self.frames_run,
+            "avg_batch_size": (self.frames_run / self.batches_run) if self.batches_run else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+    def _collect(self):
+        # Block for the first frame, then wait at most max_wait for the batch to fill up.
+        # Only one thread assembles a batch at a time so batches stay full.
+        with self._collect_lock:
+            return self._collect_locked()
+
+    def _collect_locked(self):
+        item = self._queue.get()
+        if item is _STOP:
+            # Let the other batch threads see it too
+            self._queue.put(_STOP)
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except Empty:
+                break
+            if item is _STOP:
+                # Finish this batch first, then stop on the next collect
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                break
+
+            # Skip frames whose caller has already given up
+            batch = [entry for entry in batch if entry[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            frames = [frame for _, frame, _ in batch]
+            try:
+                results = self.run_batch(frames)
+                if len(results) != len(frames):
+                    raise RuntimeError(f"run_batch returned {len(results)} results for {len(frames)} frames")
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._lock:
+                self.batches_run += 1
+                self.frames_run += len(frames)
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
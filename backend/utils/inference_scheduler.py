@@ -0,0 +1,76 @@
+import time
+
+import cv2
+
+
+class InferenceScheduler:
+    """Decides, per camera, which frames are worth sending to the models.
+
+    A tiny grayscale copy of each frame is compared with the one from the last
+    inference run. Static scenes are skipped (apart from a periodic refresh every
+    `max_idle` seconds), moving scenes run every `stride` frames, and any detection
+    switches the camera to every frame for `hot_seconds`.
+    """
+
+    def __init__(self, stride=3, motion_threshold=4.0, hot_seconds=5.0, max_idle=2.0, size=(64, 36)):
+        self.stride = max(1, int(stride))
+        self.motion_threshold = float(motion_threshold)
+        self.hot_seconds = float(hot_seconds)
+        self.max_idle = float(max_idle)
+        self.size = tuple(size)
+
+        self._reference = None
+        self._last_run = 0.0
+        self._hot_until = 0.0
+        self._since_last_run = 0
+        self.inferred = 0
+        self.skipped_static = 0
+        self.skipped_stride = 0
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def motion(self, thumbnail):
+        # Mean absolute pixel change (0-255) since the last frame that was inferred
+        if self._reference is None:
+            return float("inf")
+        return float(cv2.absdiff(thumbnail, self._reference).mean())
+
+    def should_infer(self, frame, now=None):
+        now = time.monotonic() if now is None else now
+        thumbnail = self._thumbnail(frame)
+        self._since_last_run += 1
+
+        if now < self._hot_until or now - self._last_run >= self.max_idle:
+            run = True
+        elif self.motion(thumbnail) < self.motion_threshold:
+            self.skipped_static += 1
+            run = False
+        elif self._since_last_run < self.stride:
+            self.skipped_stride += 1
+            run = False
+        else:
+            run = True
+
+        if run:
+            self._reference = thumbnail
+            self._last_run = now
+            self._since_last_run = 0
+            self.inferred += 1
+        return run
+
+    def record(self, detected, now=None):
+        """Feed back the result of an inference run; detections keep the camera hot."""
+        if detected:
+            now = time.monotonic() if now is None else now
+            self._hot_until = now + self.hot_seconds
+
+    def stats(self):
+        return {
+            "inferred": self.inferred,
+            "skipped_static": self.skipped_static,
+            "skipped_stride": self.skipped_stride,
+        }
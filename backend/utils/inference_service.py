@@ -0,0 +1,227 @@
+import multiprocessing
+import threading
+import time
+from multiprocessing import shared_memory
+from queue import Queue, Empty
+
+import numpy as np
+
+from utils.detector import load_models, detect_batch, warm_up
+
+
+def _worker_main(shm_name, conn, backend, int8):
+    # Runs in a separate interpreter: holds its own copy of the models and
+    # reads frames straight out of the shared memory block it was given
+    shm = shared_memory.SharedMemory(name=shm_name)
+    models = load_models(backend, int8)
+    warm_up(models)
+    conn.send(("ready", None))
+    try:
+        while True:
+            layout = conn.recv()
+            if layout is None:
+                break
+            frames = [np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+                      for offset, shape, dtype in layout]
+            try:
+                conn.send(("ok", detect_batch(models, frames)))
+            except Exception as e:
+                conn.send(("error", str(e)))
+            finally:
+                del frames
+    finally:
+        shm.close()
+
+
+class _Worker:
+    def __init__(self, ctx, index, shm_size, backend="torch", int8=False):
+        self.index = index
+        self.shm = shared_memory.SharedMemory(create=True, size=shm_size)
+        try:
+            self.conn, child_conn = ctx.Pipe()
+            self.process = ctx.Process(
+                target=_worker_main,
+                args=(self.shm.name, child_conn, backend, int8),
+                name=f"inference-worker-{index}",
+                daemon=True,
+            )
+            self.process.start()
+            child_conn.close()
+        except BaseException:
+            self.shm.close()
+            self.shm.unlink()
+            raise
+
+    def wait_ready(self, timeout=None):
+        # A worker that fails to load its models exits, which shows up here as EOF
+        try:
+            if not self.conn.poll(timeout):
+                raise TimeoutError(f"inference worker {self.index} did not start")
+            status, _ = self.conn.recv()
+        except (EOFError, OSError):
+            self.process.join(1.0)
+            raise RuntimeError(f"inference worker {self.index} exited during start "
+                               f"(exit code {self.process.exitcode})")
+        if status != "ready":
+            raise RuntimeError(f"inference worker {self.index} did not start: {status}")
+
+    def run(self, frames):
+        layout = []
+        offset = 0
+        for frame in frames:
+            frame = np.ascontiguousarray(frame)
+            end = offset + frame.nbytes
+            if end > self.shm.size:
+                raise ValueError("batch does not fit in the worker's shared memory block")
+            np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.shm.buf, offset=offset)[...] = frame
+            layout.append((offset, frame.shape, frame.dtype.str))
+            offset = end
+        self.conn.send(layout)
+        status, payload = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"inference worker {self.index} failed: {payload}")
+        return payload
+
+    def close(self, timeout=5.0):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class InferenceService:
+    """Pool of worker processes holding the YOLO models, fed through shared memory.
+
+    The web process only copies frames into a worker's shared memory block and
+    receives label lists back, so inference never competes with Flask/Socket.IO
+    for the GIL. Each worker handles one batch at a time; `run_batch` blocks until
+    a worker is free, so callers should run at most `num_workers` batches at once.
+    Workers are started on first use (or by `warm_up_async`) because spawned
+    children re-import the main module; `ready` is set once all of them have
+    loaded and warmed their models.
+    """
+
+    def __init__(self, num_workers=2, max_batch_size=8, max_frame_bytes=1920 * 1080 * 3,
+                 start_timeout=120.0, backend="torch", int8=False, retry_seconds=30.0):
+        self.num_workers = max(1, int(num_workers))
+        self.backend = backend
+        self.int8 = int8
+        self.shm_size = max(1, int(max_batch_size)) * int(max_frame_bytes)
+        self.start_timeout = start_timeout
+        self.retry_seconds = float(retry_seconds)
+        self._ctx = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._workers = []
+        self._idle = Queue()
+        self.ready = threading.Event()
+        self.error = None
+        self._failed_at = None
+
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            workers = []
+            try:
+                for i in range(self.num_workers):
+                    workers.append(_Worker(self._ctx, i, self.shm_size, self.backend, self.int8))
+                for worker in workers:
+                    worker.wait_ready(self.start_timeout)
+            except Exception as e:
+                # Don't leave half a pool (processes and shared memory) behind
+                for worker in workers:
+                    try:
+                        worker.close(timeout=1.0)
+                    except Exception:
+                        pass
+                self.error = str(e)
+                self._failed_at = time.monotonic()
+                raise
+            for worker in workers:
+                self._idle.put(worker)
+            self._workers = workers
+            self.error = None
+            self._failed_at = None
+            self.ready.set()
+
+    def _warm(self):
+        try:
+            self.start()
+        except Exception as e:
+            self.error = str(e)
+            print("Inference worker start failed:", self.error)
+
+    def warm_up_async(self):
+        threading.Thread(target=self._warm, name="inference-service-start", daemon=True).start()
+
+    def _replace(self, worker):
+        # A worker that died mid-batch is restarted so the pool keeps its size
+        with self._lock:
+            try:
+                worker.close(timeout=1.0)
+            except Exception:
+                pass
+            try:
+                fresh = _Worker(self._ctx, worker.index, self.shm_size, self.backend, self.int8)
+            except Exception as e:
+                fresh, error = None, e
+            else:
+                try:
+                    fresh.wait_ready(self.start_timeout)
+                    error = None
+                except Exception as e:
+                    fresh.close(timeout=1.0)
+                    fresh, error = None, e
+            if fresh is None:
+                # The pool shrinks; once it is empty run_batch starts a new one after the backoff
+                print(f"Inference worker {worker.index} restart failed:", str(error))
+                self._workers.remove(worker)
+                if not self._workers:
+                    self.ready.clear()
+                    self.error = str(error)
+                    self._failed_at = time.monotonic()
+            else:
+                self._workers[self._workers.index(worker)] = fresh
+        return fresh
+
+    def _take_idle(self):
+        # Waits while every worker is busy, but not on a pool that failed restarts and emptied
+        while True:
+            try:
+                return self._idle.get(timeout=1.0)
+            except Empty:
+                if not self._workers:
+                    raise RuntimeError(f"inference workers unavailable: {self.error or 'pool closed'}")
+
+    def run_batch(self, frames):
+        if not self._workers:
+            # Fail fast after a failed start instead of spawning a new pool for every frame
+            if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_seconds:
+                raise RuntimeError(f"inference workers unavailable: {self.error}")
+            self.start()
+        worker = self._take_idle()
+        try:
+            return worker.run(frames)
+        except (EOFError, BrokenPipeError, ConnectionResetError):
+            worker = self._replace(worker)
+            raise RuntimeError("inference worker died while processing a batch")
+        finally:
+            if worker is not None:
+                self._idle.put(worker)
+
+    def close(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+            self._idle = Queue()
+            self.ready.clear()
+        for worker in workers:
+            worker.close()
@@ -0,0 +1,284 @@
+"""In-process metrics in the Prometheus text format.
+
+Counters, histograms and callback gauges live in a Registry, which renders
+them for a /metrics endpoint. Recording a value is a bucket lookup and a few
+additions under a per-metric lock, cheap enough for every request, Mongo
+command and camera frame. Each process keeps its own numbers; with several
+workers (utils/cluster.py) scrape every one of them.
+
+The helpers at the bottom wire it into Flask (request latency per route),
+pymongo (command latency per collection, through command monitoring) and
+Flask-SocketIO (received events and emits per room).
+"""
+import bisect
+import functools
+import inspect
+import threading
+import time
+
+from flask import g, request
+from pymongo import monitoring
+
+# Seconds; spans sub-millisecond Mongo commands to multi-second model calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}_total{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [per-bucket counts..., overflow count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labels):
+        """Context manager observing the duration of its block."""
+        return _Timer(self, labels)
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class CallbackGauge:
+    """Gauge read at scrape time; `callback` returns {label values tuple: number}."""
+
+    def __init__(self, name, help_text, labelnames, callback):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"Metric {self.name} failed:", str(e))
+            return lines
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name, help_text, labelnames, callback):
+        return self.register(CallbackGauge(name, help_text, labelnames, callback))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener; pass it in MongoClient(event_listeners=[...])."""
+
+    def __init__(self, registry):
+        self.latency = registry.histogram(
+            "mongo_command_seconds", "MongoDB command latency by command and collection",
+            ("command", "collection"))
+        self.failures = registry.counter(
+            "mongo_command_failures", "Failed MongoDB commands by command and collection",
+            ("command", "collection"))
+        self._collections = {}  # request_id -> collection, from started to finished
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        collection = self._collections.pop(event.request_id, "")
+        self.latency.observe(event.duration_micros / 1e6, event.command_name, collection)
+
+    def failed(self, event):
+        collection = self._collections.pop(event.request_id, "")
+        self.latency.observe(event.duration_micros / 1e6, event.command_name, collection)
+        self.failures.inc(event.command_name, collection)
+
+
+def instrument_flask(app, registry):
+    """Request latency per route template (not per URL), method and status."""
+    latency = registry.histogram(
+        "http_request_seconds", "Time to produce the response (streams: until headers)",
+        ("route", "method", "status"))
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop("_metrics_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            latency.observe(time.perf_counter() - started, route, request.method, str(response.status_code))
+        return response
+
+    return latency
+
+
+def _max_positional(handler):
+    try:
+        parameters = inspect.signature(handler).parameters.values()
+    except (TypeError, ValueError):
+        return None
+    if any(p.kind == p.VAR_POSITIONAL for p in parameters):
+        return None
+    return sum(p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD) for p in parameters)
+
+
+def instrument_socketio(socketio, registry, rooms=("police",)):
+    """Count and time received events, and count emits per room.
+
+    Must run before the @socketio.on handlers are registered. Room labels are
+    kept bounded: named `rooms` as themselves, "geo:..." rooms as "geo", a
+    single client (a sid) as "direct" and no room as "all".
+    """
+    events = registry.histogram("socketio_event_seconds", "Socket.IO event handler time by event", ("event",))
+    emits = registry.counter("socketio_emits", "Socket.IO emits by event and target room", ("event", "room"))
+    named_rooms = set(rooms)
+
+    def room_label(room):
+        if room is None:
+            return "all"
+        if room in named_rooms:
+            return room
+        if isinstance(room, str) and room.startswith("geo:"):
+            return "geo"
+        return "direct"
+
+    original_on = socketio.on
+
+    def on(message, namespace=None):
+        register = original_on(message, namespace)
+
+        def decorator(handler):
+            max_args = _max_positional(handler)
+
+            @functools.wraps(handler)
+            def timed(*args):
+                if max_args is not None and len(args) > max_args:
+                    # Flask-SocketIO retries connect handlers without the auth argument
+                    raise TypeError(f"{handler.__name__} takes {max_args} positional arguments")
+                started = time.perf_counter()
+                try:
+                    return handler(*args)
+                finally:
+                    events.observe(time.perf_counter() - started, message)
+
+            register(timed)
+            return handler
+        return decorator
+
+    original_emit = socketio.emit
+
+    def emit(event, *args, **kwargs):
+        target = kwargs.get("to", kwargs.get("room"))
+        if isinstance(target, (list, tuple, set)):
+            for label in {room_label(room) for room in target}:
+                emits.inc(event, label)
+        else:
+            emits.inc(event, room_label(target))
+        return original_emit(event, *args, **kwargs)
+
+    socketio.on = on
+    socketio.emit = emit
+    return events, emits
@@ -0,0 +1,162 @@
+"""Export the detection models for CPU backends and check them against PyTorch.
+
+    python -m utils.model_export export --backend onnx [--int8]
+    python -m utils.model_export export --backend openvino [--int8 --data calib.yaml]
+    python -m utils.model_export compare --backend onnx --video sample.mp4 [--int8] [--json out.json]
+
+Run from the backend directory so the .pt paths in utils/detector.py resolve.
+Select the result in config.json with inference.backend / inference.int8.
+"""
+import argparse
+import json
+import shutil
+import time
+
+from utils.detector import VIOLENCE_MODEL_PATH, ARMS_MODEL_PATH, exported_path, load_models, detect_batch, warm_up
+
+
+def export_models(backend, int8=False, imgsz=640, data=None):
+    from ultralytics import YOLO
+
+    exported = []
+    for weights in (VIOLENCE_MODEL_PATH, ARMS_MODEL_PATH):
+        target = exported_path(weights, backend, int8)
+        model = YOLO(weights)
+        if backend == "onnx":
+            # Dynamic axes so the batching engine can send any batch size
+            onnx_path = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+            if int8:
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+                quantize_dynamic(onnx_path, target, weight_type=QuantType.QUInt8)
+            elif onnx_path != target:
+                shutil.move(onnx_path, target)
+        elif backend == "openvino":
+            kwargs = {"format": "openvino", "imgsz": imgsz, "dynamic": True}
+            if int8:
+                # INT8 post-training quantization needs a calibration dataset yaml
+                kwargs.update(int8=True, data=data or "coco8.yaml")
+            out_path = model.export(**kwargs)
+            if str(out_path).rstrip("/") != target:
+                shutil.rmtree(target, ignore_errors=True)
+                shutil.move(str(out_path), target)
+        else:
+            raise ValueError("Only the onnx and openvino backends need exporting")
+        print(f"Exported {weights} -> {target}")
+        exported.append(target)
+    return exported
+
+
+def read_frames(video, max_frames=300, stride=1):
+    import cv2
+
+    cap = cv2.VideoCapture(video)
+    frames = []
+    index = 0
+    while len(frames) < max_frames:
+        success, frame = cap.read()
+        if not success:
+            break
+        if index % stride == 0:
+            frames.append(frame)
+        index += 1
+    cap.release()
+    if not frames:
+        raise ValueError(f"No frames could be read from {video}")
+    return frames
+
+
+def _timed_run(models, frames, batch_size):
+    labels = []
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        labels.extend(detect_batch(models, frames[i:i + batch_size]))
+    return labels, time.perf_counter() - start
+
+
+def compare(backend, video, int8=False, max_frames=300, stride=1, batch_size=8):
+    """Per-class agreement and latency of an exported backend against the PyTorch models."""
+    frames = read_frames(video, max_frames, stride)
+
+    baseline = load_models("torch")
+    candidate = load_models(backend, int8)
+    warm_up(baseline)
+    warm_up(candidate)
+
+    base_labels, base_seconds = _timed_run(baseline, frames, batch_size)
+    cand_labels, cand_seconds = _timed_run(candidate, frames, batch_size)
+
+    classes = sorted({label for labels in base_labels + cand_labels for label in labels})
+    per_class = {}
+    for cls in classes:
+        both = base_only = cand_only = 0
+        for base, cand in zip(base_labels, cand_labels):
+            in_base, in_cand = cls in base, cls in cand
+            both += in_base and in_cand
+            base_only += in_base and not in_cand
+            cand_only += in_cand and not in_base
+        per_class[cls] = {
+            "agreement": 1.0 - (base_only + cand_only) / len(frames),
+            "both": both,
+            "baseline_only": base_only,
+            "candidate_only": cand_only,
+        }
+
+    frame_agreement = sum(set(b) == set(c) for b, c in zip(base_labels, cand_labels)) / len(frames)
+    return {
+        "backend": backend,
+        "int8": int8,
+        "video": video,
+        "frames": len(frames),
+        "batch_size": batch_size,
+        "frame_agreement": frame_agreement,
+        "per_class": per_class,
+        "baseline_ms_per_frame": 1000.0 * base_seconds / len(frames),
+        "candidate_ms_per_frame": 1000.0 * cand_seconds / len(frames),
+        "baseline_fps": len(frames) / base_seconds,
+        "candidate_fps": len(frames) / cand_seconds,
+        "speedup": base_seconds / cand_seconds,
+    }
+
+
+def print_report(report):
+    print(f"Backend: {report['backend']}{' (int8)' if report['int8'] else ''} on {report['frames']} frames of {report['video']}")
+    print(f"  torch:     {report['baseline_ms_per_frame']:.1f} ms/frame ({report['baseline_fps']:.1f} fps)")
+    print(f"  candidate: {report['candidate_ms_per_frame']:.1f} ms/frame ({report['candidate_fps']:.1f} fps)")
+    print(f"  speedup:   {report['speedup']:.2f}x, frame-level agreement {report['frame_agreement']:.1%}")
+    for cls, row in report["per_class"].items():
+        print(f"  {cls:<10} agreement {row['agreement']:.1%}  both={row['both']} "
+              f"torch_only={row['baseline_only']} candidate_only={row['candidate_only']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = sub.add_parser("export", help="export the .pt models for a CPU backend")
+    export_parser.add_argument("--backend", choices=["onnx", "openvino"], required=True)
+    export_parser.add_argument("--int8", action="store_true", help="quantize weights to INT8")
+    export_parser.add_argument("--imgsz", type=int, default=640)
+    export_parser.add_argument("--data", help="calibration dataset yaml for OpenVINO INT8")
+
+    compare_parser = sub.add_parser("compare", help="compare a backend against PyTorch on a video")
+    compare_parser.add_argument("--backend", choices=["onnx", "openvino"], required=True)
+    compare_parser.add_argument("--int8", action="store_true")
+    compare_parser.add_argument("--video", required=True)
+    compare_parser.add_argument("--max-frames", type=int, default=300)
+    compare_parser.add_argument("--stride", type=int, default=1)
+    compare_parser.add_argument("--batch-size", type=int, default=8)
+    compare_parser.add_argument("--json", help="also write the report to this file")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_models(args.backend, args.int8, args.imgsz, args.data)
+    else:
+        report = compare(args.backend, args.video, args.int8, args.max_frames, args.stride, args.batch_size)
+        print_report(report)
+        if args.json:
+            with open(args.json, "w") as file:
+                json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+import abc
+import datetime
+import logging
+import random
+import threading
+import time
+import uuid
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+class Sender(abc.ABC):
+    """Delivers notifications for one channel.
+
+    send_batch() gets the claimed messages (dicts with recipient/body) and
+    returns one entry per message: None when it was delivered, otherwise the
+    error (an exception or a string) so that message alone is retried.
+    """
+
+    channel = None
+
+    @abc.abstractmethod
+    def send_batch(self, messages):
+        pass
+
+
+class WhatsAppSender(Sender):
+    """pywhatkit, sending straight away instead of waiting for a scheduled minute.
+
+    Messages in a batch that go to the same number are joined into one chat
+    message, since every send opens a browser tab.
+    """
+
+    channel = "whatsapp"
+
+    def __init__(self, wait_time=15, separator="\n\n"):
+        self.wait_time = int(wait_time)
+        self.separator = separator
+
+    def send_batch(self, messages):
+        import pywhatkit as kit  # Heavy import (drives a browser), only needed by the worker
+
+        by_recipient = {}
+        for index, message in enumerate(messages):
+            by_recipient.setdefault(message["recipient"], []).append(index)
+        results = [None] * len(messages)
+        for recipient, indexes in by_recipient.items():
+            body = self.separator.join(messages[i]["body"] for i in indexes)
+            try:
+                kit.sendwhatmsg_instantly(recipient, body, wait_time=self.wait_time, tab_close=True)
+            except Exception as e:
+                for i in indexes:
+                    results[i] = e
+        return results
+
+
+class LogSender(Sender):
+    """Local stand-in: logs each message (INFO) and keeps it in `sent`; nothing leaves the machine."""
+
+    def __init__(self, channel, fail_every=0):
+        self.channel = channel
+        self.fail_every = int(fail_every)
+        self.sent = []
+        self._calls = 0
+
+    def send_batch(self, messages):
+        results = []
+        for message in messages:
+            self._calls += 1
+            if self.fail_every and self._calls % self.fail_every == 0:
+                results.append("simulated failure")
+                continue
+            logger.info("[%s] to %s: %s", self.channel, message['recipient'], message['body'])
+            self.sent.append(message)
+            results.append(None)
+        return results
+
+
+class ChannelLimits:
+    """Rate limit and send slots of one channel, shared by every process through Mongo.
+
+    The rate limit is a token bucket kept as one document holding the time at
+    which the bucket is full again (`full_at`, epoch seconds): taking n
+    tokens pushes it n intervals later, and a compare-and-swap on the old
+    value keeps two workers from spending the same tokens. `concurrency`
+    slot documents are leases: a worker sends only while it holds one, and
+    a slot held by a crashed process frees itself after `lease_seconds`.
+    """
+
+    def __init__(self, collection, channel, rate_per_minute, burst=1, concurrency=1, lease_seconds=300.0):
+        self.collection = collection
+        self.channel = channel
+        self.interval = 60.0 / max(float(rate_per_minute), 1e-6)
+        self.capacity = max(1, int(burst))
+        self.concurrency = max(1, int(concurrency))
+        self.lease_seconds = float(lease_seconds)
+
+    def acquire(self, wanted):
+        """Take up to `wanted` tokens now; returns how many were granted."""
+        for _ in range(5):
+            now = time.time()
+            doc = self.collection.find_one({'_id': self.channel}, {'full_at': 1})
+            full_at = doc.get('full_at') if doc else None
+            start = max(full_at or 0.0, now)
+            granted = min(int(wanted), int((now + self.capacity * self.interval - start) / self.interval + 1e-9))
+            if granted <= 0:
+                return 0
+            update = {'full_at': start + granted * self.interval}
+            if doc is None:
+                try:
+                    self.collection.insert_one({'_id': self.channel, **update})
+                    return granted
+                except DuplicateKeyError:
+                    continue
+            if self.collection.update_one({'_id': self.channel, 'full_at': full_at},
+                                          {'$set': update}).modified_count:
+                return granted
+        return 0
+
+    def refund(self, count):
+        if count:
+            self.collection.update_one({'_id': self.channel}, {'$inc': {'full_at': -count * self.interval}})
+
+    def lease(self):
+        """Claim a free send slot; returns a handle for release(), or None if all are taken."""
+        now = time.time()
+        owner = uuid.uuid4().hex
+        for slot in range(self.concurrency):
+            slot_id = f"{self.channel}#{slot}"
+            try:
+                # A held slot doesn't match, so the upsert's insert fails on the existing _id
+                self.collection.find_one_and_update(
+                    {'_id': slot_id, 'lease_until': {'$lte': now}},
+                    {'$set': {'lease_until': now + self.lease_seconds, 'owner': owner}},
+                    upsert=True,
+                )
+            except DuplicateKeyError:
+                continue
+            return slot_id, owner
+        return None
+
+    def release(self, handle):
+        slot_id, owner = handle
+        self.collection.update_one({'_id': slot_id, 'owner': owner}, {'$set': {'lease_until': 0.0}})
+
+
+class NotificationQueue:
+    """Durable outbound queue in Mongo, drained by a small worker pool.
+
+    enqueue() only inserts a `pending` document, so request handlers return
+    straight away. Workers atomically claim due messages per channel (as many
+    as the channel's rate limit and batch size allow), hand them to that
+    channel's Sender and mark each one sent, or schedule a retry with
+    exponential backoff until `max_attempts` is reached. A claim is a lease:
+    messages left in `sending` by a crashed worker are picked up again once
+    `lease_seconds` have passed.
+
+    Every app worker process runs its own consumers, so a channel's rate
+    limit and concurrency live in the `channels` collection (ChannelLimits)
+    and hold across all of them.
+    """
+
+    def __init__(self, collection, senders, workers=2, max_attempts=5, backoff_seconds=30.0,
+                 max_backoff_seconds=3600.0, lease_seconds=300.0, poll_interval=5.0, limits=None,
+                 channels=None):
+        self.collection = collection
+        self.senders = {sender.channel: sender for sender in senders}
+        self.workers = int(workers)
+        self.max_attempts = int(max_attempts)
+        self.backoff_seconds = float(backoff_seconds)
+        self.max_backoff_seconds = float(max_backoff_seconds)
+        self.lease_seconds = float(lease_seconds)
+        self.poll_interval = float(poll_interval)
+        if channels is None:
+            channels = collection.database['notification_channels']
+        limits = limits or {}
+        self._limits = {}
+        self._batch_sizes = {}
+        for channel in self.senders:
+            channel_limits = limits.get(channel, {})
+            self._batch_sizes[channel] = int(channel_limits.get('batch_size', 10))
+            # Browser-driven senders can't run two sends at once, hence concurrency 1
+            self._limits[channel] = ChannelLimits(
+                channels, channel,
+                channel_limits.get('rate_per_minute', 6),
+                burst=channel_limits.get('burst', self._batch_sizes[channel]),
+                concurrency=channel_limits.get('concurrency', 1),
+                lease_seconds=self.lease_seconds,
+            )
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    def enqueue(self, channel, recipient, body, **meta):
+        """Persist a message for delivery; returns its id."""
+        if channel not in self.senders:
+            raise ValueError(f"No sender configured for channel {channel}")
+        now = datetime.datetime.utcnow()
+        doc = {
+            **meta,
+            'channel': channel,
+            'recipient': recipient,
+            'body': body,
+            'status': 'pending',
+            'attempts': 0,
+            'next_attempt_at': now,
+            'created_at': now,
+        }
+        result = self.collection.insert_one(doc)
+        self.start()
+        self._wake.set()
+        return result.inserted_id
+
+    def start(self):
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            if self._threads:
+                return
+            self._stopping.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"notifications-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=10.0):
+        """Stop the workers; undelivered messages stay in Mongo for the next start."""
+        self._stopping.set()
+        self._wake.set()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def _claim(self, channel, limit):
+        now = datetime.datetime.utcnow()
+        lease_until = now + datetime.timedelta(seconds=self.lease_seconds)
+        claimed = []
+        while len(claimed) < limit:
+            doc = self.collection.find_one_and_update(
+                {'channel': channel, '$or': [
+                    {'status': 'pending', 'next_attempt_at': {'$lte': now}},
+                    {'status': 'sending', 'lease_until': {'$lte': now}},
+                ]},
+                {'$set': {'status': 'sending', 'lease_until': lease_until}, '$inc': {'attempts': 1}},
+                sort=[('next_attempt_at', 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if doc is None:
+                break
+            claimed.append(doc)
+        return claimed
+
+    def _backoff(self, attempts):
+        delay = min(self.max_backoff_seconds, self.backoff_seconds * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _finish(self, messages, results):
+        now = datetime.datetime.utcnow()
+        for message, error in zip(messages, results):
+            if error is None:
+                update = {'$set': {'status': 'sent', 'sent_at': now}, '$unset': {'lease_until': ''}}
+                self.sent += 1
+            elif message['attempts'] >= self.max_attempts:
+                update = {'$set': {'status': 'failed', 'last_error': str(error)}, '$unset': {'lease_until': ''}}
+                self.failed += 1
+                logger.error("Notification %s failed for good: %s", message['_id'], error)
+            else:
+                retry_at = now + datetime.timedelta(seconds=self._backoff(message['attempts']))
+                update = {'$set': {'status': 'pending', 'next_attempt_at': retry_at, 'last_error': str(error)},
+                          '$unset': {'lease_until': ''}}
+                self.retried += 1
+            self.collection.update_one({'_id': message['_id']}, update)
+
+    def _drain(self, channel):
+        limits = self._limits[channel]
+        slot = limits.lease()
+        if slot is None:
+            return 0
+        try:
+            granted = limits.acquire(self._batch_sizes[channel])
+            if not granted:
+                return 0
+            messages = self._claim(channel, granted)
+            limits.refund(granted - len(messages))
+            if not messages:
+                return 0
+            try:
+                results = self.senders[channel].send_batch(messages)
+            except Exception as e:
+                results = [e] * len(messages)
+            self._finish(messages, results)
+            return len(messages)
+        finally:
+            limits.release(slot)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            handled = 0
+            for channel in self.senders:
+                try:
+                    handled += self._drain(channel)
+                except PyMongoError as e:
+                    logger.warning("Notification queue error: %s", e)
+            if not handled:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def stats(self):
+        counts = {}
+        try:
+            for row in self.collection.aggregate([{'$group': {'_id': '$status', 'count': {'$sum': 1}}}]):
+                counts[row['_id']] = row['count']
+        except PyMongoError:
+            pass
+        return {'by_status': counts, 'sent': self.sent, 'retried': self.retried, 'failed': self.failed}
@@ -0,0 +1,80 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import jsonify, request
+
+
+def parse_cursor(value):
+    if not value:
+        return None
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise ValueError(f"Invalid cursor: {value}")
+
+
+def page_args(default_limit=50, max_limit=200):
+    """Read ?limit=, ?cursor= (older page) and ?since= (only newer items) from the request."""
+    try:
+        limit = int(request.args.get('limit', default_limit))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    limit = max(1, min(limit, max_limit))
+    return limit, parse_cursor(request.args.get('cursor')), parse_cursor(request.args.get('since'))
+
+
+def projection_for(allowed_fields):
+    """Projection limited to `allowed_fields`, narrowed further by an optional ?fields=a,b.
+
+    Raises ValueError when ?fields= names none of them: an empty projection
+    would make Mongo return whole documents.
+    """
+    requested = request.args.get('fields')
+    fields = allowed_fields
+    if requested:
+        fields = [field for field in requested.split(',') if field in allowed_fields]
+        if not fields:
+            raise ValueError(f"fields must name at least one of: {', '.join(allowed_fields)}")
+    return {field: 1 for field in fields}
+
+
+def fetch_page(collection, query=None, projection=None, limit=50, cursor=None, since=None):
+    """Keyset pagination on _id, newest first.
+
+    ObjectIds grow with insertion time, so `_id < cursor` is the next (older)
+    page and `_id > since` is the delta a polling client has not seen yet.
+    """
+    query = dict(query or {})
+    if since is not None:
+        query['_id'] = {'$gt': since}
+        direction = 1
+    else:
+        if cursor is not None:
+            query['_id'] = {'$lt': cursor}
+        direction = -1
+
+    docs = list(collection.find(query, projection).sort('_id', direction).limit(limit + 1))
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if since is not None:
+        # Fetched oldest-first so nothing is skipped; hand back newest-first like other pages
+        docs.reverse()
+
+    newest = docs[0]['_id'] if docs else since
+    oldest = docs[-1]['_id'] if docs else None
+
+    return {
+        'items': docs,
+        'has_more': has_more,
+        # Next older page (only for normal paging)
+        'next_cursor': str(oldest) if has_more and since is None else None,
+        # Pass as ?since= on the next poll to get only newer items
+        'since_cursor': str(newest) if newest is not None else None,
+    }
+
+
+def conditional_json(payload, status=200):
+    """jsonify with an ETag; answers If-None-Match with an empty 304."""
+    response = jsonify(payload)
+    response.status_code = status
+    response.add_etag()
+    return response.make_conditional(request)
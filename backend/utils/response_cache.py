@@ -0,0 +1,98 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, make_response, request
+
+
+class ResponseCache:
+    """In-memory read-through cache for GET endpoints.
+
+    Entries are keyed by namespace + full request path (query string
+    included), expire after `ttl` seconds and are evicted least recently used
+    beyond `max_entries`. Write routes call invalidate(namespace) so readers
+    see their change straight away; the TTL only bounds staleness from writes
+    made by other server processes.
+    """
+
+    def __init__(self, ttl=30.0, max_entries=512, enabled=True):
+        self.ttl = float(ttl)
+        self.max_entries = int(max_entries)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generations = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def cached(self, namespace):
+        """Decorator for a view; only 200 GET responses without Cache-Control: no-store are stored."""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or request.method != 'GET':
+                    return view(*args, **kwargs)
+
+                key = (namespace, request.full_path)
+                now = time.monotonic()
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None and entry[0] > now:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                    else:
+                        entry = None
+                        self.misses += 1
+                    generation = self._generations.get(namespace, 0)
+
+                if entry is not None:
+                    _, body, status, headers = entry
+                    response = current_app.response_class(body, status=status, headers=headers)
+                    return response.make_conditional(request)
+
+                response = make_response(view(*args, **kwargs))
+                if (response.status_code == 200 and not response.is_streamed
+                        and 'no-store' not in response.headers.get('Cache-Control', '')):
+                    if not response.get_etag()[0]:
+                        response.add_etag()
+                    self._store(key, namespace, generation, response)
+                    response = response.make_conditional(request)
+                return response
+            return wrapper
+        return decorator
+
+    def _store(self, key, namespace, generation, response):
+        entry = (time.monotonic() + self.ttl, response.get_data(), response.status_code,
+                 list(response.headers.items()))
+        with self._lock:
+            # Skip it if a write invalidated the namespace while the view was running
+            if self._generations.get(namespace, 0) != generation:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *namespaces):
+        with self._lock:
+            for namespace in namespaces:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+                stale = [key for key in self._entries if key[0] == namespace]
+                for key in stale:
+                    del self._entries[key]
+                self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
@@ -0,0 +1,137 @@
+"""One JSON path for Mongo documents, used by HTTP responses (Flask's JSON
+provider) and Socket.IO packets alike.
+
+ObjectId and datetime are converted by CustomJSONEncoder's rules while the
+document is being encoded, so pymongo results can be passed straight to
+jsonify()/emit() without a json_util round trip or str(_id) loops. orjson is
+used when it is installed; otherwise the stdlib encoder does the same job.
+
+    python -m utils.serialization bench [--docs 10000] [--repeat 5]
+"""
+import argparse
+import datetime
+import json
+import time
+
+from bson import ObjectId
+from bson import json_util
+from flask.json.provider import DefaultJSONProvider
+
+from utils.json_encoder import CustomJSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+json_default = CustomJSONEncoder().default
+
+
+def dumps(obj, sort_keys=False, indent=None, **kwargs):
+    """Encode `obj` to a JSON string; extra kwargs only apply to the stdlib fallback."""
+    if orjson is not None and indent in (None, 2):
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=json_default, option=option).decode()
+        except TypeError:
+            # e.g. integers wider than 64 bits; the stdlib encoder copes with those
+            pass
+    kwargs["default"] = json_default
+    return json.dumps(obj, sort_keys=sort_keys, indent=indent, **kwargs)
+
+
+def loads(data, **kwargs):
+    if orjson is not None and not kwargs:
+        return orjson.loads(data)
+    return json.loads(data, **kwargs)
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider (app.json) that understands ObjectId and datetime."""
+
+    default = staticmethod(json_default)
+
+    def dumps(self, obj, **kwargs):
+        kwargs.pop("default", None)
+        kwargs.setdefault("sort_keys", self.sort_keys)
+        kwargs.setdefault("ensure_ascii", self.ensure_ascii)
+        return dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return loads(s, **kwargs)
+
+
+class PacketJSON:
+    """Stand-in for the json module in SocketIO(json=...), so emits take Mongo documents as-is."""
+
+    @staticmethod
+    def dumps(obj, **kwargs):
+        return dumps(obj, **kwargs)
+
+    @staticmethod
+    def loads(data, **kwargs):
+        return loads(data, **kwargs)
+
+
+def _sample_docs(count):
+    now = datetime.datetime.utcnow()
+    return [{
+        "_id": ObjectId(),
+        "citizen_id": f"citizen-{i}",
+        "status": "active",
+        "location": {"latitude": 19.0 + i * 1e-5, "longitude": 72.8 + i * 1e-5},
+        "geo": {"type": "Point", "coordinates": [72.8 + i * 1e-5, 19.0 + i * 1e-5]},
+        "timestamp": now.isoformat(),
+        "created_at": now,
+        "evidence_files": [f"uploads/{i}.jpg"],
+    } for i in range(count)]
+
+
+def _str_ids(docs):
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+        doc["created_at"] = doc["created_at"].isoformat()
+    return json.dumps(docs, separators=(",", ":"))
+
+
+def bench(count, repeat):
+    # Each path starts from fresh pymongo-style documents, as a request would
+    paths = [
+        ("json_util.dumps (SOS GET)", lambda docs: json_util.dumps(docs)),
+        ("json_util round trip + json.dumps (emit)",
+         lambda docs: json.dumps(json.loads(json_util.dumps(docs)), separators=(",", ":"))),
+        ("str(_id) loop + json.dumps (list pages)", _str_ids),
+        ("serialization.dumps", lambda docs: dumps(docs, separators=(",", ":"))),
+    ]
+    results = []
+    for name, encode in paths:
+        best = float("inf")
+        for _ in range(repeat):
+            docs = _sample_docs(count)
+            started = time.perf_counter()
+            encode(docs)
+            best = min(best, time.perf_counter() - started)
+        results.append((name, best))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--docs", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = bench(args.docs, args.repeat)
+    baseline = results[-1][1]
+    print(f"{args.docs} documents, best of {args.repeat}, encoder: {'orjson' if orjson else 'stdlib json'}")
+    for name, seconds in results:
+        print(f"  {name:<45} {seconds * 1000:8.1f} ms  ({seconds / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
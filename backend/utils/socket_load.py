@@ -0,0 +1,145 @@
+"""Socket.IO load test: connection and fan-out throughput as workers are added.
+
+    python -m utils.socket_load [--workers 1 2 4] [--clients 200] [--events 50]
+                                [--message-queue redis://localhost:6379/0]
+                                [--async-mode gevent|threading]
+
+For each worker count it starts a cluster (utils/cluster.py), connects
+`--clients` police dashboards spread evenly over the workers and joins them to
+the `police` room, then publishes `--events` events to that room through the
+message queue, the same path an SOS POST on any worker takes. It reports
+connections per second and delivered events per second.
+
+Without --message-queue a local Redis stand-in (fakeredis) is started. Needs
+the Socket.IO client extras: pip install -r requirements-optional.txt
+"""
+import argparse
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import socketio
+
+from utils.cluster import start_workers, stop_workers
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_redis_stand_in():
+    """In-process fakeredis TCP server; returns (url, server)."""
+    from fakeredis import TcpFakeServer
+
+    port = _free_port()
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=server.serve_forever, name="fake-redis", daemon=True).start()
+    return f"redis://127.0.0.1:{port}/0", server
+
+
+def wait_until_up(ports, timeout=120.0):
+    deadline = time.monotonic() + timeout
+    for port in ports:
+        while True:
+            try:
+                requests.get(f"http://127.0.0.1:{port}/cache/stats", timeout=2)
+                break
+            except requests.RequestException:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"worker on port {port} did not come up")
+                time.sleep(0.5)
+
+
+class PoliceClient:
+    def __init__(self, url):
+        self.url = url
+        self.received = 0
+        self.client = socketio.Client(reconnection=False)
+        self.client.on("load_probe", self._on_probe)
+
+    def _on_probe(self, data):
+        self.received += 1
+
+    def connect(self):
+        self.client.connect(self.url, transports=["websocket"], wait_timeout=30)
+        self.client.emit("join_police_room")
+
+    def close(self):
+        try:
+            self.client.disconnect()
+        except Exception:
+            pass
+
+
+def run_round(workers, clients, events, message_queue, async_mode, base_port):
+    processes = start_workers(workers, base_port, "127.0.0.1", message_queue, async_mode, quiet=True)
+    police = []
+    try:
+        ports = [base_port + i for i in range(workers)]
+        wait_until_up(ports)
+        police = [PoliceClient(f"http://127.0.0.1:{ports[i % workers]}") for i in range(clients)]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(64, clients)) as pool:
+            list(pool.map(lambda client: client.connect(), police))
+        connect_seconds = time.perf_counter() - started
+        time.sleep(1.0)  # let the join_police_room events land
+
+        # Same channel Flask-SocketIO subscribes to by default
+        emitter = socketio.RedisManager(message_queue, channel="flask-socketio", write_only=True)
+        expected = clients * events
+        started = time.perf_counter()
+        for i in range(events):
+            emitter.emit("load_probe", {"seq": i, "sent_at": time.time()}, room="police", namespace="/")
+        deadline = started + 60.0
+        while sum(client.received for client in police) < expected and time.perf_counter() < deadline:
+            time.sleep(0.05)
+        fanout_seconds = time.perf_counter() - started
+        delivered = sum(client.received for client in police)
+        return {
+            "workers": workers,
+            "connect_per_second": clients / connect_seconds,
+            "delivered": delivered,
+            "expected": expected,
+            "deliveries_per_second": delivered / fanout_seconds,
+        }
+    finally:
+        for client in police:
+            client.close()
+        stop_workers(processes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--message-queue")
+    parser.add_argument("--async-mode", default="gevent", choices=["gevent", "threading", "eventlet"])
+    parser.add_argument("--base-port", type=int, default=5101)
+    args = parser.parse_args()
+
+    redis_server = None
+    message_queue = args.message_queue
+    if not message_queue:
+        message_queue, redis_server = start_redis_stand_in()
+        print(f"Using a local Redis stand-in at {message_queue}")
+
+    try:
+        print(f"{args.clients} police clients, {args.events} room events, async_mode={args.async_mode}")
+        for workers in args.workers:
+            row = run_round(workers, args.clients, args.events, message_queue, args.async_mode, args.base_port)
+            print(f"  {row['workers']} worker(s): {row['connect_per_second']:7.1f} connects/s, "
+                  f"{row['deliveries_per_second']:8.1f} deliveries/s "
+                  f"({row['delivered']}/{row['expected']} delivered)")
+    finally:
+        if redis_server is not None:
+            redis_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
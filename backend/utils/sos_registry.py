@@ -0,0 +1,185 @@
+import threading
+import time
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from utils.geo import point_from_location
+
+
+class SosRegistry:
+    """In-memory view of active SOS sessions, keyed by citizen_id.
+
+    New alerts and deactivations go to Mongo straight away. Location pings only
+    update memory; the latest position per session is written back with one
+    bulk_write every `flush_interval` seconds (or sooner once `max_pending`
+    sessions are waiting), so Mongo is at most that far behind.
+
+    With several server processes (utils/cluster.py) a session can be
+    deactivated by another one, so get() re-checks a cached session's status
+    in Mongo once it was last confirmed more than `verify_interval` seconds
+    ago, and drops it if it is no longer active. A single process owns all
+    of its sessions, so leave verify_interval as None there: every check
+    is then answered from memory.
+    """
+
+    def __init__(self, collection, flush_interval=2.0, max_pending=500, verify_interval=None):
+        self.collection = collection
+        self.flush_interval = float(flush_interval)
+        self.max_pending = int(max_pending)
+        self.verify_interval = None if verify_interval is None else float(verify_interval)
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._verified = {}  # citizen_id -> when the session was last confirmed active in Mongo
+        self._dirty = {}
+        self._loaded = False
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.coalesced = 0
+
+    def _ensure_loaded(self):
+        # Sessions that were active before a restart are picked up on first use
+        if self._loaded:
+            return
+        docs = list(self.collection.find({'status': 'active'}, {'citizen_id': 1, 'location': 1, 'timestamp': 1}))
+        with self._lock:
+            if not self._loaded:
+                for doc in docs:
+                    self._sessions.setdefault(doc.get('citizen_id'), doc)
+                self._loaded = True
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="sos-flusher", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """Stop the flusher and write out every pending location."""
+        self._stopping.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+
+    def _still_active(self, citizen_id, session):
+        if self.verify_interval is None:
+            return True
+        now = time.monotonic()
+        if now - self._verified.get(citizen_id, 0.0) < self.verify_interval:
+            return True
+        if self.collection.find_one({'_id': session['_id'], 'status': 'active'}, {'_id': 1}) is None:
+            with self._lock:
+                if self._sessions.get(citizen_id) is session:
+                    del self._sessions[citizen_id]
+                    self._verified.pop(citizen_id, None)
+                    self._dirty.pop(session['_id'], None)
+            return False
+        self._verified[citizen_id] = now
+        return True
+
+    def get(self, citizen_id):
+        self._ensure_loaded()
+        session = self._sessions.get(citizen_id)
+        if session is not None and not self._still_active(citizen_id, session):
+            session = None
+        if session is None:
+            # Not ours: another server process may have opened it
+            session = self.collection.find_one({'citizen_id': citizen_id, 'status': 'active'},
+                                               {'citizen_id': 1, 'location': 1, 'timestamp': 1})
+            if session is not None:
+                with self._lock:
+                    session = self._sessions.setdefault(citizen_id, session)
+                    self._verified[citizen_id] = time.monotonic()
+        return session
+
+    def activate(self, sos_data):
+        """Insert a new active alert and start tracking it; returns the inserted id."""
+        self._ensure_loaded()
+        result = self.collection.insert_one(sos_data)
+        with self._lock:
+            self._sessions[sos_data.get('citizen_id')] = {
+                '_id': result.inserted_id,
+                'citizen_id': sos_data.get('citizen_id'),
+                'location': sos_data.get('location'),
+                'timestamp': sos_data.get('timestamp'),
+            }
+            self._verified[sos_data.get('citizen_id')] = time.monotonic()
+        return result.inserted_id
+
+    def update_location(self, citizen_id, location, timestamp):
+        """Record a location ping; only the newest one per session reaches Mongo."""
+        with self._lock:
+            session = self._sessions.get(citizen_id)
+            if session is None:
+                return False
+            session['location'] = location
+            session['timestamp'] = timestamp
+            if session['_id'] in self._dirty:
+                self.coalesced += 1
+            fields = {'location': location, 'timestamp': timestamp}
+            point = point_from_location(location)
+            if point is not None:
+                fields['geo'] = point
+            self._dirty[session['_id']] = fields
+            pending = len(self._dirty)
+        self.start()
+        if pending >= self.max_pending:
+            self._wake.set()
+        return True
+
+    def deactivate(self, citizen_id):
+        with self._lock:
+            session = self._sessions.pop(citizen_id, None)
+            self._verified.pop(citizen_id, None)
+            pending = self._dirty.pop(session['_id'], None) if session else None
+        update = {'status': 'deactivated'}
+        if pending:
+            # Fold the last unflushed position into the deactivation write
+            update.update(pending)
+        return self.collection.update_many(
+            {'citizen_id': citizen_id, 'status': 'active'},
+            {'$set': update}
+        )
+
+    def active(self):
+        self._ensure_loaded()
+        with self._lock:
+            return [dict(session) for session in self._sessions.values()]
+
+    def flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+        # A session deactivated by another process in the meantime keeps its final position
+        requests = [UpdateOne({'_id': _id, 'status': 'active'}, {'$set': fields}) for _id, fields in dirty.items()]
+        try:
+            self.collection.bulk_write(requests, ordered=False)
+        except PyMongoError as e:
+            print("SOS location flush failed:", str(e))
+            with self._lock:
+                # Put them back unless a newer ping arrived in the meantime
+                for _id, fields in dirty.items():
+                    self._dirty.setdefault(_id, fields)
+            return 0
+        self.flushes += 1
+        return len(requests)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def stats(self):
+        return {
+            'active_sessions': len(self._sessions),
+            'pending_updates': len(self._dirty),
+            'flushes': self.flushes,
+            'coalesced_updates': self.coalesced,
+        }
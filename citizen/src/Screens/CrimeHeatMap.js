@@ -2,9 +2,16 @@ import React, { useEffect, useState } from 'react';
 import { View, Text, StyleSheet, Alert } from 'react-native';
 import MapView, { Heatmap, Marker } from 'react-native-maps';
 import * as Location from 'expo-location';
-import { API_BASE_URL } from '../config/api';
+import { API_BASE_URL, viewportQuery } from '../config/api';
 import { SafeAreaView } from 'react-native-safe-area-context';
 
+const initialRegion = {
+    latitude: 19.0760,
+    longitude: 72.8777,
+    latitudeDelta: 0.0922,
+    longitudeDelta: 0.0421,
+};
+
 const CrimeHeatMap = () => {
     const [heatmapData, setHeatmapData] = useState([
         // Default points if API fails
@@ -17,6 +24,8 @@ const CrimeHeatMap = () => {
             severity: "medium"
         }
     ]);
+    // Server-side density cells ({lat, lng, weight, count}) for the heatmap layer
+    const [heatCells, setHeatCells] = useState([]);
     const [citizenLocation, setCitizenLocation] = useState(null);
     const severityColors = { low: "green", medium: "yellow", high: "red" };
 
@@ -42,12 +51,24 @@ const CrimeHeatMap = () => {
             }
         })();
 
-        fetchCrimeData();
+        fetchCrimeData(initialRegion);
     }, []);
 
-    const fetchCrimeData = async () => {
+    const fetchCrimeData = async (region) => {
         try {
-            const response = await fetch(`${API_BASE_URL}/api/crime-data`);
+            const query = viewportQuery(region);
+            const [cellsResponse, response] = await Promise.all([
+                fetch(`${API_BASE_URL}/api/crime-heatmap/cells?${query}`),
+                fetch(`${API_BASE_URL}/api/crime-data?${query}`),
+            ]);
+            // Without cells (request failed, or the grid was never built) the layer uses the points
+            try {
+                const cells = cellsResponse.ok ? await cellsResponse.json() : [];
+                setHeatCells(Array.isArray(cells) ? cells : []);
+            } catch (error) {
+                console.error("Error fetching heatmap cells:", error);
+                setHeatCells([]);
+            }
             const data = await response.json();
             if (data && data.length > 0) {
                 setHeatmapData(data);
@@ -70,12 +91,8 @@ const CrimeHeatMap = () => {
             <Text style={styles.title}>📍 Live Crime Heatmap</Text>
             <MapView
                 style={styles.map}
-                initialRegion={{
-                    latitude: 19.0760,
-                    longitude: 72.8777,
-                    latitudeDelta: 0.0922,
-                    longitudeDelta: 0.0421,
-                }}
+                initialRegion={initialRegion}
+                onRegionChangeComplete={fetchCrimeData}
             >
                 {/* Current Location Marker */}
                 {citizenLocation && (
@@ -87,15 +104,21 @@ const CrimeHeatMap = () => {
                     />
                 )}
                 
-                {/* Heatmap Layer */}
-                {heatmapData.length > 0 && (
+                {/* Heatmap Layer: density cells, or the crime points when there are none */}
+                {(heatCells.length > 0 || heatmapData.length > 0) && (
                     <Heatmap
-                        points={heatmapData.map(crime => ({
-                            latitude: parseFloat(crime.lat),
-                            longitude: parseFloat(crime.lng),
-                            weight: 1,
-                            intensity: crime.intensity || 0.5
-                        }))}
+                        points={heatCells.length > 0
+                            ? heatCells.map(cell => ({
+                                latitude: cell.lat,
+                                longitude: cell.lng,
+                                weight: cell.weight
+                            }))
+                            : heatmapData.map(crime => ({
+                                latitude: parseFloat(crime.lat),
+                                longitude: parseFloat(crime.lng),
+                                weight: 1,
+                                intensity: crime.intensity || 0.5
+                            }))}
                         opacity={0.6}
                         radius={20}
                         maxIntensity={100}
@@ -3,7 +3,7 @@ import { View, TextInput, StyleSheet } from 'react-native';
 import MapView, { Marker } from 'react-native-maps';
 import { useDarkMode } from '../context/DarkModeContext';
 import { SafeAreaView } from 'react-native-safe-area-context';
-import { API_BASE_URL } from '../config/api';
+import { API_BASE_URL, viewportQuery } from '../config/api';
 
 const RealtimeMap = () => {
     const { isDarkMode } = useDarkMode();
@@ -17,12 +17,12 @@ const RealtimeMap = () => {
     const [searchLocation, setSearchLocation] = useState('');
 
     useEffect(() => {
-        loadMarkers();
+        loadMarkers(mapRegion);
     }, []);
 
-    const loadMarkers = async () => {
+    const loadMarkers = async (region) => {
         try {
-            const response = await fetch(`${API_BASE_URL}/api/markers`);
+            const response = await fetch(`${API_BASE_URL}/api/markers?${viewportQuery(region)}`);
             const data = await response.json();
             setMarkers(data);
         } catch (error) {
@@ -49,6 +49,7 @@ const RealtimeMap = () => {
                 <MapView
                     style={styles.map}
                     initialRegion={mapRegion}
+                    onRegionChangeComplete={loadMarkers}
                     onPress={handleMapPress}
                 >
                     {markers.map((marker, index) => (
@@ -5,6 +5,7 @@ import { SafeAreaView } from 'react-native-safe-area-context';
 import { emitSOS } from '../services/socketService';
 import * as Location from 'expo-location';
 import { API_BASE_URL } from '../config/api';
+import { getCitizenId } from '../services/citizenId';
 
 const SOSScreen = () => {
     const { isDarkMode } = useDarkMode();
@@ -60,7 +61,7 @@ const SOSScreen = () => {
                     latitude: location.coords.latitude,
                     longitude: location.coords.longitude
                 },
-                citizenId: 'user123', // Replace with actual user ID
+                citizenId: await getCitizenId(),
                 timestamp: new Date().toISOString()
             };
 
@@ -89,7 +90,7 @@ const SOSScreen = () => {
                 timeInterval: 5000,
                 distanceInterval: 5
             },
-            (newLocation) => {
+            async (newLocation) => {
                 setLocation(newLocation);
                 if (sosActivated) {
                     emitSOS({
@@ -97,7 +98,7 @@ const SOSScreen = () => {
                             latitude: newLocation.coords.latitude,
                             longitude: newLocation.coords.longitude
                         },
-                        citizenId: 'user123',
+                        citizenId: await getCitizenId(),
                         timestamp: new Date().toISOString()
                     });
                 }
@@ -105,7 +106,7 @@ const SOSScreen = () => {
         );
     };
 
-    const handleDeactivateSOS = () => {
+    const handleDeactivateSOS = async () => {
         try {
             if (locationSubscription) {
                 locationSubscription.remove();
@@ -114,7 +115,7 @@ const SOSScreen = () => {
 
             // Emit deactivation event before changing state
             emitSOS({
-                citizenId: 'user123',
+                citizenId: await getCitizenId(),
                 status: 'deactivated',
                 timestamp: new Date().toISOString()
             });
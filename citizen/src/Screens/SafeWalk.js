@@ -6,6 +6,8 @@ import { useDarkMode } from '../context/DarkModeContext';
 import { SafeAreaView } from 'react-native-safe-area-context';
 import Icon from '@expo/vector-icons/FontAwesome5';
 import MaterialCommunityIcons from '@expo/vector-icons/MaterialCommunityIcons';
+import { emitSafeWalkLocation, emitSafeWalkStopped, subscribeToGeofenceEvents, unsubscribeFromGeofenceEvents } from '../services/socketService';
+import { getCitizenId } from '../services/citizenId';
 
 const SafeWalk = () => {
     const { isDarkMode } = useDarkMode();
@@ -41,6 +43,15 @@ const SafeWalk = () => {
         })();
     }, []);
 
+    useEffect(() => {
+        const onGeofenceEvent = (event) => {
+            const verb = event.event === 'enter' ? 'entered' : 'left';
+            showAlert(`You ${verb} ${event.name || 'a geofenced area'}`);
+        };
+        subscribeToGeofenceEvents(onGeofenceEvent);
+        return () => unsubscribeFromGeofenceEvents(onGeofenceEvent);
+    }, []);
+
     const createUserMarker = (latlng) => {
         setUserMarker(latlng);
     };
@@ -96,9 +107,10 @@ const SafeWalk = () => {
         notifyGuardians('Location sharing started');
     };
 
-    const stopSharing = () => {
+    const stopSharing = async () => {
         setIsSharing(false);
         clearInterval(timer);
+        emitSafeWalkStopped(await getCitizenId());
         notifyGuardians('Location sharing stopped');
     };
 
@@ -126,9 +138,10 @@ const SafeWalk = () => {
                 timeInterval: 5000,
                 distanceInterval: 5
             },
-            (location) => {
+            async (location) => {
                 const { latitude, longitude } = location.coords;
                 createUserMarker({ latitude, longitude });
+                emitSafeWalkLocation({ citizenId: await getCitizenId(), location: { latitude, longitude } });
                 updateRoute();
             }
         );
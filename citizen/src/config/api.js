@@ -2,3 +2,13 @@
 export const API_BASE_URL = 'http://192.168.1.9:5000'; // Use the IP shown in Flask server console
 export const WS_URL = 'ws://192.168.1.9:5000/socket.io';
 // or 'http://localhost:5000' for iOS simulator
+
+// Query string for map endpoints that only return points inside the visible region
+export const viewportQuery = (region) => {
+    const minLng = region.longitude - region.longitudeDelta / 2;
+    const maxLng = region.longitude + region.longitudeDelta / 2;
+    const minLat = region.latitude - region.latitudeDelta / 2;
+    const maxLat = region.latitude + region.latitudeDelta / 2;
+    const zoom = Math.round(Math.log2(360 / region.longitudeDelta));
+    return `bbox=${minLng},${minLat},${maxLng},${maxLat}&zoom=${zoom}`;
+};
@@ -1,12 +1,53 @@
 import React, { createContext, useContext, useEffect } from 'react';
-import { initializeSocket, disconnectSocket } from '../services/socketService';
+import * as Location from 'expo-location';
+import socket, { initializeSocket, disconnectSocket, emitLocationUpdate } from '../services/socketService';
+
+// Alert rooms are ~5 km cells, so a coarse fix every few hundred metres is plenty
+const LOCATION_OPTIONS = {
+    accuracy: Location.Accuracy.Balanced,
+    distanceInterval: 500,
+    timeInterval: 60000,
+};
 
 const SocketContext = createContext();
 
 export const SocketProvider = ({ children }) => {
     useEffect(() => {
+        let subscription = null;
+        let lastLocation = null;
+        let unmounted = false;
+        const sendLocation = () => {
+            if (lastLocation) {
+                emitLocationUpdate(lastLocation);
+            }
+        };
+        // Rooms are per connection, so re-send the last position after every reconnect
+        socket.on('connect', sendLocation);
         initializeSocket();
+
+        (async () => {
+            const { status } = await Location.requestForegroundPermissionsAsync();
+            if (status !== 'granted' || unmounted) {
+                return;
+            }
+            subscription = await Location.watchPositionAsync(LOCATION_OPTIONS, (location) => {
+                lastLocation = {
+                    latitude: location.coords.latitude,
+                    longitude: location.coords.longitude
+                };
+                sendLocation();
+            });
+            if (unmounted) {
+                subscription.remove();
+            }
+        })().catch((error) => console.log('Location watch unavailable:', error.message));
+
         return () => {
+            unmounted = true;
+            socket.off('connect', sendLocation);
+            if (subscription) {
+                subscription.remove();
+            }
             disconnectSocket();
         };
     }, []);
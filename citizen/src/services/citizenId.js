@@ -0,0 +1,33 @@
+import AsyncStorage from '@react-native-async-storage/async-storage';
+
+const STORAGE_KEY = 'citizenId';
+
+let citizenIdPromise = null;
+
+// There are no citizen accounts yet, so each install gets its own id, kept
+// across restarts. SOS and SafeWalk both report with it, which keeps one
+// person's alerts and geofence state apart from everyone else's.
+const loadCitizenId = async () => {
+    try {
+        const stored = await AsyncStorage.getItem(STORAGE_KEY);
+        if (stored) {
+            return stored;
+        }
+    } catch (error) {
+        console.error('Failed to load citizen id', error);
+    }
+    const citizenId = `citizen-${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+    try {
+        await AsyncStorage.setItem(STORAGE_KEY, citizenId);
+    } catch (error) {
+        console.error('Failed to save citizen id', error);
+    }
+    return citizenId;
+};
+
+export const getCitizenId = () => {
+    if (!citizenIdPromise) {
+        citizenIdPromise = loadCitizenId();
+    }
+    return citizenIdPromise;
+};
@@ -70,4 +70,28 @@ export const emitSOS = (sosData) => {
     socket.emit('sos_triggered', sosData);
 };
 
+// Coarse position so the server can put this device in its neighbourhood's alert room
+export const emitLocationUpdate = (location) => {
+    socket.emit('update_location', { location });
+};
+
+// SafeWalk position updates are checked against geofences on the server
+export const emitSafeWalkLocation = (locationData) => {
+    socket.emit('safewalk_location', locationData);
+};
+
+export const emitSafeWalkStopped = (citizenId) => {
+    socket.emit('safewalk_stopped', { citizenId });
+};
+
+export const subscribeToGeofenceEvents = (callback) => {
+    socket.on('geofence_enter', callback);
+    socket.on('geofence_exit', callback);
+};
+
+export const unsubscribeFromGeofenceEvents = (callback) => {
+    socket.off('geofence_enter', callback);
+    socket.off('geofence_exit', callback);
+};
+
 export default socket;